@@ -0,0 +1,82 @@
+from PyQt6 import QtCore
+from Lib import pipestreamdbread as pdb
+from Lib import waveform_archive as wfa
+from Lib import cancellation as cnl
+import logging
+import time
+
+archive_fetch_size = 500 # записей на одно дописывание в архив
+
+
+class ArchiveRecordsThread(QtCore.QThread):
+    # Дописывает в локальный архив осциллограмм все записи таблицы новее последней архивной
+    progress_signal = QtCore.pyqtSignal(int)
+    finished_signal = QtCore.pyqtSignal(int) # добавлено записей
+    error_signal = QtCore.pyqtSignal(str)
+
+    def __init__(self, tablename, root=None, parent=None):
+        super().__init__(parent)
+        self.tablename = tablename
+        self.root = root
+        self.cancel_token = cnl.CancellationToken()
+
+    def cancel(self):
+        self.cancel_token.cancel()
+
+    def run(self):
+        connection = None
+        try:
+            connection, cursor, status = pdb.connect_pooled(self.cancel_token)
+            if connection == 0 or cursor == 0:
+                connection = None
+                self.cancel_token.raise_if_cancelled()
+                self.error_signal.emit(status)
+                return
+            self.cancel_token.bind_connection(connection)
+
+            colnames_list = pdb.get_column_names(cursor, self.tablename)
+            if not all(col in colnames_list for col in wfa.archive_source_columns):
+                self.error_signal.emit(f"Таблица {self.tablename} не содержит столбцов с отсчётами")
+                return
+
+            archive = wfa.WaveformArchive.for_table(self.tablename, self.root)
+            last = archive.last_timestamp
+            where = "WHERE timestamp > %s" if last is not None else "WHERE timestamp IS NOT NULL"
+            params = (last,) if last is not None else None
+
+            cursor.execute(f"SELECT COUNT(*) FROM {self.tablename} {where}", params)
+            total = int(cursor.fetchone()[0])
+
+            start_time = time.perf_counter()
+            block_cursor = connection.cursor(name=f"archive_{self.tablename}")
+            block_cursor.itersize = archive_fetch_size
+            block_cursor.execute(f"SELECT {', '.join(wfa.archive_source_columns)} FROM {self.tablename} "
+                                 f"{where} ORDER BY timestamp ASC", params)
+
+            added = 0
+            read = 0
+            while True:
+                self.cancel_token.raise_if_cancelled()
+                rows = block_cursor.fetchmany(archive_fetch_size)
+                if not rows:
+                    break
+                read += len(rows)
+                added += archive.append_records([dict(zip(wfa.archive_source_columns, row)) for row in rows])
+                if total:
+                    self.progress_signal.emit(min(100, read * 100 // total))
+            block_cursor.close()
+
+            logging.info(f"Архив {self.tablename}: добавлено {added} записей за {time.perf_counter() - start_time:.2f} с, "
+                         f"всего {len(archive)}")
+            self.finished_signal.emit(added)
+
+        except Exception as e:
+            if self.cancel_token.is_cancelled():
+                logging.info(f"Архивирование {self.tablename} отменено")
+            else:
+                self.error_signal.emit(f"Ошибка архивирования: {str(e)}")
+
+        finally:
+            if connection:
+                self.cancel_token.release_connection(connection)
+                pdb.release_pooled(connection)
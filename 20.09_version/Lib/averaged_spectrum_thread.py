@@ -0,0 +1,90 @@
+from PyQt6 import QtCore
+from Lib import pooled_decode as pdc
+from Lib import storage_backend as sbk
+from Lib import spectrum_averaging as sav
+from Lib import cancellation as cnl
+import numpy as np
+import logging
+import time
+
+average_fetch = 32 # записей на один запрос и одну пачку накопителя
+
+
+class AveragedSpectrumThread(QtCore.QThread):
+    # Читает записи пачками, декодирует их разом и копит усреднённый спектр; промежуточный результат - после каждой пачки
+    result_signal = QtCore.pyqtSignal(object) # sav.AveragedSpectrum
+    progress_signal = QtCore.pyqtSignal(int)
+    finished_signal = QtCore.pyqtSignal(int) # записей в среднем
+    error_signal = QtCore.pyqtSignal(str)
+
+    def __init__(self, tablename, colnames_list, timestamps, rec_nums, mode="welch", window_name="hann",
+                 freq_range=(-1, -1), archive=None, parent=None):
+        super().__init__(parent)
+        self.tablename = tablename
+        self.colnames_list = list(colnames_list)
+        self.timestamps = timestamps
+        self.rec_nums = list(rec_nums) # номера записей (с 1) в списке штампов
+        self.freq_range = tuple(freq_range)
+        self.archive = archive
+        self.accumulator = sav.SpectrumAccumulator(mode, window_name=window_name)
+        self.cancel_token = cnl.CancellationToken()
+
+    def cancel(self):
+        self.cancel_token.cancel()
+
+    def add_signals(self, backend, cursor, nums: list) -> int:
+        # добавляет записи в накопитель; возвращает число пропущенных записей другой формы
+        if self.archive is not None:
+            idx = np.asarray(nums) - 1
+            coeffs = self.archive.coefficients()[idx]
+            return self.add_group(self.archive.frames()[idx] * coeffs[:, None, :])
+
+        wanted = [self.timestamps[num - 1] for num in nums]
+        recs = [rec for rec in backend.get_records(cursor, self.tablename, wanted, self.colnames_list)
+                if rec["points"] is not None]
+        # декодирование - в пуле процессов, накопитель читает сигналы прямо из общей памяти
+        with pdc.decode_records_pooled(recs, self.cancel_token) as batch:
+            return sum(self.add_group(signals) for _, signals in batch.groups)
+
+    def add_group(self, signals) -> int:
+        return len(signals) if self.accumulator.add(signals) == 0 else 0
+
+    def run(self):
+        backend = sbk.get_backend()
+        connection = None
+        cursor = None
+        try:
+            if self.archive is None:
+                connection, cursor, status = backend.connect()
+                if connection == 0 or cursor == 0:
+                    connection = None
+                    self.error_signal.emit(status)
+                    return
+
+            start_time = time.perf_counter()
+            done = 0
+            skipped = 0
+            for start in range(0, len(self.rec_nums), average_fetch):
+                self.cancel_token.raise_if_cancelled()
+                nums = self.rec_nums[start:start + average_fetch]
+                skipped += self.add_signals(backend, cursor, nums)
+                done += len(nums)
+                if self.accumulator.records:
+                    self.result_signal.emit(self.accumulator.result(self.freq_range))
+                self.progress_signal.emit(done * 100 // len(self.rec_nums))
+
+            if skipped:
+                logging.warning(f"Усреднение спектра {self.tablename}: пропущено {skipped} записей другой формы")
+            logging.info(f"Усреднение спектра {self.tablename}: {self.accumulator.records} записей, "
+                         f"{self.accumulator.segments} отрезков за {time.perf_counter() - start_time:.2f} с")
+            self.finished_signal.emit(self.accumulator.records)
+
+        except cnl.OperationCancelled:
+            logging.info(f"Усреднение спектра {self.tablename} остановлено")
+
+        except Exception as e:
+            self.error_signal.emit(f"Ошибка усреднения спектра: {str(e)}")
+
+        finally:
+            if connection:
+                backend.close(connection, cursor)
@@ -0,0 +1,53 @@
+'''
+Кооперативная отмена фоновых загрузок вместо QThread.terminate().
+Поток проверяет признак отмены между блоками, а выполняющийся на сервере
+запрос прерывается через connection.cancel() привязанного соединения.
+'''
+
+import threading
+import logging
+
+#=========================================================================================================
+class OperationCancelled(Exception):
+    pass
+#=========================================================================================================
+class CancellationToken:
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def cancel(self):
+        # Может вызываться из любого потока, в том числе из потока интерфейса
+        self._event.set()
+        with self._lock:
+            connections = list(self._connections)
+        for connection in connections:
+            self._cancel_connection(connection)
+
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise OperationCancelled()
+
+    def bind_connection(self, connection):
+        # Запросы на этом соединении будут прерваны при отмене
+        with self._lock:
+            self._connections.append(connection)
+        if self._event.is_set():
+            self._cancel_connection(connection)
+
+    def release_connection(self, connection):
+        with self._lock:
+            if connection in self._connections:
+                self._connections.remove(connection)
+
+    def _cancel_connection(self, connection):
+        try:
+            connection.cancel()
+        except Exception as e:
+            logging.warning(f"Не удалось прервать запрос на сервере: {e}")
+#=========================================================================================================
@@ -0,0 +1,90 @@
+'''
+Кэш декодированных записей в памяти: сигналы [отсчёты, каналы] по ключу
+(источник, таблица, штамп времени), источник - "db" или путь локального архива.
+Повторный показ записи (возврат к ней, наложение закреплённых записей) не
+читает и не декодирует её заново.
+
+Объём ограничен decoded_cache_max_bytes, вытесняются давно не использованные
+записи (LRU). Закреплённые записи (pin) не вытесняются, пока их не открепят.
+Массивы в кэше только для чтения - их отдают нескольким графикам сразу.
+'''
+
+from collections import OrderedDict
+import numpy as np
+import threading
+
+decoded_cache_max_bytes = 256 << 20
+
+#=========================================================================================================
+def record_key(table_name: str, timestamp, archive=None) -> tuple:
+    return (archive.path if archive is not None else "db", table_name, int(timestamp))
+#=========================================================================================================
+class DecodedRecordCache:
+
+    def __init__(self, max_bytes: int = decoded_cache_max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # ключ -> сигналы, от давно использованных к недавним
+        self.pinned = set()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        with self.lock:
+            signals = self.entries.get(key)
+            if signals is not None:
+                self.entries.move_to_end(key)
+            return signals
+
+    def put(self, key, signals: np.ndarray) -> np.ndarray:
+        # возвращает сохранённый массив (только для чтения)
+        signals = np.asarray(signals)
+        if signals.flags.writeable:
+            if signals.base is not None:
+                signals = signals.copy() # срез чужого буфера не держит в памяти весь буфер
+            signals.flags.writeable = False
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous.nbytes
+            self.entries[key] = signals
+            self.nbytes += signals.nbytes
+            self.evict()
+        return signals
+
+    def pin(self, key) -> bool:
+        # False - записи нет в кэше, закреплять нечего
+        with self.lock:
+            if key not in self.entries:
+                return False
+            self.pinned.add(key)
+            return True
+
+    def unpin(self, key):
+        with self.lock:
+            self.pinned.discard(key)
+            self.evict()
+
+    def clear(self):
+        # закреплённые записи остаются
+        with self.lock:
+            for key in [key for key in self.entries if key not in self.pinned]:
+                self.nbytes -= self.entries.pop(key).nbytes
+
+    def evict(self):
+        # вызывается под self.lock
+        if self.nbytes <= self.max_bytes:
+            return
+        for key in list(self.entries):
+            if self.nbytes <= self.max_bytes:
+                break
+            if key in self.pinned:
+                continue
+            self.nbytes -= self.entries.pop(key).nbytes
+#=========================================================================================================
+decoded_records = DecodedRecordCache() # общий кэш окна сигналов
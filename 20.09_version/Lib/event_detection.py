@@ -0,0 +1,171 @@
+'''
+Поиск провалов, перенапряжений и прерываний напряжения, а также превышений тока
+по трендам СКЗ. Всё считается векторно (NumPy) без циклов по записям.
+По всему столбцу (float32, без приведения типа) делается одно сравнение на
+направление - признак "событие не завершено"; дальше работа идёт только с его
+записями, которых в нормальном режиме мало: событие начинается с первого
+выхода за уставку на непрерывном участке и длится до конца участка.
+'''
+
+import numpy as np
+from dataclasses import dataclass
+
+voltage_channels = ["U_A_rms", "U_B_rms", "U_C_rms"]
+current_channels = ["I_A_rms", "I_B_rms", "I_C_rms"]
+
+event_kinds = ["sag", "swell", "interruption", "overcurrent"]
+event_kind_names = {"sag": "Провал", "swell": "Перенапряжение", "interruption": "Прерывание", "overcurrent": "Превышение тока"}
+
+#=========================================================================================================
+@dataclass
+class EventThresholds:
+    nominal_voltage: float = 220.0  # В
+    sag_level: float = 0.90         # доля от номинала: начало провала
+    swell_level: float = 1.10       # доля от номинала: начало перенапряжения
+    interruption_level: float = 0.10 # доля от номинала: провал глубже считается прерыванием
+    hysteresis: float = 0.02        # доля от номинала
+    current_limit: float = 0.0      # А; 0 - не искать превышения тока
+    current_hysteresis: float = 0.02 # доля от current_limit
+    min_duration_ms: int = 0
+#=========================================================================================================
+def detect_runs(values: np.ndarray, level: float, hysteresis: float, above: bool) -> tuple:
+    # Интервалы [start, stop) выхода за level с гистерезисом и экстремум внутри каждого.
+    # hold - запись не завершает событие; NaN (нет данных) завершает: сравнение с NaN ложно
+    if above:
+        hold = values > min(level, level - hysteresis)
+    else:
+        hold = values < max(level, level + hysteresis)
+    idx = np.flatnonzero(hold)
+    del hold
+    none = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=values.dtype))
+    if len(idx) == 0:
+        return none
+
+    held = values[idx]
+    # непрерывные участки hold - в позициях массива idx
+    breaks = np.flatnonzero(np.diff(idx) != 1) + 1
+    run_first = np.concatenate(([0], breaks))
+    run_stop = np.append(breaks, len(idx))
+    entered = np.flatnonzero(held > level if above else held < level)
+    if len(entered) == 0:
+        return none
+
+    # событие - от первого выхода за уставку на участке до конца участка
+    run_of = np.searchsorted(run_first, entered, side="right") - 1
+    first = np.flatnonzero(np.diff(run_of, prepend=-1))
+    begin = entered[first]
+    stop = run_stop[run_of[first]]
+
+    # минимум/максимум внутри каждого интервала за один вызов reduceat по парам [begin, stop)
+    bounds = np.empty(2 * len(begin), dtype=np.int64)
+    bounds[0::2] = begin
+    bounds[1::2] = stop
+    if bounds[-1] == len(held):
+        held = np.append(held, held[-1])
+    ufunc = np.maximum if above else np.minimum
+    extremes = ufunc.reduceat(held, bounds)[0::2]
+    return idx[begin], idx[stop - 1] + 1, extremes
+#=========================================================================================================
+class EventIndex:
+    # Найденные события, упорядоченные по времени начала; навигация за O(log n)
+
+    def __init__(self, start_ms, end_ms, channel, kind, extreme, depth):
+        order = np.argsort(start_ms, kind="stable")
+        self.start_ms = np.asarray(start_ms, dtype=np.int64)[order]
+        self.end_ms = np.asarray(end_ms, dtype=np.int64)[order]
+        self.channel = np.asarray(channel, dtype=np.int8)[order]  # индекс в channel_names
+        self.kind = np.asarray(kind, dtype=np.int8)[order]        # индекс в event_kinds
+        self.extreme = np.asarray(extreme, dtype=np.float32)[order] # остаточное/максимальное значение
+        self.depth = np.asarray(depth, dtype=np.float32)[order]    # % от номинала/уставки
+        self.channel_names = voltage_channels + current_channels
+
+    def __len__(self):
+        return len(self.start_ms)
+
+    @property
+    def duration_ms(self) -> np.ndarray:
+        return self.end_ms - self.start_ms
+
+    def next_after(self, time_sec: float) -> int:
+        # первое событие, начинающееся строго позже time_sec; -1 если нет
+        idx = int(np.searchsorted(self.start_ms, time_sec * 1000.0, side="right"))
+        return idx if idx < len(self) else -1
+
+    def prev_before(self, time_sec: float) -> int:
+        idx = int(np.searchsorted(self.start_ms, time_sec * 1000.0, side="left")) - 1
+        return idx if idx >= 0 else -1
+
+    def event(self, idx: int) -> dict:
+        return {"start_ms": int(self.start_ms[idx]),
+                "end_ms": int(self.end_ms[idx]),
+                "duration_ms": int(self.end_ms[idx] - self.start_ms[idx]),
+                "channel": self.channel_names[self.channel[idx]],
+                "kind": event_kinds[self.kind[idx]],
+                "extreme": float(self.extreme[idx]),
+                "depth": float(self.depth[idx])}
+
+    def counts(self) -> dict:
+        return {kind: int(np.count_nonzero(self.kind == i)) for i, kind in enumerate(event_kinds)}
+#=========================================================================================================
+def detect_events(store, thresholds: EventThresholds = None) -> EventIndex:
+    # store - TrendStore; ищет события по всем каналам напряжения и (если задана уставка) тока
+    if thresholds is None:
+        thresholds = EventThresholds()
+
+    timestamps = store.timestamps
+    n = len(timestamps)
+    parts = {"start": [], "end": [], "channel": [], "kind": [], "extreme": [], "depth": []}
+    channel_names = voltage_channels + current_channels
+
+    def add(starts, stops, extreme, ch, kinds, use_min, reference):
+        if len(starts) == 0:
+            return
+        start_ms = timestamps[starts]
+        # конец - первая запись после восстановления, либо последняя запись
+        end_ms = timestamps[np.minimum(stops, n - 1)]
+        keep = (end_ms - start_ms) >= thresholds.min_duration_ms
+        parts["start"].append(start_ms[keep])
+        parts["end"].append(end_ms[keep])
+        parts["channel"].append(np.full(np.count_nonzero(keep), ch, dtype=np.int8))
+        parts["kind"].append(np.asarray(kinds)[keep] if np.ndim(kinds) else np.full(np.count_nonzero(keep), kinds, dtype=np.int8))
+        parts["extreme"].append(extreme[keep])
+        if use_min:
+            depth = (reference - extreme[keep]) / reference * 100
+        else:
+            depth = (extreme[keep] - reference) / reference * 100
+        parts["depth"].append(depth)
+
+    if n > 0:
+        un = thresholds.nominal_voltage
+        hyst = thresholds.hysteresis * un
+        for name in voltage_channels:
+            if name not in store.channel_names:
+                continue
+            ch = channel_names.index(name)
+            values = store.column(name)
+
+            starts, stops, residual = detect_runs(values, thresholds.sag_level * un, hyst, above=False)
+            if len(starts):
+                kinds = np.where(residual < thresholds.interruption_level * un,
+                                 event_kinds.index("interruption"), event_kinds.index("sag")).astype(np.int8)
+                add(starts, stops, residual, ch, kinds, True, un)
+
+            starts, stops, peak = detect_runs(values, thresholds.swell_level * un, hyst, above=True)
+            add(starts, stops, peak, ch, event_kinds.index("swell"), False, un)
+
+        if thresholds.current_limit > 0:
+            limit = thresholds.current_limit
+            for name in current_channels:
+                if name not in store.channel_names:
+                    continue
+                ch = channel_names.index(name)
+                values = store.column(name)
+                starts, stops, peak = detect_runs(values, limit, thresholds.current_hysteresis * limit, above=True)
+                add(starts, stops, peak, ch, event_kinds.index("overcurrent"), False, limit)
+
+    def cat(key, dtype):
+        return np.concatenate(parts[key]) if parts[key] else np.empty(0, dtype=dtype)
+
+    return EventIndex(cat("start", np.int64), cat("end", np.int64), cat("channel", np.int8),
+                      cat("kind", np.int8), cat("extreme", np.float32), cat("depth", np.float32))
+#=========================================================================================================
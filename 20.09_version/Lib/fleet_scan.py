@@ -0,0 +1,105 @@
+'''
+Поиск выходов за уставки по всем логгерам без загрузки трендов.
+Уставки переводятся в сырые единицы АЦП (add_data_0..5) для каждой пары
+множитель/делитель таблицы и подставляются в WHERE; сервер возвращает
+только интервалы (острова подряд идущих записей с нарушением).
+'''
+
+from Lib import pipestreamdbread as pdb
+from dataclasses import dataclass
+import logging
+
+voltage_columns = ["add_data_0", "add_data_1", "add_data_2"]
+current_columns = ["add_data_3", "add_data_4", "add_data_5"]
+column_channel_names = {"add_data_0": "U_A", "add_data_1": "U_B", "add_data_2": "U_C",
+                        "add_data_3": "I_A", "add_data_4": "I_B", "add_data_5": "I_C"}
+
+scan_kinds = {"overvoltage": ("voltage", True),
+              "undervoltage": ("voltage", False),
+              "overcurrent": ("current", True)}
+scan_kind_names = {"overvoltage": "Перенапряжение", "undervoltage": "Понижение напряжения", "overcurrent": "Превышение тока"}
+
+default_merge_gap_ms = 60000 # записи с нарушением ближе этого интервала объединяются в один
+
+#=========================================================================================================
+@dataclass
+class ScanLimit:
+    kind: str = "overvoltage"   # ключ scan_kinds
+    threshold: float = 242.0    # В или А
+#=========================================================================================================
+def channel_hit_expr(column: str, kind: str, pairs: list, threshold: float, above: bool) -> str:
+    # Условие нарушения для одного столбца: отдельная граница в единицах АЦП на каждую пару множитель/делитель
+    op = ">=" if above else "<"
+    # add_data = 0 - канал не записан (как в has_valid_add_data), это не понижение до нуля
+    valid = "" if above else f" AND {column} > 0"
+    terms = []
+    for mult, div in pairs:
+        raw = pdb.physical_to_adc_threshold(threshold, mult, div, above)
+        terms.append(f"(cfg_{kind}_multiplier = {mult!r} AND cfg_{kind}_divider = {div!r} AND {column} {op} {raw}{valid})")
+    return "(" + " OR ".join(terms) + ")"
+#-----------------------------------------------------------------------------------------------------
+def build_scan_query(tablename: str, limit: ScanLimit, pairs: list,
+                     merge_gap_ms: int = default_merge_gap_ms, timerange: pdb.Timerange = None) -> str:
+    kind, above = scan_kinds[limit.kind]
+    columns = voltage_columns if kind == "voltage" else current_columns
+
+    hits = [channel_hit_expr(col, kind, pairs, limit.threshold, above) for col in columns]
+    extreme = "GREATEST" if above else "LEAST"
+    coeff = f"((cfg_{kind}_multiplier::float8 / cfg_{kind}_divider) / ({pdb.ADC_raw_max} / {pdb.ADC_full_scale_V}))"
+    # экстремум сразу в физических единицах, как в adc_to_physical
+    # для минимума незаписанные каналы (0) исключаются - LEAST пропускает NULL
+    values = columns if above else [f"NULLIF({col}, 0)" for col in columns]
+    extreme_expr = f"{coeff} * floor({extreme}({', '.join(values)}) / 4.0)"
+
+    where = " OR ".join(hits)
+    if timerange is not None:
+        where = f"({where}) AND timestamp >= {int(timerange.begin)} AND timestamp <= {int(timerange.end)}"
+
+    hit_cols = ", ".join(f"{hit} AS h{i}" for i, hit in enumerate(hits))
+    any_cols = ", ".join(f"bool_or(h{i})" for i in range(len(hits)))
+    agg = "max" if above else "min"
+
+    return f'''
+        WITH hits AS (
+            SELECT timestamp, {extreme_expr} AS extreme, {hit_cols}
+            FROM {tablename}
+            WHERE {where}
+        ), marked AS (
+            SELECT *, SUM(CASE WHEN timestamp - prev_ts <= {int(merge_gap_ms)} THEN 0 ELSE 1 END)
+                      OVER (ORDER BY timestamp) AS grp
+            FROM (SELECT *, lag(timestamp) OVER (ORDER BY timestamp) AS prev_ts FROM hits) AS h
+        )
+        SELECT min(timestamp), max(timestamp), count(*), {agg}(extreme), {any_cols}
+        FROM marked
+        GROUP BY grp
+        ORDER BY 1'''
+#-----------------------------------------------------------------------------------------------------
+def scan_table(cursor, tablename: str, limits: list,
+               merge_gap_ms: int = default_merge_gap_ms, timerange: pdb.Timerange = None) -> list:
+    # Возвращает список интервалов-словарей по всем уставкам для одной таблицы
+    ret = []
+    pairs_cache = {}
+    for limit in limits:
+        kind, _ = scan_kinds[limit.kind]
+        if kind not in pairs_cache:
+            pairs_cache[kind] = pdb.get_scaling_pairs(cursor, tablename, kind)
+        pairs = pairs_cache[kind]
+        if not pairs:
+            logging.warning(f"Скан {tablename}: нет коэффициентов для каналов {kind}, уставка {limit.kind} пропущена")
+            continue
+
+        cursor.execute(build_scan_query(tablename, limit, pairs, merge_gap_ms, timerange))
+        columns = voltage_columns if kind == "voltage" else current_columns
+        for row in cursor.fetchall():
+            begin, end, count, extreme = row[:4]
+            channels = [column_channel_names[col] for col, hit in zip(columns, row[4:]) if hit]
+            ret.append({"device": tablename,
+                        "kind": limit.kind,
+                        "threshold": limit.threshold,
+                        "begin": int(begin),
+                        "end": int(end),
+                        "records": int(count),
+                        "extreme": None if extreme is None else round(float(extreme), 2),
+                        "channels": channels})
+    return ret
+#=========================================================================================================
@@ -0,0 +1,89 @@
+from PyQt6 import QtCore
+from Lib import pipestreamdbread as pdb
+from Lib import fleet_scan as fsc
+from Lib import cancellation as cnl
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import logging
+import time
+
+
+class FleetScanThread(QtCore.QThread):
+    table_result_signal = QtCore.pyqtSignal(str, list)  # таблица, интервалы
+    progress_signal = QtCore.pyqtSignal(int, int)       # просканировано таблиц, всего
+    finished_signal = QtCore.pyqtSignal(int)            # всего интервалов
+    error_signal = QtCore.pyqtSignal(str)
+
+    def __init__(self, limits, merge_gap_ms=fsc.default_merge_gap_ms, timerange=None, parent=None):
+        super().__init__(parent)
+        self.limits = list(limits)
+        self.merge_gap_ms = merge_gap_ms
+        self.timerange = timerange
+        self.cancel_token = cnl.CancellationToken()
+
+    def cancel(self):
+        self.cancel_token.cancel()
+
+    def scan_one(self, tablename):
+        # Выполняется в пуле потоков; одно соединение из общего пула на таблицу
+        self.cancel_token.raise_if_cancelled()
+        connection, cursor, status = pdb.connect_pooled(self.cancel_token)
+        if connection == 0 or cursor == 0:
+            self.cancel_token.raise_if_cancelled()
+            raise RuntimeError(status)
+        self.cancel_token.bind_connection(connection)
+        try:
+            return fsc.scan_table(cursor, tablename, self.limits, self.merge_gap_ms, self.timerange)
+        finally:
+            self.cancel_token.release_connection(connection)
+            cursor.close()
+            pdb.release_pooled(connection)
+
+    def run(self):
+        logging.info(f"Старт скана уставок по всем логгерам: {self.limits}")
+        start_time = time.perf_counter()
+
+        connection, cursor, status = pdb.connect_pooled(self.cancel_token)
+        if connection == 0 or cursor == 0:
+            if not self.cancel_token.is_cancelled():
+                self.error_signal.emit(status)
+            return
+        try:
+            tables = pdb.get_logger_data_table_list(cursor)
+        except Exception as e:
+            self.error_signal.emit(f"Ошибка получения списка таблиц: {e}")
+            return
+        finally:
+            cursor.close()
+            pdb.release_pooled(connection)
+
+        total = 0
+        done = 0
+        # соединения выдаются через семафор пула: при занятом пуле задачи ждут, а не падают.
+        # Скан берёт не больше половины пула, чтобы загрузка трендов не вставала в очередь за ним
+        workers = max(1, pdb.pool_max_connections // 2)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self.scan_one, table): table for table in tables}
+            for future in as_completed(futures):
+                if self.cancel_token.is_cancelled():
+                    # оставшиеся задачи не стартуют, выполняющиеся запросы прерваны на сервере
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    break
+                table = futures[future]
+                done += 1
+                try:
+                    intervals = future.result()
+                except cnl.OperationCancelled:
+                    continue
+                except Exception as e:
+                    if not self.cancel_token.is_cancelled():
+                        self.error_signal.emit(f"Ошибка скана {table}: {e}")
+                    continue
+                finally:
+                    self.progress_signal.emit(done, len(tables))
+                total += len(intervals)
+                self.table_result_signal.emit(table, intervals)
+
+        logging.info(f"Скан уставок завершён: {len(tables)} таблиц, {total} интервалов "
+                     f"за {time.perf_counter() - start_time:.2f} с")
+        if not self.cancel_token.is_cancelled():
+            self.finished_signal.emit(total)
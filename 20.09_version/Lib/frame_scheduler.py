@@ -0,0 +1,62 @@
+'''
+Склейка частых событий интерфейса (перемещение курсора, изменение диапазона)
+в одно обновление за кадр отрисовки
+'''
+
+from PyQt6 import QtCore
+import logging
+
+frame_interval_ms = 16 # ~60 кадров в секунду
+
+#=========================================================================================================
+class FrameCoalescer(QtCore.QObject):
+    # Хранит только последний запрос; callback вызывается не чаще одного раза за кадр.
+    # Все запросы, перекрытые более свежими до срабатывания таймера, считаются отброшенными.
+
+    def __init__(self, callback, interval_ms: int = frame_interval_ms, parent=None):
+        super().__init__(parent)
+        self.callback = callback
+        self.pending_args = None
+        self.requested_events = 0
+        self.delivered_events = 0
+        self.dropped_events = 0
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self.flush)
+
+    def request(self, *args):
+        self.requested_events += 1
+        if self.pending_args is not None:
+            self.dropped_events += 1 # предыдущий запрос так и не был отрисован
+        self.pending_args = args
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self):
+        self.timer.stop()
+        if self.pending_args is None:
+            return
+        args = self.pending_args
+        self.pending_args = None
+        self.delivered_events += 1
+        self.callback(*args)
+
+    def cancel(self):
+        self.timer.stop()
+        if self.pending_args is not None:
+            self.dropped_events += 1
+        self.pending_args = None
+
+    def is_pending(self) -> bool:
+        return self.pending_args is not None
+
+    def reset_counters(self):
+        if self.requested_events:
+            logging.debug(f"FrameCoalescer: запросов {self.requested_events}, "
+                          f"отрисовано {self.delivered_events}, отброшено {self.dropped_events}")
+        self.requested_events = 0
+        self.delivered_events = 0
+        self.dropped_events = 0
+#=========================================================================================================
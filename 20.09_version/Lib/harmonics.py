@@ -0,0 +1,88 @@
+'''
+Гармонический анализ осциллограмм: основная частота, действующие значения
+гармоник 1..max_harmonic_order, КНИ (THD) и TDD для всех каналов за один вызов.
+Вход - пачка записей [записи, отсчёты, каналы] (или одна запись [отсчёты, каналы]),
+так что анализ годится и для окна сигналов, и для пакетных проходов по таблицам.
+
+Окно Ханна; частота основной гармоники - интерполяцией пика (signal_processing),
+амплитуда каждой гармоники - по ближайшему к h*f1 бину с поправкой на смещение
+частоты от центра бина (спад главного лепестка окна Ханна).
+'''
+
+from Lib import signal_processing as sp
+from dataclasses import dataclass
+import numpy as np
+
+max_harmonic_order = 50
+voltage_channels = 3 # первые каналы записи - напряжения, остальные - токи
+
+#=========================================================================================================
+@dataclass
+class HarmonicAnalysis:
+    frequency: np.ndarray # [записи] частота основной гармоники, Гц
+    orders: np.ndarray # [гармоники] 1..max_order
+    rms: np.ndarray # [записи, гармоники, каналы] действующие значения, В/А; NaN - выше частоты Найквиста
+    thd: np.ndarray # [записи, каналы] %
+    tdd: np.ndarray # [записи, каналы] % от тока нагрузки; NaN для каналов напряжения
+
+    def percent(self) -> np.ndarray:
+        # гармоники в % от основной [записи, гармоники, каналы]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.rms / self.rms[:, :1, :] * 100
+#=========================================================================================================
+def hann_amplitude_correction(delta: np.ndarray) -> np.ndarray:
+    # отношение амплитуды тона к его вкладу в бин при смещении delta (|delta| <= 0.5 бина)
+    x = np.pi * delta
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ret = x * (1 - delta ** 2) / np.sin(x)
+    return np.where(np.abs(delta) < 1e-9, 1.0, ret)
+#-----------------------------------------------------------------------------------------------------
+def analyze_harmonics(signals: np.ndarray, sampling: float = sp.sampling_rate, max_order: int = max_harmonic_order,
+                      demand_current=None) -> HarmonicAnalysis:
+    # demand_current - ток нагрузки для TDD (число или [каналы]); по умолчанию - наибольшее
+    # действующее значение основной гармоники канала по анализируемым записям
+    x = np.asarray(signals, dtype=np.float64)
+    if x.ndim == 2:
+        x = x[None]
+    n_rec, n, n_ch = x.shape
+    orders = np.arange(1, max_order + 1)
+
+    x = x - x.mean(axis=1, keepdims=True)
+    spectrum = np.fft.rfft(x * np.hanning(n)[None, :, None], axis=1) # [записи, бины, каналы]
+    magnitudes = np.abs(spectrum)
+    n_bins = magnitudes.shape[1]
+
+    # основная гармоника - общая для всех каналов записи, по сумме мощностей напряжений
+    reference = np.sqrt((magnitudes[:, :, :min(voltage_channels, n_ch)] ** 2).sum(axis=2))
+    df = sampling / n
+    band = np.flatnonzero((np.arange(n_bins) * df >= sp.mains_band[0]) & (np.arange(n_bins) * df <= sp.mains_band[1]))
+    if len(band) == 0:
+        band = np.array([1])
+    k1 = band[np.argmax(reference[:, band], axis=1)]
+    fundamental_bin = sp.interpolated_bin(reference, k1) # [записи], дробный
+
+    positions = fundamental_bin[:, None] * orders[None, :] # [записи, гармоники]
+    finite = np.isfinite(positions) # NaN - запись без сигнала
+    nearest = np.rint(np.where(finite, positions, 0)).astype(np.int64)
+    valid = (nearest >= 1) & (nearest < n_bins - 1) & finite
+    nearest = np.where(valid, nearest, 0)
+    delta = positions - nearest
+
+    peak = np.take_along_axis(magnitudes, nearest[:, :, None], axis=1) # [записи, гармоники, каналы]
+    amplitude = 4 * peak / n * hann_amplitude_correction(delta)[:, :, None] # сумма окна Ханна - n/2
+    rms = np.where(valid[:, :, None], amplitude / np.sqrt(2), np.nan)
+
+    distortion = np.sqrt(np.nansum(rms[:, 1:, :] ** 2, axis=1)) # [записи, каналы]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        thd = distortion / rms[:, 0, :] * 100
+
+    if demand_current is None:
+        demand = np.fmax.reduce(rms[:, 0, :], axis=0) if n_rec else np.full(n_ch, np.nan) # NaN не учитываются
+    else:
+        demand = np.broadcast_to(np.asarray(demand_current, dtype=np.float64), (n_ch,))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tdd = distortion / demand[None, :] * 100
+    tdd[:, :min(voltage_channels, n_ch)] = np.nan
+
+    return HarmonicAnalysis(fundamental_bin * df, orders, rms, thd, tdd)
+#=========================================================================================================
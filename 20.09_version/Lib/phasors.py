@@ -0,0 +1,106 @@
+'''
+Векторы (фазоры) основной гармоники всех каналов записи, симметричные
+составляющие напряжений и токов (нулевая, прямая, обратная последовательности)
+и коэффициент мощности по основной гармонике.
+Вход - пачка записей [записи, отсчёты, каналы] (или одна запись), так что
+та же функция считает и вектора текущей записи, и тренды по таблице.
+
+Вектор канала - однобинное ДПФ (то же, что алгоритм Гёрцеля) на частоте основной
+гармоники, по целому числу периодов этой частоты: без окна и без растекания,
+остальные гармоники на целом числе периодов ортогональны основной. Бин считается
+не рекурсией Гёрцеля, а одним матричным умножением опорных cos/sin на всю пачку.
+Углы отсчитываются от U_A.
+'''
+
+from Lib import signal_processing as sp
+from dataclasses import dataclass
+import numpy as np
+
+voltage_channels = 3 # первые каналы записи - напряжения фаз A, B, C, следующие три - токи
+rotation = np.exp(2j * np.pi / 3) # оператор поворота a
+
+#=========================================================================================================
+@dataclass
+class PhasorAnalysis:
+    frequency: np.ndarray # [записи] частота основной гармоники, Гц
+    phasors: np.ndarray # [записи, каналы] комплексные действующие значения, угол U_A = 0
+    voltage_sequences: np.ndarray # [записи, 3] нулевая, прямая, обратная последовательности напряжений
+    current_sequences: np.ndarray # [записи, 3] то же для токов; NaN, если токов нет
+    power_factor: np.ndarray # [записи, 3] cos φ по фазам
+    total_power_factor: np.ndarray # [записи] сумма P / сумма S по трём фазам
+
+    def magnitudes(self) -> np.ndarray:
+        return np.abs(self.phasors)
+
+    def angles(self) -> np.ndarray:
+        # градусы, -180..180
+        return np.degrees(np.angle(self.phasors))
+
+    def voltage_unbalance(self) -> np.ndarray:
+        # коэффициенты несимметрии по обратной и нулевой последовательностям, % [записи, 2]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.abs(self.voltage_sequences[:, [2, 0]]) / np.abs(self.voltage_sequences[:, 1:2]) * 100
+#=========================================================================================================
+def sequence_components(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    # вектора фаз [...] -> [..., 3]: нулевая, прямая, обратная последовательности
+    zero = (a + b + c) / 3
+    positive = (a + rotation * b + rotation ** 2 * c) / 3
+    negative = (a + rotation ** 2 * b + rotation * c) / 3
+    return np.stack([zero, positive, negative], axis=-1)
+#-----------------------------------------------------------------------------------------------------
+def fundamental_frequency(x: np.ndarray, sampling: float = sp.sampling_rate) -> np.ndarray:
+    # частота по каналу напряжения с наибольшей энергией в каждой записи [записи]
+    volts = x[:, :, :min(voltage_channels, x.shape[2])]
+    strongest = np.argmax((volts ** 2).sum(axis=1), axis=1)
+    reference = np.take_along_axis(volts, strongest[:, None, None], axis=2)[:, :, 0]
+    return np.asarray(sp.fft_frequency(reference, sampling), dtype=np.float64)
+#-----------------------------------------------------------------------------------------------------
+def compute_phasors(signals: np.ndarray, sampling: float = sp.sampling_rate, frequency=None) -> PhasorAnalysis:
+    # frequency - уже известная частота основной гармоники (число или [записи]), иначе оценивается по напряжениям
+    x = np.asarray(signals, dtype=np.float64)
+    if x.ndim == 2:
+        x = x[None]
+    n_rec, n, n_ch = x.shape
+    x = x - x.mean(axis=1, keepdims=True)
+
+    if frequency is None:
+        frequency = fundamental_frequency(x, sampling) if n_rec and n_ch else np.full(n_rec, np.nan)
+    frequency = np.broadcast_to(np.asarray(frequency, dtype=np.float64), (n_rec,)).copy()
+    valid = np.isfinite(frequency) & (frequency > 0)
+    f = np.where(valid, frequency, 0.0)
+
+    # отсчётов в целом числе периодов; запись короче периода берётся целиком
+    periods = np.floor(n * f / sampling)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        used = np.where(periods >= 1, np.rint(periods * sampling / f), n)
+    used = np.clip(used, 1, n)
+
+    t = np.arange(n)
+    phase = 2 * np.pi * f[:, None] * t[None, :] / sampling
+    inside = t[None, :] < used[:, None]
+    cosine = (np.cos(phase) * inside)[:, None, :] # [записи, 1, отсчёты]
+    sine = (np.sin(phase) * inside)[:, None, :]
+    spectrum = (cosine @ x)[:, 0, :] - 1j * (sine @ x)[:, 0, :] # [записи, каналы]
+    phasors = spectrum * np.sqrt(2) / used[:, None]
+    phasors[~valid] = np.nan
+    if n_ch:
+        reference = np.angle(phasors[:, 0])
+        phasors = phasors * np.exp(-1j * reference)[:, None]
+
+    nan3 = np.full((n_rec, 3), np.nan + 0j)
+    voltage_sequences = sequence_components(*phasors[:, :3].T) if n_ch >= 3 else nan3
+    if n_ch >= 2 * voltage_channels:
+        volts, amps = phasors[:, :3], phasors[:, 3:6]
+        current_sequences = sequence_components(*amps.T)
+        active = (volts * np.conj(amps)).real
+        apparent = np.abs(volts) * np.abs(amps)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            power_factor = active / apparent
+            total_power_factor = active.sum(axis=1) / apparent.sum(axis=1)
+    else:
+        current_sequences = nan3
+        power_factor = np.full((n_rec, 3), np.nan)
+        total_power_factor = np.full(n_rec, np.nan)
+
+    return PhasorAnalysis(frequency, phasors, voltage_sequences, current_sequences, power_factor, total_power_factor)
+#=========================================================================================================
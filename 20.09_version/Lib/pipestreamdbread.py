@@ -4,10 +4,11 @@
 '''
 
 #from Lib import bytestransforms as bt #мои функции преобразования байтовых строк и литл в биг
-from Lib import bytestransforms as bt #мои функции преобразования байтовых строк и литл в биг
 
 import psycopg2
 from psycopg2 import Error
+from psycopg2 import pool
+import threading
 import base64
 import datetime
 import sys
@@ -33,6 +34,13 @@ db_connection_params = {"user": "postgres",
     "port": "5432",
     "database": "postgres"}
 
+pool_max_connections = 8
+pool_wait_poll = 0.1 # с, период проверки отмены при ожидании свободного соединения
+connection_pool = None
+connection_pool_lock = threading.Lock()
+# getconn при исчерпанном пуле не ждёт, а бросает PoolError - очередь к пулу держит семафор
+connection_slots = threading.BoundedSemaphore(pool_max_connections)
+
 #=========================================================================================================
 @dataclass
 class Timerange:
@@ -62,6 +70,58 @@ def connect_db(params):
 
     return connection, cursor, str(status)
 #-----------------------------------------------------------------------------------------------------
+def get_connection_pool():
+    # Общий потокобезопасный пул соединений для параллельных загрузок
+    global connection_pool
+    with connection_pool_lock:
+        if connection_pool is None or connection_pool.closed:
+            connection_pool = pool.ThreadedConnectionPool(1, pool_max_connections,
+                                                          user=db_connection_params["user"],
+                                                          password=db_connection_params["password"],
+                                                          host=db_connection_params["host"],
+                                                          port=db_connection_params["port"],
+                                                          database=db_connection_params["database"])
+        return connection_pool
+#-----------------------------------------------------------------------------------------------------
+def connect_pooled(cancel_token=None):
+    # То же, что connect_db, но соединение берётся из пула; вернуть через release_pooled.
+    # Если все соединения пула заняты, ждёт освобождения; cancel_token прерывает ожидание
+    status = "OK"
+    while not connection_slots.acquire(timeout=pool_wait_poll):
+        if cancel_token is not None and cancel_token.is_cancelled():
+            return 0, 0, "Ожидание соединения из пула отменено"
+    connection = None
+    try:
+        connection = get_connection_pool().getconn()
+        cursor = connection.cursor()
+    except (Exception, Error) as status:
+        logging.error(f"Ошибка получения соединения из пула: {status}")
+        if connection is not None:
+            release_pooled(connection)
+        else:
+            connection_slots.release()
+        return 0, 0, str(status)
+
+    return connection, cursor, str(status)
+#-----------------------------------------------------------------------------------------------------
+def release_pooled(connection):
+    # незавершённая (в т.ч. прерванная) транзакция откатывается пулом при возврате
+    try:
+        get_connection_pool().putconn(connection)
+    except (Exception, Error) as e:
+        logging.warning(f"Ошибка возврата соединения в пул: {e}")
+        connection.close()
+    finally:
+        connection_slots.release()
+#-----------------------------------------------------------------------------------------------------
+def close_connection_pool():
+    # при закрытии приложения; фоновые потоки к этому моменту должны вернуть соединения
+    global connection_pool
+    with connection_pool_lock:
+        if connection_pool is not None and not connection_pool.closed:
+            connection_pool.closeall()
+        connection_pool = None
+#-----------------------------------------------------------------------------------------------------
 def get_logger_data_table_list(cursor):
 #Получить список таблиц логгеров, чьи имена соответствуют regexp 'logger_[0-9]*_data'
 
@@ -111,9 +171,10 @@ def get_record_list_with_filter(cursor, tablename: str, timerange: Timerange) ->
 
     return record_list # возвращает список timestamp
 #-----------------------------------------------------------------------------------------------------
-def get_first_record(cursor, tablename: str) -> dict:
-
-    colnames_list = get_column_names(cursor, tablename)
+def get_first_record(cursor, tablename: str, colnames_list: list = None) -> dict:
+    # colnames_list - столбцы таблицы, если уже известны (или получены не через information_schema)
+    if colnames_list is None:
+        colnames_list = get_column_names(cursor, tablename)
     colnames_str = ", ".join(colnames_list)
 
     query_first = f'''SELECT {colnames_str} FROM {tablename} 
@@ -126,9 +187,10 @@ def get_first_record(cursor, tablename: str) -> dict:
 
     return first_dict
 #-----------------------------------------------------------------------------------------------------
-def get_last_record(cursor, tablename: str):
+def get_last_record(cursor, tablename: str, colnames_list: list = None):
 
-    colnames_list = get_column_names(cursor, tablename)
+    if colnames_list is None:
+        colnames_list = get_column_names(cursor, tablename)
     colnames_str = ", ".join(colnames_list)
 
     query_last = f'''SELECT {colnames_str} FROM {tablename} 
@@ -167,9 +229,10 @@ def get_column_names(cursor, tablename: str) -> list:
 
     return colnames_list
 # -----------------------------------------------------------------------------------------------------
-def get_table_description(cursor, tablename):
+def get_table_description(cursor, tablename, colnames_list: list = None):
 
-    colnames_list = get_column_names(cursor, tablename)
+    if colnames_list is None:
+        colnames_list = get_column_names(cursor, tablename)
 
     table_cols_list = ["timestamp", "gps_latitude", "gps_longitude"]
     query_colnames = set(colnames_list).intersection(set(table_cols_list))
@@ -255,60 +318,112 @@ def get_record(cursor, tablename:str, timestamp, colnames_list):
     record_dict = dict(zip(colnames_list, record_tuple))
 
     return record_dict
+#-----------------------------------------------------------------------------------------------------
+def adc_to_physical(adc_values, mult, div) -> np.ndarray:
+    # векторное преобразование сырых значений АЦП (столбцы add_data_*) в В/А, None -> NaN
+    # floor(x / 4) совпадает с adc_int >> 2 и для отрицательных значений
+    raw = np.array(adc_values, dtype=np.float64)
+    if mult is None or div is None or div == 0:
+        return np.full(len(raw), np.nan)
+    coeff = (mult / div) / (ADC_raw_max / ADC_full_scale_V)
+    return np.round(coeff * np.floor(raw / 4), 2)
+#-----------------------------------------------------------------------------------------------------
+def physical_to_adc_threshold(value: float, mult, div, above: bool = True) -> int:
+    # Обратное к adc_to_physical для уставок: граница в сырых единицах АЦП.
+    # above=True:  физ. значение > value  <=>  adc >= результат
+    # above=False: физ. значение < value  <=>  adc <  результат
+    coeff = (mult / div) / (ADC_raw_max / ADC_full_scale_V)
+    q = value / coeff
+    if above:
+        return 4 * (int(np.floor(q)) + 1)
+    return 4 * int(np.ceil(q))
+#-----------------------------------------------------------------------------------------------------
+def get_scaling_pairs(cursor, tablename: str, kind: str = "voltage") -> list:
+    # Различные пары (множитель, делитель) канала в таблице; kind - "voltage" или "current"
+    query = f'''SELECT DISTINCT cfg_{kind}_multiplier, cfg_{kind}_divider FROM {tablename}
+            WHERE cfg_{kind}_multiplier IS NOT NULL AND cfg_{kind}_divider IS NOT NULL
+            AND cfg_{kind}_divider <> 0'''
+    cursor.execute(query)
+    return [(float(m), float(d)) for m, d in cursor.fetchall() if m > 0]
+#-----------------------------------------------------------------------------------------------------
+def has_valid_add_data(cursor, tablename: str) -> bool:
+    # есть ли в таблице хотя бы одно заполненное значение СКЗ от логгера
+    cursor.execute(f"SELECT 1 FROM {tablename} WHERE add_data_0 IS NOT NULL AND add_data_0 <> 0 LIMIT 1")
+    return cursor.fetchone() is not None
+#=========================================================================================================
+def signal_coefficients(rec: dict) -> tuple:
+    # множители пересчёта (adc >> 2) в В и А для записи
+    volt = (rec["cfg_voltage_multiplier"] / rec["cfg_voltage_divider"]) / (ADC_raw_max / ADC_full_scale_V)
+    curr = (rec["cfg_current_multiplier"] / rec["cfg_current_divider"]) / (ADC_raw_max / ADC_full_scale_V)
+    return volt, curr
+#-----------------------------------------------------------------------------------------------------
+def decode_adc_cells(cells: np.ndarray) -> np.ndarray:
+    # cells - uint8 [..., 3], 24-битные знаковые little-endian значения -> int32 (adc >> 2)
+    raw = cells[..., 0].astype(np.int32) | (cells[..., 1].astype(np.int32) << 8) | (cells[..., 2].astype(np.int32) << 16)
+    raw -= (raw & 0x800000) << 1 # расширение знака
+    return raw >> 2
+#-----------------------------------------------------------------------------------------------------
+def points_payload(rec: dict):
+    # байты отсчётов записи без преамбулы или None при ошибке размера
+    channels_num = rec["mask"].count("1")
+    npoints = rec["npoints"]
+    byte_string = base64.b64decode(rec["points"])
+    rec_len = npoints * cellsize * channels_num
+    if len(byte_string) < rec_len + preamble_size:
+        return None
+    return byte_string[preamble_size:preamble_size + rec_len]
+#-----------------------------------------------------------------------------------------------------
+def decode_records_batch(recs: list) -> dict:
+    # Пакетное декодирование points многих записей за один проход NumPy.
+    # Записи группируются по (npoints, число каналов); возвращает
+    # {(npoints, channels_num): (индексы записей в recs, сигналы float64 [записи, npoints, каналы])}.
+    # Записи с ошибкой размера пропускаются.
+    groups = {}
+    for i, rec in enumerate(recs):
+        payload = points_payload(rec)
+        if payload is None:
+            logging.error(f"Ошибка размера массива точек в записи {rec.get('timestamp')}")
+            continue
+        key = (rec["npoints"], rec["mask"].count("1"))
+        groups.setdefault(key, ([], []))
+        groups[key][0].append(i)
+        groups[key][1].append(payload)
+
+    ret = {}
+    for (npoints, channels_num), (indices, payloads) in groups.items():
+        cells = np.frombuffer(b"".join(payloads), dtype=np.uint8).reshape(len(indices), npoints, channels_num, cellsize)
+        adc = decode_adc_cells(cells)
+
+        coeffs = np.empty((len(indices), 1, channels_num), dtype=np.float64)
+        for k, i in enumerate(indices):
+            volt, curr = signal_coefficients(recs[i])
+            coeffs[k, 0, :3] = volt # сначала идут 3 канала напряжения
+            coeffs[k, 0, 3:] = curr
+        ret[(npoints, channels_num)] = (indices, adc * coeffs)
+    return ret
 #=========================================================================================================
 @dataclass
 class LogRecord:
     rec: dict
         
     def get_signals(self):
-        
-        mask = self.rec["mask"]
-        channels_num = mask.count("1") #число единичек в строке - маске дает число каналов
-    
-        npoints = self.rec["npoints"] #число сэмплов
-    
-        byte_string = base64.b64decode(self.rec["points"]) #строка base64
-    
-        rec_len = npoints * cellsize * channels_num
-    
-        strlen = len(byte_string)
-        if strlen < rec_len+preamble_size:
+        # декодирование всех отсчётов разом (см. decode_adc_cells); результат - [npoints, каналы]
+        if "signals" in self.rec:
+            return self.rec["signals"] # запись из локального архива (Lib/waveform_archive.py) уже декодирована
+        payload = points_payload(self.rec)
+        if payload is None:
             logging.error("Ошибка размера массива точек в get_byte_string")
             return []
-        
-        signals = np.empty([npoints, channels_num])
-        
-        VoltMult = self.rec["cfg_voltage_multiplier"]
-        VoltDiv = self.rec["cfg_voltage_divider"]
-
-        CurrMult = self.rec["cfg_current_multiplier"]
-        CurrDiv = self.rec["cfg_current_divider"]
-        
-        
-        for i in range(npoints):
-            a = i * cellsize * channels_num + preamble_size
-            b = a + cellsize * channels_num
-            sample = byte_string[a:b]
-
 
-            for j in range(channels_num):
-                c = j * cellsize
-                d = c + cellsize
-
-                adc_raw_value = bt.reverse_bytes_order(sample[c:d])
-                adc_int = bt.bytesToIntBig(adc_raw_value)
-
-
-                if j in range(3): # сначала удут 3 канала напряжения
-                    real_value =  ((VoltMult / VoltDiv ) / ( ADC_raw_max / ADC_full_scale_V )) * (adc_int >> 2) 
-                else:
-                    real_value = ((CurrMult / CurrDiv ) / ( ADC_raw_max / ADC_full_scale_V )) * (adc_int >> 2) 
+        channels_num = self.rec["mask"].count("1") #число единичек в строке - маске дает число каналов
+        npoints = self.rec["npoints"] #число сэмплов
 
+        cells = np.frombuffer(payload, dtype=np.uint8).reshape(npoints, channels_num, cellsize)
+        volt, curr = signal_coefficients(self.rec)
+        coeffs = np.full(channels_num, curr)
+        coeffs[:3] = volt # сначала идут 3 канала напряжения
 
-                signals[i, j] = real_value
-                
-                
-        return signals
+        return decode_adc_cells(cells) * coeffs
     
 
     def get_record_dict(self) -> dict:
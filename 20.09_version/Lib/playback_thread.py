@@ -0,0 +1,137 @@
+'''
+Воспроизведение осциллограмм в окне сигналов. Фоновый поток заранее читает
+записи с заданным шагом (пачками, одним запросом на пачку), декодирует points
+и складывает готовые кадры в ограниченную очередь; окно забирает кадры по таймеру.
+Позиция воспроизведения задаётся временем от старта, а не числом показанных
+кадров: если чтение или отрисовка не успевают, отставшие кадры пропускаются.
+'''
+
+from PyQt6 import QtCore
+from Lib import pipestreamdbread as pdb
+from Lib import storage_backend as sbk
+from Lib import cancellation as cnl
+from dataclasses import dataclass
+import logging
+import queue
+
+playback_queue_size = 16 # готовых кадров впереди позиции воспроизведения
+playback_batch = 8 # записей на один запрос к источнику
+playback_default_fps = 10.0
+playback_max_fps = 60.0
+
+#=========================================================================================================
+@dataclass
+class PlaybackFrame:
+    sequence: int # номер кадра от начала воспроизведения
+    rec_num: int # номер записи в списке штампов окна (с 1)
+    record: dict # запись с уже декодированными сигналами (ключ "signals")
+#=========================================================================================================
+class PlaybackThread(QtCore.QThread):
+    # Производитель кадров: записи start_num, start_num + step, ... до конца списка штампов.
+    # Окно сообщает текущую позицию через playhead - кадры раньше неё не читаются.
+    error_signal = QtCore.pyqtSignal(str)
+
+    def __init__(self, tablename, colnames_list, timestamps, start_num, step, archive=None, parent=None):
+        super().__init__(parent)
+        self.tablename = tablename
+        self.colnames_list = list(colnames_list)
+        self.timestamps = timestamps
+        self.start_num = start_num
+        self.step = max(1, step)
+        self.archive = archive # wfa.WaveformArchive или None - чтение из БД
+        self.frames = queue.Queue(maxsize=playback_queue_size)
+        self.playhead = 0
+        self.ahead = None # кадр из очереди, ещё не дошедший до позиции (сторона окна)
+        self.finished_reading = False
+        self.cancel_token = cnl.CancellationToken()
+
+    def cancel(self):
+        self.cancel_token.cancel()
+
+    def frame_count(self) -> int:
+        if self.start_num > len(self.timestamps):
+            return 0
+        return (len(self.timestamps) - self.start_num) // self.step + 1
+
+    def rec_num(self, sequence: int) -> int:
+        return self.start_num + sequence * self.step
+    #-----------------------------------------------------------------------------------------------------
+    def put(self, frame):
+        # блокируется, пока очередь полна; отмена проверяется между попытками
+        while True:
+            self.cancel_token.raise_if_cancelled()
+            try:
+                self.frames.put(frame, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def take(self, sequence: int):
+        # последний готовый кадр не позже sequence (более ранние отбрасываются) или None;
+        # кадр, до которого позиция ещё не дошла, придерживается до следующего вызова
+        frame = None
+        while True:
+            if self.ahead is None:
+                try:
+                    self.ahead = self.frames.get_nowait()
+                except queue.Empty:
+                    break
+            if self.ahead.sequence > sequence:
+                break
+            frame, self.ahead = self.ahead, None
+        return frame
+
+    def is_exhausted(self) -> bool:
+        return self.finished_reading and self.frames.empty() and self.ahead is None
+    #-----------------------------------------------------------------------------------------------------
+    def read_batch(self, backend, cursor, nums: list) -> list:
+        if self.archive is not None:
+            return [self.archive.record(num - 1) for num in nums]
+        wanted = [self.timestamps[num - 1] for num in nums]
+        by_timestamp = {rec["timestamp"]: rec
+                        for rec in backend.get_records(cursor, self.tablename, wanted, self.colnames_list)}
+        return [by_timestamp.get(timestamp) for timestamp in wanted]
+
+    def run(self):
+        backend = sbk.get_backend()
+        connection = None
+        cursor = None
+        try:
+            if self.archive is None:
+                connection, cursor, status = backend.connect()
+                if connection == 0 or cursor == 0:
+                    connection = None
+                    self.error_signal.emit(status)
+                    return
+
+            count = self.frame_count()
+            sequence = 0
+            while sequence < count:
+                self.cancel_token.raise_if_cancelled()
+                sequence = max(sequence, self.playhead) # отставшие от позиции кадры не читаются
+                batch = list(range(sequence, min(sequence + playback_batch, count)))
+                if not batch:
+                    break
+                nums = [self.rec_num(seq) for seq in batch]
+                for seq, num, rec in zip(batch, nums, self.read_batch(backend, cursor, nums)):
+                    if rec is None:
+                        continue
+                    try:
+                        rec["signals"] = pdb.LogRecord(rec).get_signals()
+                    except Exception as e:
+                        logging.warning(f"Воспроизведение {self.tablename}: запись {num} пропущена ({e})")
+                        continue
+                    self.put(PlaybackFrame(seq, num, rec))
+                sequence = batch[-1] + 1
+
+        except cnl.OperationCancelled:
+            logging.info(f"Воспроизведение {self.tablename} остановлено")
+
+        except Exception as e:
+            self.error_signal.emit(f"Ошибка чтения записей для воспроизведения: {str(e)}")
+
+        finally:
+            self.finished_reading = True
+            if connection:
+                backend.close(connection, cursor)
+#=========================================================================================================
@@ -0,0 +1,73 @@
+'''
+Декодирование points пачки записей окна сигналов в общем пуле процессов.
+Записи делятся на задачи по batch_decode_chunk; процесс пула декодирует свою часть
+(pdb.decode_records_batch) и возвращает сигналы через общую память (shared_arrays),
+так что декодирование не держит GIL потока чтения и интерфейса, а сигналы
+не сериализуются обратно.
+'''
+
+from Lib import pipestreamdbread as pdb
+from Lib import process_pool as ppl
+from Lib import shared_arrays as sha
+import numpy as np
+
+batch_decode_chunk = 16 # записей на одну задачу пула процессов
+
+#=========================================================================================================
+def decode_records_shared(recs: list) -> list:
+    # Точка входа для процесса пула: по описателю блока на каждую форму записи,
+    # в блоке "indices" (номера записей в recs) и "signals" [записи, отсчёты, каналы]
+    ret = []
+    for indices, signals in pdb.decode_records_batch(recs).values():
+        ret.append(sha.share_arrays({"indices": np.asarray(indices, dtype=np.int64), "signals": signals}))
+    return ret
+#=========================================================================================================
+class DecodedBatch:
+    # Группы (номера записей, сигналы [записи, отсчёты, каналы]); сигналы - отображения
+    # на общую память и действительны до release()
+
+    def __init__(self):
+        self.groups = []
+        self.blocks = []
+
+    def attach(self, descriptor: sha.SharedArraysDescriptor, offset: int):
+        # offset - номер первой записи задачи в общей пачке
+        block = sha.SharedBlock(descriptor)
+        self.blocks.append(block)
+        self.groups.append((block.array("indices") + offset, block.array("signals")))
+
+    def release(self):
+        self.groups = []
+        for block in self.blocks:
+            block.release()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+#-----------------------------------------------------------------------------------------------------
+def decode_records_pooled(recs: list, cancel_token=None) -> DecodedBatch:
+    # То же, что pdb.decode_records_batch, но в пуле процессов; группы одной формы
+    # из разных задач не склеиваются (это была бы лишняя копия)
+    pool = ppl.get_process_pool()
+    futures = [(start, pool.submit(decode_records_shared, recs[start:start + batch_decode_chunk]))
+               for start in range(0, len(recs), batch_decode_chunk)]
+    batch = DecodedBatch()
+    try:
+        while futures:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            start, future = futures[0]
+            for descriptor in future.result():
+                batch.attach(descriptor, start)
+            futures.pop(0)
+    except BaseException:
+        batch.release()
+        for _, future in futures:
+            future.cancel()
+        sha.release_futures([future for _, future in futures])
+        raise
+    return batch
+#=========================================================================================================
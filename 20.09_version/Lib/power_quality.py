@@ -0,0 +1,159 @@
+'''
+Производные показатели качества электроэнергии по сырым отсчётам (points):
+действующее значение и фаза основной гармоники, КНИ (THD), активная, реактивная
+и полная мощность по фазам, коэффициент несимметрии напряжений по обратной
+последовательности, частота сети, симметричные составляющие и коэффициент
+мощности по векторам основной гармоники (Lib/phasors.py). Всё считается сразу
+для пачки записей [записи, отсчёты, каналы].
+'''
+
+from Lib import pipestreamdbread as pdb
+from Lib import shared_arrays as sha
+from Lib import signal_processing as sp
+from Lib import phasors as phs
+import numpy as np
+
+sampling_rate = 25600
+nominal_frequency = 50.0
+mains_band = (40.0, 70.0)  # поиск основной гармоники, Гц
+max_harmonic = 40
+lobe_half_width = 2        # бинов по обе стороны от гармоники (окно Ханна)
+
+signal_channel_names = ["U_A", "U_B", "U_C", "I_A", "I_B", "I_C"]
+phases = ["A", "B", "C"]
+sequence_names = ["zero", "pos", "neg"] # порядок составляющих в phasors.PhasorAnalysis
+
+pq_channel_names = ([f"{ch}_h1" for ch in signal_channel_names] +
+                    [f"{ch}_phi" for ch in signal_channel_names] +
+                    [f"THD_{ch}" for ch in signal_channel_names] +
+                    [f"P_{ph}" for ph in phases] +
+                    [f"Q_{ph}" for ph in phases] +
+                    [f"S_{ph}" for ph in phases] +
+                    ["U_unbalance", "F"] +
+                    [f"{kind}_{seq}" for kind in ("U", "I") for seq in sequence_names] +
+                    [f"PF_{ph}" for ph in phases] + ["PF"])
+
+pq_channel_titles = {"h1": "Основная гармоника, В/А", "phi": "Фаза относительно U_A, °", "THD": "КНИ, %",
+                     "P": "Активная мощность, Вт", "Q": "Реактивная мощность, вар", "S": "Полная мощность, ВА",
+                     "U_unbalance": "Несимметрия напряжений, %", "F": "Частота, Гц",
+                     "zero": "Нулевая последовательность, В/А", "pos": "Прямая последовательность, В/А",
+                     "neg": "Обратная последовательность, В/А", "PF": "Коэффициент мощности"}
+
+# столбцы, нужные для расчёта по сырым отсчётам
+points_columns = ["timestamp", "points", "npoints", "mask",
+                  "cfg_voltage_multiplier", "cfg_voltage_divider", "cfg_current_multiplier", "cfg_current_divider"]
+
+#=========================================================================================================
+def pq_channel_title(name: str) -> str:
+    # подпись оси для показателя: "THD_U_A" -> "КНИ, %", "I_B_phi" -> "Фаза ...", ...
+    if name in pq_channel_titles:
+        return pq_channel_titles[name]
+    suffix = name.rsplit("_", 1)[-1]
+    if suffix in pq_channel_titles:
+        return pq_channel_titles[suffix]
+    return pq_channel_titles.get(name.split("_", 1)[0], "")
+#-----------------------------------------------------------------------------------------------------
+def compute_pq_metrics(signals: np.ndarray, fs: float = sampling_rate) -> dict:
+    # signals - [записи, отсчёты, каналы] в В/А; возвращает {показатель: массив [записи]}
+    n_rec, n, n_ch = signals.shape
+    ret = {name: np.full(n_rec, np.nan) for name in pq_channel_names}
+    if n_rec == 0 or n < 8:
+        return ret
+
+    x = signals - signals.mean(axis=1, keepdims=True)
+    window = np.hanning(n)
+    spectrum = np.fft.rfft(x * window[None, :, None], axis=1)   # [записи, частоты, каналы]
+    power = spectrum.real ** 2 + spectrum.imag ** 2
+    n_freq = spectrum.shape[1]
+    df = fs / n
+
+    # бин основной гармоники - один на запись, по сумме напряжений (по токам при их отсутствии)
+    freqs = np.arange(n_freq) * df
+    band = np.flatnonzero((freqs >= mains_band[0]) & (freqs <= mains_band[1]))
+    if len(band) == 0:
+        band = np.array([max(1, int(round(nominal_frequency / df)))])
+    ref = power[:, band, :min(3, n_ch)].sum(axis=2)
+    k0 = band[np.argmax(ref, axis=1)]                           # [записи]
+    # частота - интерполяция пика по тому же спектру (у всех фаз одна частота, отношение модулей бинов общее)
+    ret["F"] = sp.interpolated_bin(np.sqrt(power[:, :, :min(3, n_ch)].sum(axis=2)), k0) * df
+
+    # энергия каждой гармоники - сумма по главному лепестку окна
+    hw = min(lobe_half_width, max(0, (int(round(nominal_frequency / df)) - 1) // 2))
+    harmonics = np.arange(1, max_harmonic + 1)
+    centers = k0[:, None] * harmonics[None, :]                  # [записи, гармоники]
+    valid = centers + hw < n_freq
+    offsets = np.arange(-hw, hw + 1)
+    bins = np.clip(centers[:, :, None] + offsets[None, None, :], 0, n_freq - 1).reshape(n_rec, -1)
+    lobes = np.take_along_axis(power, bins[:, :, None], axis=1).reshape(n_rec, len(harmonics), len(offsets), n_ch)
+    energy = lobes.sum(axis=2) * valid[:, :, None]
+    harmonic_rms2 = 2.0 * energy / (n * n * np.mean(window ** 2))  # квадрат действующего значения
+
+    h1 = np.sqrt(harmonic_rms2[:, 0, :])                        # [записи, каналы]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        thd = np.sqrt(harmonic_rms2[:, 1:, :].sum(axis=1)) / h1 * 100
+
+    phasors = spectrum[np.arange(n_rec), k0, :]                 # [записи, каналы]
+    angles = np.angle(phasors)
+    rel_phase = np.degrees(np.angle(np.exp(1j * (angles - angles[:, :1]))))
+
+    for j in range(min(n_ch, len(signal_channel_names))):
+        ch = signal_channel_names[j]
+        ret[f"{ch}_h1"] = h1[:, j]
+        ret[f"{ch}_phi"] = rel_phase[:, j]
+        ret[f"THD_{ch}"] = thd[:, j]
+
+    if n_ch >= 6:
+        # по гармоникам, а не по среднему u*i: запись содержит нецелое число периодов
+        cross = spectrum[:, :, :3] * np.conj(spectrum[:, :, 3:6])
+        cross_lobes = np.take_along_axis(cross, bins[:, :, None], axis=1).reshape(n_rec, len(harmonics), len(offsets), 3)
+        p = 2.0 * (cross_lobes.real.sum(axis=2) * valid[:, :, None]).sum(axis=1) / (n * n * np.mean(window ** 2))
+        rms = np.sqrt(harmonic_rms2.sum(axis=1))
+        s = rms[:, :3] * rms[:, 3:6]
+        q = h1[:, :3] * h1[:, 3:6] * np.sin(angles[:, :3] - angles[:, 3:6]) # по основной гармонике
+        for j, ph in enumerate(phases):
+            ret[f"P_{ph}"] = p[:, j]
+            ret[f"Q_{ph}"] = q[:, j]
+            ret[f"S_{ph}"] = s[:, j]
+
+    if n_ch >= 3:
+        a = np.exp(2j * np.pi / 3)
+        va, vb, vc = phasors[:, 0], phasors[:, 1], phasors[:, 2]
+        v1 = (va + a * vb + a * a * vc) / 3
+        v2 = (va + a * a * vb + a * vc) / 3
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ret["U_unbalance"] = np.abs(v2) / np.abs(v1) * 100
+
+    # симметричные составляющие и cos φ - по векторам на целом числе периодов найденной частоты
+    vectors = phs.compute_phasors(signals, fs, ret["F"])
+    for k, seq in enumerate(sequence_names):
+        ret[f"U_{seq}"] = np.abs(vectors.voltage_sequences[:, k])
+        ret[f"I_{seq}"] = np.abs(vectors.current_sequences[:, k])
+    for j, phase in enumerate(phases):
+        ret[f"PF_{phase}"] = vectors.power_factor[:, j]
+    ret["PF"] = vectors.total_power_factor
+
+    return ret
+#-----------------------------------------------------------------------------------------------------
+def records_pq_metrics(rows: list, shared: bool = False):
+    # Точка входа для процесса пула: rows - кортежи в порядке points_columns.
+    # Возвращает (штампы времени int64, {показатель: float32}) в порядке rows,
+    # при shared=True - описатель блока общей памяти с "timestamps" и столбцами показателей.
+    recs = [dict(zip(points_columns, row)) for row in rows]
+    timestamps = np.array([rec["timestamp"] for rec in recs], dtype=np.int64)
+    columns = {name: np.full(len(recs), np.nan, dtype=np.float32) for name in pq_channel_names}
+
+    usable = [k for k, rec in enumerate(recs)
+              if rec["points"] and rec["npoints"] and rec["mask"]
+              and rec["cfg_voltage_divider"] and rec["cfg_current_divider"]
+              and rec["cfg_voltage_multiplier"] is not None and rec["cfg_current_multiplier"] is not None]
+    groups = pdb.decode_records_batch([recs[k] for k in usable])
+    for indices, signals in groups.values():
+        metrics = compute_pq_metrics(signals)
+        target = np.asarray([usable[k] for k in indices])
+        for name, values in metrics.items():
+            columns[name][target] = values
+
+    if shared:
+        return sha.share_arrays({"timestamps": timestamps, **columns})
+    return timestamps, columns
+#=========================================================================================================
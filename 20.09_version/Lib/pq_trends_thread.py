@@ -0,0 +1,111 @@
+from PyQt6 import QtCore
+from Lib import pipestreamdbread as pdb
+from Lib import power_quality as pq
+from Lib import process_pool as ppl
+from Lib import trend_store as ts
+from Lib import cancellation as cnl
+from Lib import shared_arrays as sha
+from collections import deque
+import logging
+import time
+
+pq_chunk_size = 64 # записей на одну задачу пула процессов
+
+
+class PQTrendsThread(QtCore.QThread):
+    # Читает points таблицы серверным курсором и раздаёт пачки записей пулу процессов;
+    # результаты отдаются блоками TrendStore (каналы pq.pq_channel_names) в порядке времени
+    block_loaded = QtCore.pyqtSignal(object)
+    loading_finished = QtCore.pyqtSignal(int)
+    error_occurred = QtCore.pyqtSignal(str)
+    progress_updated = QtCore.pyqtSignal(int)
+
+    def __init__(self, table_name, chunk_size=pq_chunk_size, parent=None):
+        super().__init__(parent)
+        self.table_name = table_name
+        self.chunk_size = chunk_size
+        self.cancel_token = cnl.CancellationToken()
+
+    def cancel(self):
+        self.cancel_token.cancel()
+
+    def emit_result(self, future):
+        # массивы читаются прямо из общей памяти процесса пула и один раз копируются в блок
+        with sha.SharedBlock(future.result()) as block:
+            store = ts.TrendStore.from_arrays(block.array("timestamps"),
+                                              {name: block.array(name) for name in pq.pq_channel_names},
+                                              pq.pq_channel_names)
+        if len(store):
+            self.block_loaded.emit(store)
+        return len(store)
+
+    def run(self):
+        connection = None
+        pending = deque()
+        start_time = time.perf_counter()
+        try:
+            connection, cursor, status = pdb.connect_pooled(self.cancel_token)
+            if connection == 0 or cursor == 0:
+                connection = None
+                self.cancel_token.raise_if_cancelled()
+                self.error_occurred.emit(f"Ошибка подключения к БД: {status}")
+                return
+
+            self.cancel_token.bind_connection(connection)
+            self.cancel_token.raise_if_cancelled()
+
+            colnames_list = pdb.get_column_names(cursor, self.table_name)
+            if not all(col in colnames_list for col in pq.points_columns):
+                self.error_occurred.emit(f"Ошибка: Таблица {self.table_name} не содержит столбцов с отсчётами")
+                return
+
+            total_records = pdb.get_table_row_num(cursor, self.table_name)
+            if total_records == 0:
+                self.error_occurred.emit(f"Нет данных в таблице {self.table_name}")
+                return
+
+            pool = ppl.get_process_pool()
+            max_pending = 2 * ppl.process_workers # ограничение памяти: не больше двух пачек на процесс
+
+            query = f"SELECT {', '.join(pq.points_columns)} FROM {self.table_name} ORDER BY timestamp ASC"
+            block_cursor = connection.cursor(name=f"pq_{self.table_name}")
+            block_cursor.itersize = self.chunk_size * max_pending
+            block_cursor.execute(query)
+
+            done = 0
+            while True:
+                self.cancel_token.raise_if_cancelled()
+                rows = block_cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                pending.append(pool.submit(pq.records_pq_metrics, rows, True))
+
+                # результаты выдаются по порядку отправки - хранилище растёт только в конец
+                while pending and (len(pending) >= max_pending or pending[0].done()):
+                    done += self.emit_result(pending.popleft())
+                    self.progress_updated.emit(min(100, int(done / total_records * 100)))
+                    self.cancel_token.raise_if_cancelled()
+
+            block_cursor.close()
+            while pending:
+                self.cancel_token.raise_if_cancelled()
+                done += self.emit_result(pending.popleft())
+                self.progress_updated.emit(min(100, int(done / total_records * 100)))
+
+            logging.info(f"Показатели качества {self.table_name}: {done} записей "
+                         f"за {time.perf_counter() - start_time:.2f} с")
+            self.loading_finished.emit(done)
+
+        except Exception as e:
+            if self.cancel_token.is_cancelled():
+                logging.info(f"Расчёт показателей качества {self.table_name} отменён")
+            else:
+                self.error_occurred.emit(f"Ошибка расчёта показателей качества: {str(e)}")
+
+        finally:
+            for future in pending:
+                future.cancel()
+            sha.release_futures(pending)
+            if connection:
+                self.cancel_token.release_connection(connection)
+                pdb.release_pooled(connection)
@@ -0,0 +1,33 @@
+'''
+Общий пул процессов для тяжёлых вычислений над отсчётами (БПФ, СКЗ по многим записям).
+Процессы запускаются методом spawn: fork из многопоточного Qt-приложения небезопасен.
+Пул создаётся при первом обращении и переиспользуется всеми загрузками.
+'''
+
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import threading
+import logging
+import os
+
+process_workers = max(1, (os.cpu_count() or 2) - 1) # одно ядро остаётся интерфейсу и БД
+process_pool = None
+process_pool_lock = threading.Lock()
+
+#=========================================================================================================
+def get_process_pool() -> ProcessPoolExecutor:
+    global process_pool
+    with process_pool_lock:
+        if process_pool is None:
+            process_pool = ProcessPoolExecutor(max_workers=process_workers,
+                                               mp_context=multiprocessing.get_context("spawn"))
+            logging.info(f"Запущен пул вычислительных процессов: {process_workers}")
+        return process_pool
+#-----------------------------------------------------------------------------------------------------
+def shutdown_process_pool():
+    global process_pool
+    with process_pool_lock:
+        if process_pool is not None:
+            process_pool.shutdown(wait=False, cancel_futures=True)
+        process_pool = None
+#=========================================================================================================
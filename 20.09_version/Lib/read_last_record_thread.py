@@ -1,5 +1,5 @@
 from PyQt6 import QtCore
-from Lib import pipestreamdbread as pdb
+from Lib import storage_backend as sbk
 import logging
 
 
@@ -23,19 +23,17 @@ class ReadLastRecordThread(QtCore.QThread):
 
         logging.info(f"Вычитывание последней записи {self.tablename} в потоке")
 
-        connection, cursor, status = pdb.connect_db(pdb.db_connection_params)
+        backend = sbk.get_backend()
+        connection, cursor, status = backend.connect()
 
         if connection == 0 or cursor == 0:
             self.error_signal.emit(status)
             return
 
-        last_rec_dict, rec_num, colnames_list = pdb.get_last_record(cursor, self.tablename)
+        last_rec_dict, rec_num, colnames_list = backend.last_record(cursor, self.tablename)
 
         self.result_signal.emit(self.tablename, colnames_list, last_rec_dict, rec_num)
 
         #---------------------------------------------
         #штатно закрываем соединение
-        if connection:
-            cursor.close()
-            connection.close()
-            logging.info(f"Соединение с PostgreSQL закрыто")   
\ No newline at end of file
+        backend.close(connection, cursor)
\ No newline at end of file
@@ -1,5 +1,5 @@
 from PyQt6 import QtCore
-from Lib import pipestreamdbread as pdb
+from Lib import storage_backend as sbk
 import logging
 
 
@@ -23,19 +23,17 @@ class ReadRecordThread(QtCore.QThread):
 
         self.running = True
 
-        connection, cursor, status = pdb.connect_db(pdb.db_connection_params)
+        backend = sbk.get_backend()
+        connection, cursor, status = backend.connect()
 
         if connection == 0 or cursor == 0:
             self.error_signal.emit(status)
             return
 
-        rec_dict = pdb.get_record(cursor, self.tablename, self.timestamp, self.colnames_list)
+        rec_dict = backend.get_record(cursor, self.tablename, self.timestamp, self.colnames_list)
 
         self.result_signal.emit(rec_dict)
 
         #---------------------------------------------
         #штатно закрываем соединение
-        if connection:
-            cursor.close()
-            connection.close()
-            logging.info(f"Соединение с PostgreSQL закрыто")   
\ No newline at end of file
+        backend.close(connection, cursor)
\ No newline at end of file
@@ -1,5 +1,5 @@
 from PyQt6 import QtCore
-from Lib import pipestreamdbread as pdb
+from Lib import storage_backend as sbk
 import logging
 
 
@@ -23,19 +23,17 @@ class ReadRecordListThread(QtCore.QThread):
 
         logging.info(f"Вычитывание списка записей таблицы {self.tablename} в потоке (фоном)")
 
-        connection, cursor, status = pdb.connect_db(pdb.db_connection_params)
+        backend = sbk.get_backend()
+        connection, cursor, status = backend.connect()
 
         if connection == 0 or cursor == 0:
             self.error_signal.emit(status)
             return
 
-        record_list = pdb.get_records_list(cursor, self.tablename)
+        record_list = backend.timestamps(cursor, self.tablename)
 
         self.result_signal.emit(record_list)
 
         #---------------------------------------------
         #штатно закрываем соединение
-        if connection:
-            cursor.close()
-            connection.close()
-            logging.info(f"Соединение с PostgreSQL закрыто")   
\ No newline at end of file
+        backend.close(connection, cursor)
\ No newline at end of file
@@ -1,5 +1,5 @@
 from PyQt6 import QtCore
-from Lib import pipestreamdbread as pdb
+from Lib import storage_backend as sbk
 import logging
 
 
@@ -18,24 +18,22 @@ class ReadTablesThread(QtCore.QThread):
         logging.info(f"Старт потока вычитыания списка таблиц и их параметров")
 
 
-        connection, cursor, status = pdb.connect_db(pdb.db_connection_params)
+        backend = sbk.get_backend()
+        connection, cursor, status = backend.connect()
 
         if connection == 0 or cursor == 0:
             self.error_signal.emit(status)
             return
 
-        logger_data_table_list = pdb.get_logger_data_table_list(cursor)
+        logger_data_table_list = backend.list_logger_tables(cursor)
 
         for device in logger_data_table_list:
             if not self.running:
                 return
 
-            table_description = pdb.get_table_description(cursor, device)
+            table_description = backend.table_description(cursor, device)
             self.result_signal.emit(table_description)
 
         #---------------------------------------------
         #штатно закрываем соединение
-        if connection:
-            cursor.close()
-            connection.close()
-            logging.info(f"Соединение с PostgreSQL закрыто")   
\ No newline at end of file
+        backend.close(connection, cursor)
\ No newline at end of file
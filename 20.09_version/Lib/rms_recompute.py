@@ -0,0 +1,117 @@
+'''
+Пересчёт трендов СКЗ по сырым осциллограммам для таблиц без достоверных add_data_*.
+Пачки записей раздаются пулу процессов (Lib/process_pool.py); в процесс передаются
+только байты отсчётов (одна склеенная строка на пачку) и массивы штампов и
+коэффициентов, а не словари записей. Результаты выдаются блоками TrendStore
+в порядке отправки, внутри блока - по времени.
+'''
+
+from Lib import pipestreamdbread as pdb
+from Lib import trend_store as ts
+from Lib import shared_arrays as sha
+from collections import deque
+import numpy as np
+import base64
+
+rms_chunk_size = 256 # записей на одну задачу пула процессов
+
+# столбцы, нужные для пересчёта
+rms_source_columns = ["timestamp", "points", "npoints", "mask",
+                      "cfg_voltage_multiplier", "cfg_voltage_divider", "cfg_current_multiplier", "cfg_current_divider"]
+
+#=========================================================================================================
+def payload_batch_rms(timestamps: np.ndarray, payload: bytes, npoints: int, channels_num: int,
+                      coeffs: np.ndarray, shared: bool = False):
+    # Точка входа для процесса пула: payload - склеенные отсчёты записей одной формы,
+    # coeffs - [записи, каналы] множители пересчёта (adc >> 2) в В/А.
+    # Возвращает (timestamps, СКЗ float32 [записи, 6]), при shared=True - описатель
+    # блока общей памяти с массивами "timestamps" и "rms".
+    n_rec = len(timestamps)
+    cells = np.frombuffer(payload, dtype=np.uint8).reshape(n_rec, npoints, channels_num, pdb.cellsize)
+    adc = pdb.decode_adc_cells(cells).astype(np.float64)
+    rms = np.sqrt(np.einsum("rnc,rnc->rc", adc, adc) / npoints) * coeffs
+
+    ret = np.full((n_rec, len(ts.trend_channel_names)), np.nan, dtype=np.float32)
+    width = min(channels_num, ret.shape[1])
+    ret[:, :width] = rms[:, :width]
+    if shared:
+        return sha.share_arrays({"timestamps": timestamps, "rms": ret})
+    return timestamps, ret
+#-----------------------------------------------------------------------------------------------------
+def pack_rms_batches(rows: list) -> list:
+    # Строки БД (в порядке rms_source_columns) -> аргументы payload_batch_rms, по одной группе
+    # на форму записи (npoints, число каналов). Записи с ошибками пропускаются.
+    groups = {}
+    for row in rows:
+        timestamp, points, npoints, mask, vm, vd, cm, cd = row
+        if not points or not npoints or not mask or not vd or not cd or vm is None or cm is None:
+            continue
+        channels_num = mask.count("1")
+        rec_len = npoints * pdb.cellsize * channels_num
+        byte_string = base64.b64decode(points)
+        if len(byte_string) < rec_len + pdb.preamble_size:
+            continue
+
+        volt = (vm / vd) / (pdb.ADC_raw_max / pdb.ADC_full_scale_V)
+        curr = (cm / cd) / (pdb.ADC_raw_max / pdb.ADC_full_scale_V)
+        coeffs = np.full(channels_num, curr)
+        coeffs[:3] = volt # сначала идут 3 канала напряжения
+
+        group = groups.setdefault((npoints, channels_num), ([], [], []))
+        group[0].append(timestamp)
+        group[1].append(byte_string[pdb.preamble_size:pdb.preamble_size + rec_len])
+        group[2].append(coeffs)
+
+    return [(np.asarray(stamps, dtype=np.int64), b"".join(payloads), npoints, channels_num, np.vstack(coeffs))
+            for (npoints, channels_num), (stamps, payloads, coeffs) in groups.items()]
+#-----------------------------------------------------------------------------------------------------
+def merge_results(results: list):
+    # результаты групп одной пачки (пары массивов или описатели общей памяти)
+    # -> блок TrendStore по возрастанию времени; общая память читается без
+    # промежуточных копий и освобождается после сборки блока
+    blocks = [sha.SharedBlock(r) for r in results if isinstance(r, sha.SharedArraysDescriptor)]
+    try:
+        parts = [r for r in results if not isinstance(r, sha.SharedArraysDescriptor)]
+        parts += [(block.array("timestamps"), block.array("rms")) for block in blocks]
+        parts = [p for p in parts if len(p[0])]
+        if not parts:
+            return None
+        timestamps = np.concatenate([p[0] for p in parts])
+        values = np.concatenate([p[1] for p in parts])
+        del parts
+    finally:
+        for block in blocks:
+            block.release()
+    order = np.argsort(timestamps, kind="stable")
+    columns = {name: values[order, j] for j, name in enumerate(ts.trend_channel_names)}
+    return ts.TrendStore.from_arrays(timestamps[order], columns)
+#=========================================================================================================
+class RMSRecomputer:
+    # Конвейер: пачки строк отправляются в пул по мере чтения из БД, не более max_pending
+    # пачек одновременно; готовые блоки забираются строго в порядке отправки
+
+    def __init__(self, pool, max_pending: int):
+        self.pool = pool
+        self.max_pending = max(1, max_pending)
+        self.pending = deque()
+
+    def submit(self, rows: list):
+        futures = [self.pool.submit(payload_batch_rms, *batch, True) for batch in pack_rms_batches(rows)]
+        self.pending.append(futures)
+
+    def ready_blocks(self, flush: bool = False):
+        # готовые по порядку блоки; при переполнении очереди (или flush) ждёт самый старый
+        while self.pending and (flush or len(self.pending) >= self.max_pending
+                                or all(f.done() for f in self.pending[0])):
+            futures = self.pending.popleft()
+            block = merge_results([f.result() for f in futures])
+            if block is not None:
+                yield block
+
+    def cancel(self):
+        for futures in self.pending:
+            for future in futures:
+                future.cancel()
+            sha.release_futures(futures)
+        self.pending.clear()
+#=========================================================================================================
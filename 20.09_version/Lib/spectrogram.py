@@ -0,0 +1,137 @@
+'''
+Спектрограмма (водопад) по многим записям одного канала: спектры всей пачки
+записей считаются одним rfft по оси отсчётов, полоса прореживается до
+spectrogram_max_bins столбцов по максимуму в группе (узкая гармоника не теряется).
+Строки раскладываются по плиткам фиксированной высоты: новая пачка записей
+дописывается в последнюю плитку или открывает новую, уже готовые плитки
+не пересчитываются и не перерисовываются.
+'''
+
+from Lib import spectrum as spm
+from scipy.fft import rfft
+from dataclasses import dataclass
+from functools import lru_cache
+import numpy as np
+
+spectrogram_max_bins = 1024 # столбцов частоты в изображении
+spectrogram_tile_records = 256 # записей в одной плитке изображения
+spectrogram_gap_factor = 3.0 # разрыв во времени больше стольких периодов записи начинает новую плитку
+spectrogram_floor = 1e-6 # нижняя граница амплитуды перед переводом в дБ
+spectrogram_dynamic_range_db = 80.0
+
+#=========================================================================================================
+@lru_cache(maxsize=64)
+def decimation(npoints: int, sampling: int = spm.sampling_rate, freq_range: tuple = (-1, -1),
+               max_bins: int = spectrogram_max_bins) -> tuple:
+    # (полоса бинов rfft, коэффициент прореживания, частоты первых бинов групп)
+    band = spm.band_slice(npoints, sampling, tuple(freq_range))
+    bins = max(0, band.stop - band.start)
+    factor = max(1, -(-bins // max_bins))
+    frequencies = spm.frequency_axis(npoints, sampling)[band][::factor].copy()
+    frequencies.flags.writeable = False
+    return band, factor, frequencies
+#-----------------------------------------------------------------------------------------------------
+def spectra_rows(signals: np.ndarray, sampling: int = spm.sampling_rate, freq_range: tuple = (-1, -1),
+                 max_bins: int = spectrogram_max_bins, decibels: bool = True) -> np.ndarray:
+    # signals - [записи, npoints] одного канала -> строки спектрограммы float32 [записи, столбцы]
+    records, npoints = signals.shape
+    band, factor, frequencies = decimation(npoints, sampling, tuple(freq_range), max_bins)
+    columns = len(frequencies)
+    if records == 0 or columns == 0:
+        return np.empty((records, columns), dtype=np.float32)
+
+    centered = signals - signals.mean(axis=1, keepdims=True)
+    magnitudes = np.abs(rfft(centered, axis=1)[:, band]) / npoints
+    pad = columns * factor - magnitudes.shape[1]
+    if pad:
+        magnitudes = np.pad(magnitudes, ((0, 0), (0, pad)))
+    rows = magnitudes.reshape(records, columns, factor).max(axis=2)
+    if decibels:
+        rows = 20 * np.log10(np.maximum(rows, spectrogram_floor))
+    return rows.astype(np.float32)
+#-----------------------------------------------------------------------------------------------------
+def default_levels(rows: np.ndarray, decibels: bool = True) -> tuple:
+    # уровни цветовой шкалы по первой пачке; дальше не меняются, чтобы плитки были сравнимы
+    top = float(rows.max()) if rows.size else 1.0
+    if decibels:
+        return top - spectrogram_dynamic_range_db, top
+    return 0.0, top if top > 0 else 1.0
+#=========================================================================================================
+@dataclass
+class SpectrogramBlock:
+    timestamps: np.ndarray # [записи] мс
+    rows: np.ndarray # [записи, столбцы] float32
+    frequencies: np.ndarray # [столбцы] частота первого бина каждой группы
+#=========================================================================================================
+class WaterfallTile:
+    # Плитка изображения: заранее выделенный буфер на tile_records строк
+
+    def __init__(self, columns: int, tile_records: int):
+        self.rows = np.zeros((tile_records, columns), dtype=np.float32)
+        self.timestamps = np.zeros(tile_records, dtype=np.int64)
+        self.count = 0
+
+    def is_full(self) -> bool:
+        return self.count == len(self.timestamps)
+
+    def image(self) -> np.ndarray:
+        return self.rows[:self.count]
+
+    def time_span(self, period_ms: float) -> tuple:
+        # (начало, длительность) в секундах; каждая запись занимает один период
+        begin = self.timestamps[0] / 1000
+        if self.count > 1:
+            period_ms = (self.timestamps[self.count - 1] - self.timestamps[0]) / (self.count - 1)
+        return begin, self.count * period_ms / 1000
+#-----------------------------------------------------------------------------------------------------
+class WaterfallTiles:
+    # Раскладка строк по плиткам; append возвращает номера плиток, которые нужно перерисовать
+
+    def __init__(self, columns: int, tile_records: int = spectrogram_tile_records,
+                 gap_factor: float = spectrogram_gap_factor):
+        self.columns = columns
+        self.tile_records = tile_records
+        self.gap_factor = gap_factor
+        self.tiles = []
+        self.period_ms = None # типичный шаг между записями, по первой пачке
+
+    def __len__(self):
+        return sum(tile.count for tile in self.tiles)
+
+    def append(self, timestamps: np.ndarray, rows: np.ndarray) -> list:
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if len(timestamps) == 0:
+            return []
+        if self.period_ms is None and len(timestamps) > 1:
+            self.period_ms = float(np.median(np.diff(timestamps)))
+
+        # места разрывов: по ним (и по заполнению плитки) начинается новая плитка
+        previous = np.empty_like(timestamps)
+        previous[0] = self.tiles[-1].timestamps[self.tiles[-1].count - 1] if self.tiles else timestamps[0]
+        previous[1:] = timestamps[:-1]
+        breaks = np.zeros(len(timestamps), dtype=bool)
+        if self.period_ms:
+            breaks = timestamps - previous > self.gap_factor * self.period_ms
+
+        changed = []
+        pos = 0
+        while pos < len(timestamps):
+            if not self.tiles or self.tiles[-1].is_full() or breaks[pos]:
+                self.tiles.append(WaterfallTile(self.columns, self.tile_records))
+            tile = self.tiles[-1]
+            end = min(len(timestamps), pos + self.tile_records - tile.count)
+            next_break = np.flatnonzero(breaks[pos + 1:end])
+            if len(next_break):
+                end = pos + 1 + int(next_break[0])
+            tile.rows[tile.count:tile.count + end - pos] = rows[pos:end]
+            tile.timestamps[tile.count:tile.count + end - pos] = timestamps[pos:end]
+            tile.count += end - pos
+            if not changed or changed[-1] != len(self.tiles) - 1:
+                changed.append(len(self.tiles) - 1)
+            pos = end
+        return changed
+
+    def tile_period(self) -> float:
+        # длительность записи для плитки из одной строки
+        return self.period_ms if self.period_ms else 1000.0
+#=========================================================================================================
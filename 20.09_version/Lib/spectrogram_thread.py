@@ -0,0 +1,108 @@
+from PyQt6 import QtCore
+from Lib import pooled_decode as pdc
+from Lib import storage_backend as sbk
+from Lib import spectrogram as sgm
+from Lib import cancellation as cnl
+import numpy as np
+import logging
+import time
+
+spectrogram_fetch = 64 # записей на один запрос и одно пакетное БПФ
+
+
+class SpectrogramThread(QtCore.QThread):
+    # Читает записи пачками, декодирует их разом и отдаёт строки спектрограммы одного канала по мере готовности
+    block_signal = QtCore.pyqtSignal(object) # sgm.SpectrogramBlock
+    progress_signal = QtCore.pyqtSignal(int)
+    finished_signal = QtCore.pyqtSignal(int) # записей в спектрограмме
+    error_signal = QtCore.pyqtSignal(str)
+
+    def __init__(self, tablename, colnames_list, timestamps, rec_nums, channel, freq_range=(-1, -1),
+                 decibels=True, archive=None, parent=None):
+        super().__init__(parent)
+        self.tablename = tablename
+        self.colnames_list = list(colnames_list)
+        self.timestamps = timestamps
+        self.rec_nums = list(rec_nums) # номера записей (с 1) в списке штампов
+        self.channel = channel # номер канала с 0
+        self.freq_range = tuple(freq_range)
+        self.decibels = decibels
+        self.archive = archive
+        self.npoints = None # по первой записи; записи другой длины пропускаются
+        self.cancel_token = cnl.CancellationToken()
+
+    def cancel(self):
+        self.cancel_token.cancel()
+
+    def read_signals(self, backend, cursor, nums: list) -> tuple:
+        # (штампы, сигналы канала [записи, npoints])
+        if self.archive is not None:
+            if self.channel >= self.archive.frame_shape[1]:
+                raise ValueError(f"в архиве нет канала {self.channel + 1}")
+            idx = np.asarray(nums) - 1
+            frames = self.archive.frames()[idx, :, self.channel]
+            coeffs = self.archive.coefficients()[idx, self.channel]
+            return self.archive.timestamps()[idx], frames * coeffs[:, None]
+
+        wanted = [self.timestamps[num - 1] for num in nums]
+        recs = [rec for rec in backend.get_records(cursor, self.tablename, wanted, self.colnames_list)
+                if rec["points"] is not None]
+        timestamps = []
+        signals = []
+        # декодирование - в пуле процессов; канал копируется из общей памяти до её освобождения
+        with pdc.decode_records_pooled(recs, self.cancel_token) as batch:
+            for indices, group in batch.groups:
+                if self.npoints is None:
+                    self.npoints = group.shape[1]
+                if group.shape[1] != self.npoints or group.shape[2] <= self.channel:
+                    logging.warning(f"Спектрограмма {self.tablename}: пропущено {len(indices)} записей другой формы")
+                    continue
+                timestamps.extend(recs[i]["timestamp"] for i in indices)
+                signals.append(group[:, :, self.channel].copy())
+        if not signals:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.npoints or 0))
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        signals = np.concatenate(signals)
+        order = np.argsort(timestamps, kind="stable")
+        return timestamps[order], signals[order]
+
+    def run(self):
+        backend = sbk.get_backend()
+        connection = None
+        cursor = None
+        try:
+            if self.archive is None:
+                connection, cursor, status = backend.connect()
+                if connection == 0 or cursor == 0:
+                    connection = None
+                    self.error_signal.emit(status)
+                    return
+
+            start_time = time.perf_counter()
+            done = 0
+            total = 0
+            for start in range(0, len(self.rec_nums), spectrogram_fetch):
+                self.cancel_token.raise_if_cancelled()
+                nums = self.rec_nums[start:start + spectrogram_fetch]
+                timestamps, signals = self.read_signals(backend, cursor, nums)
+                if len(timestamps):
+                    rows = sgm.spectra_rows(signals, freq_range=self.freq_range, decibels=self.decibels)
+                    frequencies = sgm.decimation(signals.shape[1], freq_range=self.freq_range)[2]
+                    self.block_signal.emit(sgm.SpectrogramBlock(timestamps, rows, frequencies))
+                    total += len(timestamps)
+                done += len(nums)
+                self.progress_signal.emit(done * 100 // len(self.rec_nums))
+
+            logging.info(f"Спектрограмма {self.tablename}, канал {self.channel + 1}: {total} записей "
+                         f"за {time.perf_counter() - start_time:.2f} с")
+            self.finished_signal.emit(total)
+
+        except cnl.OperationCancelled:
+            logging.info(f"Спектрограмма {self.tablename} остановлена")
+
+        except Exception as e:
+            self.error_signal.emit(f"Ошибка построения спектрограммы: {str(e)}")
+
+        finally:
+            if connection:
+                backend.close(connection, cursor)
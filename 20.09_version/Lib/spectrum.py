@@ -0,0 +1,104 @@
+'''
+Спектры осциллограмм для окна сигналов: одно rfft по всем выбранным каналам записи,
+оси времени и частоты и индексы полосы отображения кэшируются по (npoints, частота
+дискретизации) и не пересчитываются от записи к записи. Амплитуды возвращаются уже
+обрезанными по полосе current_freq_range.
+
+region_spectra - спектр выделенного участка записи с оконной функцией и
+дополнением нулями; окна кэшируются по (имя, длина), так что при перетаскивании
+участка пересчитывается только само БПФ.
+'''
+
+from scipy.fft import rfft, rfftfreq, next_fast_len
+from scipy.signal import get_window
+from dataclasses import dataclass
+from functools import lru_cache
+import numpy as np
+
+sampling_rate = 25600
+
+# оконные функции для спектра участка: подпись -> имя scipy.signal.get_window
+window_functions = {"Прямоугольное": "boxcar", "Ханна": "hann", "Хэмминга": "hamming",
+                    "Блэкмана": "blackman", "С плоской вершиной": "flattop"}
+padding_factors = [1, 2, 4, 8] # длина БПФ относительно длины участка
+min_region_points = 8
+
+#=========================================================================================================
+@lru_cache(maxsize=16)
+def time_axis(npoints: int, sampling: int = sampling_rate) -> np.ndarray:
+    axis = np.linspace(0., npoints / sampling, npoints)
+    axis.flags.writeable = False # общий для всех записей массив
+    return axis
+#-----------------------------------------------------------------------------------------------------
+@lru_cache(maxsize=16)
+def frequency_axis(npoints: int, sampling: int = sampling_rate) -> np.ndarray:
+    axis = rfftfreq(npoints, 1 / sampling)
+    axis.flags.writeable = False
+    return axis
+#-----------------------------------------------------------------------------------------------------
+@lru_cache(maxsize=64)
+def band_slice(npoints: int, sampling: int = sampling_rate, freq_range: tuple = (-1, -1)) -> slice:
+    # индексы полосы отображения; граница <= 0 - без ограничения с этой стороны
+    bins = npoints // 2 + 1
+    low_ind = 0
+    hi_ind = bins
+    if freq_range[0] > 0:
+        low_ind = int((bins / (sampling / 2)) * freq_range[0])
+    if freq_range[1] > 0 and freq_range[1] > freq_range[0] and freq_range[1] < (sampling / 2):
+        hi_ind = int((bins / (sampling / 2)) * freq_range[1])
+    return slice(low_ind, hi_ind)
+#-----------------------------------------------------------------------------------------------------
+@lru_cache(maxsize=32)
+def window(name: str, npoints: int) -> np.ndarray:
+    w = get_window(name, npoints)
+    w.flags.writeable = False
+    return w
+#=========================================================================================================
+@dataclass
+class RecordSpectra:
+    channels: list # номера каналов записи, по порядку столбцов массивов ниже
+    time: np.ndarray # [npoints], общий кэшированный массив
+    signals: np.ndarray # [npoints, каналы] без постоянной составляющей
+    frequencies: np.ndarray # [полоса], срез кэшированной оси
+    magnitudes: np.ndarray # [полоса, каналы], |rfft| / npoints
+
+    def column(self, channel: int) -> int:
+        return self.channels.index(channel)
+#-----------------------------------------------------------------------------------------------------
+def record_spectra(signals: np.ndarray, channels=None, sampling: int = sampling_rate,
+                   freq_range: tuple = (-1, -1)) -> RecordSpectra:
+    # signals - [npoints, каналы] записи; channels - какие каналы считать (по умолчанию все)
+    channels = list(range(signals.shape[1])) if channels is None else list(channels)
+    npoints = signals.shape[0]
+    band = band_slice(npoints, sampling, tuple(freq_range))
+
+    selected = signals[:, channels]
+    centered = selected - selected.mean(axis=0)
+    if channels:
+        magnitudes = np.abs(rfft(centered, axis=0)[band]) / npoints
+    else:
+        magnitudes = np.empty((0, 0))
+    return RecordSpectra(channels, time_axis(npoints, sampling), centered,
+                         frequency_axis(npoints, sampling)[band], magnitudes)
+#=========================================================================================================
+def region_spectra(signals: np.ndarray, channels, start: int, stop: int, window_name: str = "hann", padding: int = 1,
+                   sampling: int = sampling_rate, freq_range: tuple = (-1, -1)) -> RecordSpectra:
+    # спектр отсчётов [start, stop) выбранных каналов; амплитуды нормированы на сумму окна,
+    # чтобы синусоида давала ту же высоту пика, что и в спектре всей записи (|rfft| / npoints)
+    channels = list(channels)
+    start = max(0, min(int(start), signals.shape[0] - min_region_points))
+    stop = min(signals.shape[0], max(int(stop), start + min_region_points))
+    npoints = stop - start
+    nfft = next_fast_len(npoints * max(1, int(padding)), real=True)
+    band = band_slice(nfft, sampling, tuple(freq_range))
+
+    selected = signals[start:stop, channels]
+    centered = selected - selected.mean(axis=0)
+    w = window(window_name, npoints)
+    if channels:
+        magnitudes = np.abs(rfft(centered * w[:, None], n=nfft, axis=0)[band]) / w.sum()
+    else:
+        magnitudes = np.empty((0, 0))
+    return RecordSpectra(channels, time_axis(signals.shape[0], sampling)[start:stop], centered,
+                         frequency_axis(nfft, sampling)[band], magnitudes)
+#=========================================================================================================
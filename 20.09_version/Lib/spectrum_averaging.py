@@ -0,0 +1,92 @@
+'''
+Усреднённый спектр по многим записям без хранения самих записей: накопитель
+принимает пачки декодированных сигналов и держит только сумму квадратов модулей
+спектров по каналам.
+- "welch" - каждая запись режется на перекрывающиеся отрезки segment_points
+  с оконной функцией (метод Уэлча); отрезки не переходят через границу записи,
+  записи в таблице идут с разрывами во времени;
+- "linear" - одно БПФ с окном на всю запись, спектры мощности всех записей
+  усредняются с равным весом.
+Длина БПФ у всех отрезков одна, окно берётся из кэша spectrum.window, так что
+план scipy.fft строится один раз на весь проход.
+'''
+
+from Lib import spectrum as spm
+from scipy.fft import rfft
+from numpy.lib.stride_tricks import sliding_window_view
+from dataclasses import dataclass
+import numpy as np
+
+averaging_modes = {"Уэлч": "welch", "Линейное": "linear"}
+welch_segment_points = 1024
+welch_overlap = 0.5
+accumulator_block_elements = 1 << 22 # отсчётов отрезков на один проход БПФ (ограничение памяти)
+
+#=========================================================================================================
+@dataclass
+class AveragedSpectrum:
+    frequencies: np.ndarray # [бины] в полосе отображения
+    magnitudes: np.ndarray # [бины, каналы] среднеквадратичная амплитуда, как |rfft| / npoints у одной записи
+    records: int
+    segments: int
+#=========================================================================================================
+class SpectrumAccumulator:
+
+    def __init__(self, mode: str = "welch", segment_points: int = welch_segment_points, overlap: float = welch_overlap,
+                 window_name: str = "hann", sampling: int = spm.sampling_rate):
+        self.mode = mode
+        self.segment_points = segment_points
+        self.overlap = overlap
+        self.window_name = window_name
+        self.sampling = sampling
+        self.power = None # [бины, каналы] сумма |X|^2
+        self.shape = None # (npoints, каналы) первой пачки; записи другой формы не принимаются
+        self.nfft = None
+        self.records = 0
+        self.segments = 0
+
+    def segment_length(self, npoints: int) -> int:
+        if self.mode == "linear":
+            return npoints
+        return min(self.segment_points, npoints)
+
+    def accepts(self, signals: np.ndarray) -> bool:
+        return self.shape is None or signals.shape[1:] == self.shape
+
+    def add(self, signals: np.ndarray) -> int:
+        # signals - [записи, npoints, каналы] или одна запись [npoints, каналы]; возвращает принятые записи
+        if signals.ndim == 2:
+            signals = signals[None]
+        if len(signals) == 0 or not self.accepts(signals):
+            return 0
+        npoints, channels = signals.shape[1:]
+        length = self.segment_length(npoints)
+        hop = max(1, int(round(length * (1 - self.overlap))))
+
+        # отрезки [записи, отрезки, каналы, length] - вид на исходный массив без копирования
+        segments = sliding_window_view(signals, length, axis=1)[:, ::hop]
+        window = spm.window(self.window_name, length)
+        if self.power is None:
+            self.shape = (npoints, channels)
+            self.nfft = length
+            self.power = np.zeros((length // 2 + 1, channels))
+
+        step = max(1, accumulator_block_elements // (segments.shape[1] * channels * length))
+        for start in range(0, len(segments), step):
+            part = segments[start:start + step]
+            centered = part - part.mean(axis=-1, keepdims=True)
+            spectra = rfft(centered * window, axis=-1)
+            self.power += (spectra.real ** 2 + spectra.imag ** 2).sum(axis=(0, 1)).T # [бины, каналы]
+        self.records += len(signals)
+        self.segments += segments.shape[0] * segments.shape[1]
+        return len(signals)
+
+    def result(self, freq_range: tuple = (-1, -1)) -> AveragedSpectrum:
+        if self.power is None:
+            return AveragedSpectrum(np.empty(0), np.empty((0, 0)), 0, 0)
+        band = spm.band_slice(self.nfft, self.sampling, tuple(freq_range))
+        w = spm.window(self.window_name, self.nfft)
+        magnitudes = np.sqrt(self.power[band] / self.segments) / w.sum()
+        return AveragedSpectrum(spm.frequency_axis(self.nfft, self.sampling)[band], magnitudes,
+                                self.records, self.segments)
+#=========================================================================================================
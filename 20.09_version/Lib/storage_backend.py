@@ -0,0 +1,189 @@
+'''
+Источники данных логгеров: PostgreSQL (основной) и SQLite с той же схемой
+таблиц logger_N_data - для работы и замеров производительности без сервера.
+Бэкенд отвечает только за диалект: подключение, список таблиц и столбцов,
+подстановку параметров; сами запросы общие (Lib/pipestreamdbread.py).
+Соглашение об ошибке подключения как у pdb.connect_db: (0, 0, текст ошибки).
+'''
+
+from Lib import pipestreamdbread as pdb
+from abc import ABC, abstractmethod
+import sqlite3
+import logging
+import csv
+import io
+import re
+
+# выбор источника для окон выбора устройства и просмотра сигналов
+backend_params = {"kind": "postgresql", # "postgresql" или "sqlite"
+    "sqlite_path": "pipestream.sqlite"}
+
+logger_table_pattern = r"logger_[0-9]*_data"
+
+# схема таблицы логгера: (столбец, тип PostgreSQL, тип SQLite)
+logger_data_schema = [("timestamp", "BIGINT PRIMARY KEY", "INTEGER PRIMARY KEY"),
+                      ("points", "TEXT", "TEXT"),
+                      ("npoints", "INTEGER", "INTEGER"),
+                      ("mask", "TEXT", "TEXT"),
+                      ("add_data_0", "INTEGER", "INTEGER"),
+                      ("add_data_1", "INTEGER", "INTEGER"),
+                      ("add_data_2", "INTEGER", "INTEGER"),
+                      ("add_data_3", "INTEGER", "INTEGER"),
+                      ("add_data_4", "INTEGER", "INTEGER"),
+                      ("add_data_5", "INTEGER", "INTEGER"),
+                      ("cfg_voltage_multiplier", "INTEGER", "INTEGER"),
+                      ("cfg_voltage_divider", "INTEGER", "INTEGER"),
+                      ("cfg_current_multiplier", "INTEGER", "INTEGER"),
+                      ("cfg_current_divider", "INTEGER", "INTEGER"),
+                      ("gps_latitude", "DOUBLE PRECISION", "REAL"),
+                      ("gps_longitude", "DOUBLE PRECISION", "REAL")]
+logger_data_columns = [col for col, _, _ in logger_data_schema]
+
+#=========================================================================================================
+class StorageBackend(ABC):
+    # Общая часть: переносимые запросы. Наследники задают подключение и диалект;
+    # бэкенд без них не создаётся (ошибка сразу, а не при первом запросе в потоке загрузки).
+    kind = ""
+    placeholder = "%s"
+    schema_type_index = 1 # номер столбца типа в logger_data_schema
+
+    @abstractmethod
+    def connect(self) -> tuple:
+        ...
+
+    def close(self, connection, cursor):
+        if connection:
+            cursor.close()
+            connection.close()
+            logging.info(f"Соединение с источником данных ({self.kind}) закрыто")
+
+    @abstractmethod
+    def list_logger_tables(self, cursor) -> list:
+        ...
+
+    @abstractmethod
+    def column_names(self, cursor, tablename: str) -> list:
+        ...
+    #-----------------------------------------------------------------------------------------------------
+    def row_count(self, cursor, tablename: str) -> int:
+        return pdb.get_table_row_num(cursor, tablename)
+
+    def table_description(self, cursor, tablename: str) -> dict:
+        return pdb.get_table_description(cursor, tablename, self.column_names(cursor, tablename))
+
+    def first_record(self, cursor, tablename: str) -> dict:
+        return pdb.get_first_record(cursor, tablename, self.column_names(cursor, tablename))
+
+    def last_record(self, cursor, tablename: str) -> tuple:
+        # (запись, число записей, столбцы) - как pdb.get_last_record
+        return pdb.get_last_record(cursor, tablename, self.column_names(cursor, tablename))
+
+    def get_record(self, cursor, tablename: str, timestamp, colnames_list: list) -> dict:
+        return pdb.get_record(cursor, tablename, timestamp, colnames_list)
+
+    def get_records_range(self, cursor, tablename: str, timerange: pdb.Timerange, colnames_list: list) -> list:
+        # записи с timerange.begin <= timestamp <= timerange.end по возрастанию времени
+        p = self.placeholder
+        cursor.execute(f"SELECT {', '.join(colnames_list)} FROM {tablename} "
+                       f"WHERE timestamp >= {p} AND timestamp <= {p} ORDER BY timestamp ASC",
+                       (timerange.begin, timerange.end))
+        return [dict(zip(colnames_list, row)) for row in cursor.fetchall()]
+
+    def get_records(self, cursor, tablename: str, timestamps: list, colnames_list: list) -> list:
+        # записи с перечисленными штампами по возрастанию времени; отсутствующие штампы пропускаются
+        if not timestamps:
+            return []
+        marks = ", ".join([self.placeholder] * len(timestamps))
+        cursor.execute(f"SELECT {', '.join(colnames_list)} FROM {tablename} "
+                       f"WHERE timestamp IN ({marks}) ORDER BY timestamp ASC", [int(t) for t in timestamps])
+        return [dict(zip(colnames_list, row)) for row in cursor.fetchall()]
+
+    def timestamps(self, cursor, tablename: str) -> list:
+        return pdb.get_records_list(cursor, tablename)
+
+    def timestamps_in_range(self, cursor, tablename: str, timerange: pdb.Timerange) -> list:
+        # строго внутри интервала, как pdb.get_record_list_with_filter
+        return pdb.get_record_list_with_filter(cursor, tablename, timerange)
+    #-----------------------------------------------------------------------------------------------------
+    def create_logger_table(self, connection, cursor, tablename: str):
+        columns = ", ".join(f"{entry[0]} {entry[self.schema_type_index]}" for entry in logger_data_schema)
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {tablename} ({columns})")
+        connection.commit()
+
+    def drop_logger_table(self, connection, cursor, tablename: str):
+        cursor.execute(f"DROP TABLE IF EXISTS {tablename}")
+        connection.commit()
+
+    def insert_records(self, connection, cursor, tablename: str, rows: list, colnames_list: list = None):
+        # rows - кортежи в порядке colnames_list (по умолчанию - вся схема logger_data_schema)
+        colnames_list = colnames_list if colnames_list is not None else logger_data_columns
+        marks = ", ".join([self.placeholder] * len(colnames_list))
+        cursor.executemany(f"INSERT INTO {tablename} ({', '.join(colnames_list)}) VALUES ({marks})", rows)
+        connection.commit()
+
+    def bulk_insert(self, connection, cursor, tablename: str, rows: list, colnames_list: list = None):
+        # массовая загрузка самым быстрым способом диалекта; по умолчанию - insert_records
+        self.insert_records(connection, cursor, tablename, rows, colnames_list)
+#=========================================================================================================
+class PostgresBackend(StorageBackend):
+    kind = "postgresql"
+
+    def bulk_insert(self, connection, cursor, tablename: str, rows: list, colnames_list: list = None):
+        # COPY ... FROM STDIN: одна команда на пачку вместо INSERT на строку; пустое поле CSV - NULL
+        colnames_list = colnames_list if colnames_list is not None else logger_data_columns
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(rows) # None записывается пустым полем
+        buffer.seek(0)
+        cursor.copy_expert(f"COPY {tablename} ({', '.join(colnames_list)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        connection.commit()
+
+    def connect(self) -> tuple:
+        return pdb.connect_db(pdb.db_connection_params)
+
+    def list_logger_tables(self, cursor) -> list:
+        return pdb.get_logger_data_table_list(cursor)
+
+    def column_names(self, cursor, tablename: str) -> list:
+        return pdb.get_column_names(cursor, tablename)
+#=========================================================================================================
+class SQLiteBackend(StorageBackend):
+    kind = "sqlite"
+    placeholder = "?"
+    schema_type_index = 2
+
+    def __init__(self, path: str = None):
+        self.path = path if path is not None else backend_params["sqlite_path"]
+
+    def connect(self) -> tuple:
+        status = "OK"
+        try:
+            connection = sqlite3.connect(self.path)
+            cursor = connection.cursor()
+            cursor.execute("SELECT sqlite_version()")
+            logging.info(f"Подключение к SQLite {self.path}: {cursor.fetchone()[0]}")
+        except sqlite3.Error as status:
+            logging.error(f"Ошибка при работе с SQLite: {status}")
+            return 0, 0, str(status)
+        return connection, cursor, str(status)
+
+    def bulk_insert(self, connection, cursor, tablename: str, rows: list, colnames_list: list = None):
+        # без журнала и fsync: база для замеров пересоздаётся генератором, а не восстанавливается
+        cursor.execute("PRAGMA journal_mode = OFF")
+        cursor.execute("PRAGMA synchronous = OFF")
+        self.insert_records(connection, cursor, tablename, rows, colnames_list)
+
+    def list_logger_tables(self, cursor) -> list:
+        # аналог regexp_like из pdb.get_logger_data_table_list (поиск подстроки, без якорей)
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        return [name for (name,) in cursor.fetchall() if re.search(logger_table_pattern, name)]
+
+    def column_names(self, cursor, tablename: str) -> list:
+        cursor.execute(f"PRAGMA table_info({tablename})")
+        return [row[1] for row in cursor.fetchall()]
+#=========================================================================================================
+def get_backend(params: dict = None) -> StorageBackend:
+    params = params if params is not None else backend_params
+    if params["kind"] == "sqlite":
+        return SQLiteBackend(params["sqlite_path"])
+    return PostgresBackend()
+#=========================================================================================================
@@ -0,0 +1,163 @@
+'''
+Проверка соответствия бэкенда хранения (Lib/storage_backend.py) общему поведению:
+во временную таблицу logger_N_data загружается эталонный набор записей, затем
+каждый метод бэкенда сравнивается с ожидаемым результатом. Оба бэкенда должны
+проходить все проверки - тогда замеры на SQLite переносимы на PostgreSQL.
+
+Запуск: python -m Lib.storage_conformance sqlite [файл.sqlite]
+        python -m Lib.storage_conformance postgresql   (создаёт и удаляет таблицу в БД из pdb.db_connection_params)
+'''
+
+from Lib import pipestreamdbread as pdb
+from Lib import storage_backend as sbk
+import numpy as np
+import base64
+import sys
+
+conformance_table = "logger_999999_data"
+conformance_records = 50
+conformance_npoints = 16
+conformance_first_timestamp = 1700000000000
+
+#=========================================================================================================
+def conformance_rows() -> list:
+    # эталонные записи в порядке sbk.logger_data_columns; штампы вставляются не по порядку
+    rng = np.random.default_rng(20250920)
+    rows = []
+    for i in range(conformance_records):
+        adc = rng.integers(-(1 << 21), 1 << 21, size=(conformance_npoints, 6)) << 2
+        cells = np.stack([adc & 0xFF, (adc >> 8) & 0xFF, (adc >> 16) & 0xFF], axis=-1).astype(np.uint8)
+        points = base64.b64encode(b"\0\0\0" + cells.tobytes()).decode()
+        add_data = [int(v) for v in rng.integers(0, 1 << 22, size=6)]
+        rows.append((conformance_first_timestamp + i * 1000, points, conformance_npoints, "111111", *add_data,
+                     1000 + i, 3, 100, 1, 55.75 + i * 1e-4, 37.61 - i * 1e-4))
+    order = rng.permutation(len(rows))
+    return [rows[k] for k in order]
+#-----------------------------------------------------------------------------------------------------
+def same_values(a: dict, b: dict) -> bool:
+    # числа сравниваются по значению (Decimal, int и float из разных драйверов)
+    if set(a) != set(b):
+        return False
+    for key in a:
+        x, y = a[key], b[key]
+        if isinstance(x, str) or isinstance(y, str) or x is None or y is None:
+            if x != y:
+                return False
+        elif not np.isclose(float(x), float(y)):
+            return False
+    return True
+#=========================================================================================================
+def run_conformance(backend: sbk.StorageBackend, tablename: str = conformance_table) -> list:
+    # список (проверка, пройдена, пояснение)
+    results = []
+    connection, cursor, status = backend.connect()
+    if connection == 0 or cursor == 0:
+        return [("connect", False, status)]
+
+    rows = conformance_rows()
+    expected = sorted((dict(zip(sbk.logger_data_columns, row)) for row in rows), key=lambda r: r["timestamp"])
+    timestamps = [r["timestamp"] for r in expected]
+
+    def check(name, func):
+        try:
+            ok, detail = func()
+        except Exception as e:
+            connection.rollback() # PostgreSQL: после ошибки транзакция не принимает запросы
+            ok, detail = False, f"{type(e).__name__}: {e}"
+        results.append((name, bool(ok), detail))
+
+    try:
+        backend.drop_logger_table(connection, cursor, tablename)
+        backend.create_logger_table(connection, cursor, tablename)
+        backend.insert_records(connection, cursor, tablename, rows)
+
+        def table_listed():
+            tables = backend.list_logger_tables(cursor)
+            return tablename in tables, f"{len(tables)} таблиц"
+        check("list_logger_tables", table_listed)
+
+        def columns():
+            names = backend.column_names(cursor, tablename)
+            return sorted(names) == sorted(sbk.logger_data_columns), ", ".join(names)
+        check("column_names", columns)
+
+        def row_count():
+            n = backend.row_count(cursor, tablename)
+            return n == conformance_records, str(n)
+        check("row_count", row_count)
+
+        def description():
+            d = backend.table_description(cursor, tablename)
+            ok = (d["device"] == tablename and d["first_records"] == timestamps[0]
+                  and d["last_records"] == timestamps[-1] and d["record_num"] == conformance_records
+                  and np.isclose(d["gps_latitude"], max(expected[0]["gps_latitude"], expected[-1]["gps_latitude"])))
+            return ok, str(d)
+        check("table_description", description)
+
+        def all_timestamps():
+            got = [int(t) for t in backend.timestamps(cursor, tablename)]
+            return got == timestamps, f"{len(got)} штампов"
+        check("timestamps", all_timestamps)
+
+        def timestamps_in_range():
+            got = sorted(int(t) for t in backend.timestamps_in_range(
+                cursor, tablename, pdb.Timerange(timestamps[10], timestamps[20])))
+            return got == timestamps[11:20], f"{len(got)} штампов"
+        check("timestamps_in_range", timestamps_in_range)
+
+        def record():
+            got = backend.get_record(cursor, tablename, timestamps[5], sbk.logger_data_columns)
+            return same_values(got, expected[5]), str(got["timestamp"])
+        check("get_record", record)
+
+        def record_signals():
+            got = backend.get_record(cursor, tablename, timestamps[7], sbk.logger_data_columns)
+            ok = np.array_equal(pdb.LogRecord(got).get_signals(), pdb.LogRecord(expected[7]).get_signals())
+            return ok, "points -> сигналы"
+        check("get_record_signals", record_signals)
+
+        def records_range():
+            got = backend.get_records_range(cursor, tablename, pdb.Timerange(timestamps[10], timestamps[20]),
+                                            sbk.logger_data_columns)
+            ok = len(got) == 11 and all(same_values(g, e) for g, e in zip(got, expected[10:21]))
+            return ok, f"{len(got)} записей"
+        check("get_records_range", records_range)
+
+        def records():
+            wanted = [timestamps[3], timestamps[40], timestamps[12], conformance_first_timestamp - 1]
+            got = backend.get_records(cursor, tablename, wanted, sbk.logger_data_columns)
+            ok = len(got) == 3 and all(same_values(g, expected[k]) for g, k in zip(got, (3, 12, 40)))
+            return ok, f"{len(got)} записей"
+        check("get_records", records)
+
+        def first_record():
+            got = backend.first_record(cursor, tablename)
+            return same_values(got, expected[0]), str(got["timestamp"])
+        check("first_record", first_record)
+
+        def last_record():
+            got, rec_num, names = backend.last_record(cursor, tablename)
+            ok = same_values(got, expected[-1]) and rec_num == conformance_records \
+                and sorted(names) == sorted(sbk.logger_data_columns)
+            return ok, f"{got['timestamp']}, {rec_num}"
+        check("last_record", last_record)
+
+    except Exception as e:
+        results.append(("fixture", False, f"{type(e).__name__}: {e}"))
+
+    finally:
+        try:
+            connection.rollback()
+            backend.drop_logger_table(connection, cursor, tablename)
+        finally:
+            backend.close(connection, cursor)
+
+    return results
+#=========================================================================================================
+if __name__ == "__main__":
+    kind = sys.argv[1] if len(sys.argv) > 1 else "sqlite"
+    params = {"kind": kind, "sqlite_path": sys.argv[2] if len(sys.argv) > 2 else ":memory:"}
+    report = run_conformance(sbk.get_backend(params))
+    for name, ok, detail in report:
+        print(f"{'OK  ' if ok else 'FAIL'} {name}: {detail}")
+    sys.exit(0 if all(ok for _, ok, _ in report) else 1)
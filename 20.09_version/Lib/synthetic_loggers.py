@@ -0,0 +1,210 @@
+'''
+Генератор синтетических таблиц logger_N_data для нагрузочных замеров.
+Записи в формате логгера: points - base64 (3 байта преамбулы, затем 24-битные
+знаковые little-endian ячейки, каналы по маске), add_data_* - СКЗ в сырых единицах
+АЦП, согласованные с осциллограммой, множители и координаты.
+
+Осциллограммы (50 Гц с гармониками, провалы напряжения) кодируются один раз в пул
+шаблонов на логгер, записи выбирают шаблон случайно - стоимость строки не зависит
+от npoints. Пропуски времени, NULL и провалы задаются вероятностями в SyntheticProfile.
+Загрузка пачками через StorageBackend.bulk_insert (COPY для PostgreSQL).
+
+Запуск: python -m Lib.synthetic_loggers --backend sqlite --path bench.sqlite --loggers 10 --records 1000000
+'''
+
+from Lib import pipestreamdbread as pdb
+from Lib import storage_backend as sbk
+from dataclasses import dataclass, field
+import numpy as np
+import argparse
+import logging
+import base64
+import time
+
+generator_chunk = 20000 # записей на одну пачку загрузки
+
+#=========================================================================================================
+@dataclass
+class SyntheticProfile:
+    npoints: int = 2560
+    sampling_rate: int = 25600
+    record_period_ms: int = 1000
+    frequency: float = 50.0
+    frequency_jitter: float = 0.05 # Гц, разброс частоты между шаблонами
+    voltage_rms: float = 220.0
+    current_rms: float = 10.0
+    current_phase_deg: float = 30.0 # отставание тока от напряжения
+    voltage_harmonics: dict = field(default_factory=lambda: {3: 0.02, 5: 0.03, 7: 0.01}) # порядок: доля основной
+    current_harmonics: dict = field(default_factory=lambda: {3: 0.10, 5: 0.06, 7: 0.03})
+    noise: float = 0.002 # СКЗ шума, доля амплитуды
+    sag_probability: float = 0.0005 # вероятность начала провала на запись
+    sag_records: int = 5 # длительность провала в записях
+    sag_depth: float = 0.6 # остаточное напряжение при провале, доля номинала
+    gap_probability: float = 0.001 # вероятность пропуска перед записью
+    gap_max_records: int = 600 # наибольший пропуск в периодах записи
+    null_probability: float = 0.001 # доля записей с NULL в add_data_*, points и координатах
+    template_pool: int = 32 # различных осциллограмм на состояние (норма/провал)
+    voltage_multiplier: int = 2000
+    voltage_divider: int = 3
+    current_multiplier: int = 100
+    current_divider: int = 3
+    mask: str = "111111"
+#=========================================================================================================
+def encode_points(adc: np.ndarray) -> str:
+    # adc - целые значения (adc >> 2) [npoints, каналы] -> строка points в формате логгера
+    raw = (adc.astype(np.int64) << 2) & 0xFFFFFF
+    cells = np.stack([raw & 0xFF, (raw >> 8) & 0xFF, (raw >> 16) & 0xFF], axis=-1).astype(np.uint8)
+    return base64.b64encode(bytes(pdb.preamble_size) + cells.tobytes()).decode()
+#-----------------------------------------------------------------------------------------------------
+def make_templates(profile: SyntheticProfile, rng: np.random.Generator, voltage_scale: float = 1.0) -> tuple:
+    # Пул шаблонов: (строки points, add_data [шаблоны, 6] int64)
+    channels = profile.mask.count("1")
+    t = np.arange(profile.npoints) / profile.sampling_rate
+    full_scale = pdb.ADC_raw_max / pdb.ADC_full_scale_V
+    coeffs = np.full(channels, profile.current_multiplier / profile.current_divider / full_scale)
+    coeffs[:3] = profile.voltage_multiplier / profile.voltage_divider / full_scale # сначала 3 канала напряжения
+    limit = (1 << 21) - 1
+
+    points = []
+    add_data = np.zeros((profile.template_pool, 6), dtype=np.int64)
+    for k in range(profile.template_pool):
+        f = profile.frequency + rng.uniform(-profile.frequency_jitter, profile.frequency_jitter)
+        phase0 = rng.uniform(0, 2 * np.pi)
+        sig = np.zeros((profile.npoints, channels))
+        for ch in range(channels):
+            is_voltage = ch < 3
+            phase = phase0 - 2 * np.pi / 3 * (ch % 3)
+            if not is_voltage:
+                phase -= np.radians(profile.current_phase_deg)
+            rms = profile.voltage_rms * voltage_scale if is_voltage else profile.current_rms
+            rms *= rng.uniform(0.98, 1.02)
+            amp = rms * np.sqrt(2)
+            sig[:, ch] = amp * np.sin(2 * np.pi * f * t + phase)
+            harmonics = profile.voltage_harmonics if is_voltage else profile.current_harmonics
+            for order, share in harmonics.items():
+                sig[:, ch] += amp * share * np.sin(2 * np.pi * f * order * t + order * phase)
+            sig[:, ch] += rng.normal(0, amp * profile.noise, profile.npoints)
+
+        adc = np.clip(np.round(sig / coeffs), -limit, limit).astype(np.int64)
+        points.append(encode_points(adc))
+        # add_data - СКЗ в сырых единицах АЦП (pdb.adc_to_physical делит их на 4)
+        rms_adc = np.sqrt(np.mean(adc.astype(np.float64) ** 2, axis=0))
+        add_data[k, :min(channels, 6)] = np.round(rms_adc[:6] * 4).astype(np.int64)
+    return np.array(points, dtype=object), add_data
+#=========================================================================================================
+class LoggerGenerator:
+    # Поток записей одного логгера; пачки строк в порядке sbk.logger_data_columns
+
+    def __init__(self, profile: SyntheticProfile, seed: int, start_timestamp: int):
+        self.profile = profile
+        self.rng = np.random.default_rng(seed)
+        self.next_timestamp = start_timestamp
+        self.sag_left = 0 # провал, начатый в предыдущей пачке
+        self.normal = make_templates(profile, self.rng)
+        self.sag = make_templates(profile, self.rng, profile.sag_depth)
+        self.latitude = 55.0 + self.rng.uniform(0, 5)
+        self.longitude = 37.0 + self.rng.uniform(0, 5)
+
+    def timestamps(self, n: int) -> np.ndarray:
+        p = self.profile
+        steps = np.full(n, p.record_period_ms, dtype=np.int64)
+        gaps = self.rng.random(n) < p.gap_probability
+        steps[gaps] += self.rng.integers(1, max(2, p.gap_max_records), size=int(gaps.sum())) * p.record_period_ms
+        steps[0] -= p.record_period_ms # первая запись пачки - в next_timestamp (если перед ней нет пропуска)
+        ts = self.next_timestamp + np.cumsum(steps)
+        self.next_timestamp = int(ts[-1]) + p.record_period_ms
+        return ts
+
+    def sag_mask(self, n: int) -> np.ndarray:
+        # записи внутри провалов: начало с вероятностью sag_probability, длительность sag_records
+        p = self.profile
+        starts = (self.rng.random(n) < p.sag_probability).astype(np.int64)
+        covered = np.convolve(starts, np.ones(p.sag_records, dtype=np.int64))
+        mask = covered[:n] > 0
+        carry = min(self.sag_left, n)
+        mask[:carry] = True
+        tail = covered[n:]
+        self.sag_left = max(self.sag_left - n, int(np.nonzero(tail)[0][-1]) + 1 if tail.any() else 0)
+        return mask
+
+    def chunk(self, n: int) -> list:
+        p = self.profile
+        ts = self.timestamps(n)
+        sag = self.sag_mask(n)
+        pick = self.rng.integers(0, p.template_pool, size=n)
+
+        points = np.where(sag, self.sag[0][pick], self.normal[0][pick])
+        add_data = np.where(sag[:, None], self.sag[1][pick], self.normal[1][pick])
+        nulls = self.rng.random((n, 3)) < p.null_probability # add_data, points, координаты
+        points[nulls[:, 1]] = None
+        add_data = add_data.astype(object)
+        add_data[nulls[:, 0]] = None
+        lat = np.round(self.latitude + self.rng.normal(0, 1e-5, n), 6).astype(object)
+        lon = np.round(self.longitude + self.rng.normal(0, 1e-5, n), 6).astype(object)
+        lat[nulls[:, 2]] = None
+        lon[nulls[:, 2]] = None
+
+        const = (p.npoints, p.mask)
+        cfg = (p.voltage_multiplier, p.voltage_divider, p.current_multiplier, p.current_divider)
+        return [(int(t), pts) + const + tuple(ad) + cfg + (la, lo)
+                for t, pts, ad, la, lo in zip(ts.tolist(), points, add_data.tolist(), lat, lon)]
+#=========================================================================================================
+def generate(backend: sbk.StorageBackend, loggers: int, records: int, profile: SyntheticProfile = None,
+             first_logger: int = 1, start_timestamp: int = 1700000000000, seed: int = 1, drop: bool = False,
+             progress=None) -> int:
+    # Создаёт (или дополняет) таблицы logger_{first_logger..}_data; возвращает число записанных строк
+    profile = profile if profile is not None else SyntheticProfile()
+    connection, cursor, status = backend.connect()
+    if connection == 0 or cursor == 0:
+        raise ConnectionError(status)
+
+    written = 0
+    start_time = time.perf_counter()
+    try:
+        for i in range(loggers):
+            tablename = f"logger_{first_logger + i}_data"
+            if drop:
+                backend.drop_logger_table(connection, cursor, tablename)
+            backend.create_logger_table(connection, cursor, tablename)
+            gen = LoggerGenerator(profile, seed + i, start_timestamp)
+            for begin in range(0, records, generator_chunk):
+                rows = gen.chunk(min(generator_chunk, records - begin))
+                backend.bulk_insert(connection, cursor, tablename, rows)
+                written += len(rows)
+                if progress is not None:
+                    progress(tablename, written, loggers * records)
+            logging.info(f"Синтетическая таблица {tablename}: {records} записей")
+    finally:
+        backend.close(connection, cursor)
+
+    logging.info(f"Сгенерировано {written} записей за {time.perf_counter() - start_time:.1f} с")
+    return written
+#=========================================================================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Генератор синтетических таблиц logger_N_data")
+    parser.add_argument("--backend", choices=["sqlite", "postgresql"], default="sqlite")
+    parser.add_argument("--path", default=sbk.backend_params["sqlite_path"], help="файл SQLite")
+    parser.add_argument("--loggers", type=int, default=4)
+    parser.add_argument("--records", type=int, default=10000, help="записей на логгер")
+    parser.add_argument("--first-logger", type=int, default=1)
+    parser.add_argument("--npoints", type=int, default=SyntheticProfile.npoints)
+    parser.add_argument("--period-ms", type=int, default=SyntheticProfile.record_period_ms)
+    parser.add_argument("--sag-probability", type=float, default=SyntheticProfile.sag_probability)
+    parser.add_argument("--gap-probability", type=float, default=SyntheticProfile.gap_probability)
+    parser.add_argument("--null-probability", type=float, default=SyntheticProfile.null_probability)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--drop", action="store_true", help="пересоздать существующие таблицы")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    profile = SyntheticProfile(npoints=args.npoints, record_period_ms=args.period_ms,
+                               sag_probability=args.sag_probability, gap_probability=args.gap_probability,
+                               null_probability=args.null_probability)
+    backend = sbk.get_backend({"kind": args.backend, "sqlite_path": args.path})
+
+    def report(tablename, done, total):
+        print(f"\r{tablename}: {done}/{total}", end="", flush=True)
+
+    generate(backend, args.loggers, args.records, profile, args.first_logger, seed=args.seed, drop=args.drop,
+             progress=report)
+    print()
@@ -0,0 +1,232 @@
+'''
+Локальный кэш трендов СКЗ на диске с дозагрузкой новых записей.
+На каждую таблицу логгера - каталог с сырыми колонками (timestamps.bin int64 и
+по файлу float32 на канал) и meta.json с числом записей, последним штампом
+времени и параметрами пересчёта. При открытии тренды читаются с диска, из БД
+догружаются только записи WHERE timestamp > последнего закэшированного.
+
+Колонки только дописываются в конец; meta.json пишется последним и атомарно
+(os.replace), поэтому прерванная запись не портит кэш - лишние байты за
+meta["count"] игнорируются и перезаписываются следующим дописыванием.
+Общий объём ограничен cache_max_bytes, вытесняются давно не открывавшиеся таблицы.
+'''
+
+from Lib import pipestreamdbread as pdb
+from Lib import trend_store as ts
+import numpy as np
+import threading
+import logging
+import shutil
+import json
+import time
+import os
+
+cache_root = os.path.join("cache", "trends")
+cache_max_bytes = 2 << 30 # общий предел кэша трендов на диске
+cache_format_version = 1
+
+timestamps_file = "timestamps.bin"
+meta_file = "meta.json"
+
+cache_locks = {}
+cache_locks_lock = threading.Lock()
+
+#=========================================================================================================
+def database_key() -> str:
+    # кэши разных серверов и баз не смешиваются
+    params = pdb.db_connection_params
+    return f"{params['host']}_{params['port']}_{params['database']}"
+#-----------------------------------------------------------------------------------------------------
+def directory_lock(path: str) -> threading.Lock:
+    # один кэш могут открыть одновременно основной загрузчик и загрузчик наложения
+    with cache_locks_lock:
+        return cache_locks.setdefault(os.path.abspath(path), threading.Lock())
+#-----------------------------------------------------------------------------------------------------
+def join_blocks(blocks: list, channel_names=None):
+    # блоки TrendStore в любом порядке загрузки -> (штампы, {канал: значения}) по возрастанию времени
+    channel_names = list(channel_names) if channel_names is not None else list(ts.trend_channel_names)
+    blocks = sorted((b for b in blocks if len(b)), key=lambda b: b.timestamps[0])
+    if not blocks:
+        return np.empty(0, dtype=np.int64), {name: np.empty(0, dtype=np.float32) for name in channel_names}
+    timestamps = np.concatenate([b.timestamps for b in blocks])
+    columns = {name: np.concatenate([b.column(name) for b in blocks]) for name in channel_names}
+    return timestamps, columns
+#=========================================================================================================
+class TrendCache:
+    # source - откуда получены тренды ("add_data" или "points"), scaling - параметры пересчёта
+    # в физические величины; при их изменении кэш недействителен и строится заново
+
+    def __init__(self, table_name: str, source: str, scaling=None, channel_names=None, root: str = None):
+        self.table_name = table_name
+        self.source = source
+        self.scaling = [None if v is None else float(v) for v in scaling] if scaling is not None else None
+        self.channel_names = list(channel_names) if channel_names is not None else list(ts.trend_channel_names)
+        self.root = root if root is not None else cache_root
+        self.path = os.path.join(self.root, database_key(), table_name)
+        self.lock = directory_lock(self.path)
+        self.meta = None
+
+    def column_path(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.bin")
+
+    def files(self) -> list:
+        return [(os.path.join(self.path, timestamps_file), np.dtype(np.int64))] + \
+               [(self.column_path(name), np.dtype(np.float32)) for name in self.channel_names]
+
+    @property
+    def count(self) -> int:
+        return self.meta["count"] if self.meta else 0
+
+    @property
+    def rows(self) -> int:
+        # строк БД, покрытых кэшем (записи с ошибками в кэш не попадают)
+        return self.meta["rows"] if self.meta else 0
+
+    @property
+    def last_timestamp(self):
+        return self.meta["last_timestamp"] if self.meta else None
+    #-----------------------------------------------------------------------------------------------------
+    def read_meta(self):
+        try:
+            with open(os.path.join(self.path, meta_file), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write_meta(self, meta: dict):
+        tmp = os.path.join(self.path, meta_file + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(self.path, meta_file))
+        self.meta = meta
+
+    def meta_matches(self, meta) -> bool:
+        return (isinstance(meta, dict)
+                and meta.get("version") == cache_format_version
+                and meta.get("table") == self.table_name
+                and meta.get("source") == self.source
+                and meta.get("scaling") == self.scaling
+                and meta.get("channels") == self.channel_names
+                and isinstance(meta.get("count"), int) and meta["count"] > 0)
+    #-----------------------------------------------------------------------------------------------------
+    def load(self):
+        # TrendStore из кэша или None, если кэша нет или он не прошёл проверку
+        with self.lock:
+            meta = self.read_meta()
+            if meta is None:
+                return None
+            if not self.meta_matches(meta):
+                logging.info(f"Кэш трендов {self.table_name}: устарел формат или параметры пересчёта")
+                self.invalidate_locked()
+                return None
+
+            count = meta["count"]
+            arrays = []
+            try:
+                for path, dtype in self.files():
+                    if os.path.getsize(path) < count * dtype.itemsize:
+                        raise ValueError(f"файл {os.path.basename(path)} короче заявленного")
+                    # чтение без memmap: отображение держало бы файл открытым и мешало дописыванию
+                    arrays.append(np.fromfile(path, dtype=dtype, count=count))
+                timestamps = arrays[0]
+                if timestamps[-1] != meta["last_timestamp"] or np.any(timestamps[1:] < timestamps[:-1]):
+                    raise ValueError("штампы времени не согласуются с meta.json")
+            except (OSError, ValueError) as e:
+                logging.warning(f"Кэш трендов {self.table_name} повреждён ({e}), будет построен заново")
+                self.invalidate_locked()
+                return None
+
+            meta["last_access"] = time.time()
+            self.write_meta(meta)
+
+        return ts.TrendStore.from_arrays(timestamps, dict(zip(self.channel_names, arrays[1:])), self.channel_names)
+
+    def matches_database(self, cursor) -> bool:
+        # Записи до последнего закэшированного штампа в БД не менялись: совпадает их число.
+        # Удалённые или вставленные задним числом записи - кэш строится заново.
+        if not self.meta:
+            return False
+        cursor.execute(f"SELECT COUNT(*) FROM {self.table_name} WHERE timestamp <= %s", (self.last_timestamp,))
+        return int(cursor.fetchone()[0]) == self.rows
+    #-----------------------------------------------------------------------------------------------------
+    def save(self, timestamps, columns: dict, rows: int):
+        # полная перезапись кэша (после загрузки таблицы целиком)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if len(timestamps) == 0 or self.nbytes_for(len(timestamps)) > cache_max_bytes:
+            return
+        with self.lock:
+            self.invalidate_locked()
+            os.makedirs(self.path, exist_ok=True)
+            for (path, dtype), arr in zip(self.files(), [timestamps] + [columns[n] for n in self.channel_names]):
+                np.ascontiguousarray(arr, dtype=dtype).tofile(path)
+            self.write_meta({"version": cache_format_version, "table": self.table_name,
+                             "source": self.source, "scaling": self.scaling, "channels": self.channel_names,
+                             "count": len(timestamps), "rows": int(rows),
+                             "first_timestamp": int(timestamps[0]), "last_timestamp": int(timestamps[-1]),
+                             "last_access": time.time()})
+        enforce_size_limit(self.root, keep=self.path)
+
+    def append(self, timestamps, columns: dict, rows: int):
+        # дописывание догруженных записей (все новее last_timestamp)
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if not self.meta or (len(timestamps) == 0 and rows == 0):
+            return
+        with self.lock:
+            count = self.meta["count"]
+            if len(timestamps):
+                for (path, dtype), arr in zip(self.files(), [timestamps] + [columns[n] for n in self.channel_names]):
+                    with open(path, "r+b") as f:
+                        f.seek(count * dtype.itemsize)
+                        np.ascontiguousarray(arr, dtype=dtype).tofile(f)
+                        f.truncate()
+            meta = dict(self.meta)
+            meta["count"] = count + len(timestamps)
+            meta["rows"] = self.meta["rows"] + int(rows)
+            if len(timestamps):
+                meta["last_timestamp"] = int(timestamps[-1])
+            self.write_meta(meta)
+        enforce_size_limit(self.root, keep=self.path)
+
+    def invalidate(self):
+        with self.lock:
+            self.invalidate_locked()
+
+    def invalidate_locked(self):
+        self.meta = None
+        try:
+            os.remove(os.path.join(self.path, meta_file))
+        except FileNotFoundError:
+            pass
+
+    def nbytes_for(self, count: int) -> int:
+        return sum(count * dtype.itemsize for _, dtype in self.files())
+#=========================================================================================================
+def enforce_size_limit(root: str = None, max_bytes: int = None, keep: str = None):
+    # удаляет кэши таблиц, которые дольше всех не открывались, пока общий объём больше предела
+    root = root if root is not None else cache_root
+    max_bytes = max_bytes if max_bytes is not None else cache_max_bytes
+    entries = []
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        if meta_file not in filenames and not any(name.endswith(".bin") for name in filenames):
+            continue
+        size = sum(os.path.getsize(os.path.join(dirpath, name)) for name in filenames)
+        try:
+            with open(os.path.join(dirpath, meta_file), "r", encoding="utf-8") as f:
+                last_access = float(json.load(f).get("last_access", 0))
+        except (OSError, ValueError, AttributeError):
+            last_access = 0.0 # без meta.json - остатки недописанного кэша, удаляются первыми
+        entries.append((last_access, dirpath, size))
+        total += size
+
+    keep = os.path.abspath(keep) if keep else None
+    for last_access, dirpath, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if os.path.abspath(dirpath) == keep:
+            continue
+        with directory_lock(dirpath):
+            shutil.rmtree(dirpath, ignore_errors=True)
+        logging.info(f"Кэш трендов: удалён {dirpath} ({size} байт) - превышен предел {max_bytes} байт")
+        total -= size
+#=========================================================================================================
@@ -0,0 +1,219 @@
+'''
+Компактное колоночное хранилище трендов: штампы времени int64 (мс) и по одному
+массиву float32 на канал. Рост только дописыванием блоков в конец или в начало
+(при загрузке от новых записей к старым), срезы без копирования.
+'''
+
+import numpy as np
+import logging
+from datetime import datetime
+
+trend_channel_names = ["U_A_rms", "U_B_rms", "U_C_rms", "I_A_rms", "I_B_rms", "I_C_rms"]
+
+min_capacity = 1024
+
+#=========================================================================================================
+class TrendStore:
+    __slots__ = ("channel_names", "_timestamps", "_channels", "_start", "_size", "_readonly")
+
+    def __init__(self, channel_names=None, capacity: int = 0):
+        self.channel_names = list(channel_names) if channel_names is not None else list(trend_channel_names)
+        self._timestamps = np.empty(capacity, dtype=np.int64)
+        self._channels = {name: np.empty(capacity, dtype=np.float32) for name in self.channel_names}
+        self._start = 0 # занятая часть буферов: [_start, _start + _size)
+        self._size = 0
+        self._readonly = False
+
+    @classmethod
+    def from_arrays(cls, timestamps, columns: dict, channel_names=None) -> "TrendStore":
+        store = cls(channel_names, capacity=len(timestamps))
+        store.append(timestamps, columns)
+        return store
+
+    def __len__(self):
+        return self._size
+
+    def is_empty(self) -> bool:
+        return self._size == 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._timestamps)
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        # штампы времени в мс (view)
+        return self._timestamps[self._start:self._start + self._size]
+
+    def column(self, name: str) -> np.ndarray:
+        return self._channels[name][self._start:self._start + self._size]
+
+    def columns(self) -> dict:
+        return {name: self.column(name) for name in self.channel_names}
+
+    def nbytes(self) -> int:
+        return self._size * (self._timestamps.itemsize + sum(a.itemsize for a in self._channels.values()))
+    #-----------------------------------------------------------------------------------------------------
+    def reserve(self, capacity: int, front: int = 0):
+        # перевыделение буферов; front - сколько места оставить перед данными
+        if capacity < self._size + front:
+            capacity = self._size + front
+        if capacity <= self.capacity and front <= self._start:
+            return
+        if self._readonly:
+            raise ValueError("TrendStore: срез хранилища доступен только для чтения")
+
+        a = self._start
+        b = self._start + self._size
+
+        timestamps = np.empty(capacity, dtype=np.int64)
+        timestamps[front:front + self._size] = self._timestamps[a:b]
+        self._timestamps = timestamps
+
+        for name, arr in self._channels.items():
+            grown = np.empty(capacity, dtype=np.float32)
+            grown[front:front + self._size] = arr[a:b]
+            self._channels[name] = grown
+
+        self._start = front
+
+    def _write(self, pos: int, timestamps: np.ndarray, columns: dict):
+        n = len(timestamps)
+        self._timestamps[pos:pos + n] = timestamps
+        for name in self.channel_names:
+            if name in columns and columns[name] is not None:
+                self._channels[name][pos:pos + n] = np.asarray(columns[name], dtype=np.float32)
+            else:
+                self._channels[name][pos:pos + n] = np.nan
+
+    def append(self, timestamps, columns: dict):
+        # timestamps - последовательность мс по возрастанию, columns - {канал: значения}
+        # отсутствующие каналы заполняются NaN
+        if self._readonly:
+            raise ValueError("TrendStore: срез хранилища доступен только для чтения")
+
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        n = len(timestamps)
+        if n == 0:
+            return
+
+        if self._size > 0 and timestamps[0] < self.timestamps[-1]:
+            logging.warning("TrendStore: дописываемый блок не упорядочен по времени относительно имеющихся данных")
+
+        end = self._start + self._size
+        if end + n > self.capacity:
+            self.reserve(max(self._start + self._size + n, 2 * self.capacity, min_capacity), front=self._start)
+            end = self._start + self._size
+
+        self._write(end, timestamps, columns)
+        self._size += n
+
+    def prepend(self, timestamps, columns: dict):
+        # дописывание более раннего блока перед имеющимися данными
+        if self._readonly:
+            raise ValueError("TrendStore: срез хранилища доступен только для чтения")
+
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        n = len(timestamps)
+        if n == 0:
+            return
+
+        if self._size > 0 and timestamps[-1] > self.timestamps[0]:
+            logging.warning("TrendStore: блок в начало не упорядочен по времени относительно имеющихся данных")
+
+        if n > self._start:
+            tail = self.capacity - self._start - self._size
+            front = max(n, self._size + n, min_capacity)
+            self.reserve(front + self._size + tail, front=front)
+
+        self._start -= n
+        self._write(self._start, timestamps, columns)
+        self._size += n
+
+    def insert_block(self, block: "TrendStore") -> tuple:
+        # Добавляет блок в конец или в начало (по времени); возвращает диапазон индексов блока
+        if self._size == 0 or block.timestamps[0] >= self.timestamps[-1]:
+            start = self._size
+            self.append(block.timestamps, block.columns())
+            return start, self._size
+        self.prepend(block.timestamps, block.columns())
+        return 0, len(block)
+
+    def view(self, start: int = 0, stop: int = None) -> "TrendStore":
+        # срез без копирования данных, только для чтения
+        start, stop, _ = slice(start, stop).indices(self._size)
+        stop = max(start, stop)
+
+        sub = TrendStore.__new__(TrendStore)
+        sub.channel_names = self.channel_names
+        sub._timestamps = self.timestamps[start:stop]
+        sub._channels = {name: self.column(name)[start:stop] for name in self.channel_names}
+        sub._start = 0
+        sub._size = stop - start
+        sub._readonly = True
+        return sub
+    #-----------------------------------------------------------------------------------------------------
+    def time_seconds(self, start: int = 0, stop: int = None) -> np.ndarray:
+        # ось X для графиков (секунды, float64); считается по запросу и не хранится
+        return self.timestamps[start:stop] / 1000.0
+
+    def first_time(self) -> float:
+        return self._timestamps[self._start] / 1000.0 if self._size else 0.0
+
+    def last_time(self) -> float:
+        return self._timestamps[self._start + self._size - 1] / 1000.0 if self._size else 0.0
+
+    def nearest_index(self, time_sec: float) -> int:
+        # индекс записи, ближайшей к заданному времени (сек), за O(log n)
+        if self._size == 0:
+            return -1
+        ts = self.timestamps
+        target = time_sec * 1000.0
+        idx = int(np.searchsorted(ts, target))
+        if idx >= self._size:
+            return self._size - 1
+        if idx > 0 and (target - ts[idx - 1]) <= (ts[idx] - target):
+            return idx - 1
+        return idx
+
+    def index_of_timestamp(self, timestamp_ms: int) -> int:
+        # точное совпадение штампа времени или -1
+        if self._size == 0:
+            return -1
+        ts = self.timestamps
+        idx = int(np.searchsorted(ts, timestamp_ms))
+        if idx < self._size and ts[idx] == timestamp_ms:
+            return idx
+        return -1
+
+    def index_range(self, t0_sec: float, t1_sec: float) -> tuple:
+        # полуинтервал индексов [start, stop) для записей в диапазоне времени (сек)
+        ts = self.timestamps
+        start = int(np.searchsorted(ts, t0_sec * 1000.0, side="left"))
+        stop = int(np.searchsorted(ts, t1_sec * 1000.0, side="right"))
+        return start, max(start, stop)
+
+    def row(self, idx: int) -> dict:
+        pos = self._start + idx
+        ret = {"timestamp": int(self._timestamps[pos])}
+        for name in self.channel_names:
+            ret[name] = float(self._channels[name][pos])
+        return ret
+
+    def nanmax(self, name: str) -> float:
+        col = self.column(name)
+        if len(col) == 0 or np.all(np.isnan(col)):
+            return np.nan
+        return float(np.nanmax(col))
+    #-----------------------------------------------------------------------------------------------------
+    def to_csv(self, filename: str, start: int = 0, stop: int = None):
+        start, stop, _ = slice(start, stop).indices(self._size)
+        with open(filename, "w", encoding="utf-8") as f:
+            f.write(";".join(["timestamp", "datetime"] + self.channel_names) + "\n")
+            ts = self.timestamps[start:stop]
+            cols = [self.column(name)[start:stop] for name in self.channel_names]
+            for i in range(len(ts)):
+                date_time = datetime.fromtimestamp(ts[i] / 1000).strftime('%Y-%m-%d %H:%M:%S')
+                values = ["" if np.isnan(c[i]) else f"{c[i]:.2f}" for c in cols]
+                f.write(";".join([str(ts[i]), date_time] + values) + "\n")
+#=========================================================================================================
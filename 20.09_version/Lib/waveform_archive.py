@@ -0,0 +1,218 @@
+'''
+Локальный архив осциллограмм логгера для просмотра без подключения к БД.
+Каталог архива - один логгер: frames.bin (кадры фиксированного размера, int32
+значения АЦП (adc >> 2) [npoints, каналы] подряд), index.bin (штамп времени и
+множители/делители каждой записи) и header.json (форма кадра, маска, число записей).
+
+Файлы только дописываются в конец, header.json обновляется последним через
+os.replace - недописанные кадры за header["count"] не видны и перезаписываются.
+Чтение через np.memmap: кадр или диапазон кадров - срез без копирования,
+в физические величины пересчитывается только запрошенная запись.
+'''
+
+from Lib import pipestreamdbread as pdb
+import numpy as np
+import logging
+import json
+import os
+
+archive_root = "archive"
+archive_format_version = 1
+
+frames_file = "frames.bin"
+index_file = "index.bin"
+header_file = "header.json"
+
+# столбцы БД, из которых строится архив
+archive_source_columns = ["timestamp", "points", "npoints", "mask",
+                          "cfg_voltage_multiplier", "cfg_voltage_divider", "cfg_current_multiplier", "cfg_current_divider"]
+
+index_dtype = np.dtype([("timestamp", "<i8"),
+                        ("cfg_voltage_multiplier", "<f8"), ("cfg_voltage_divider", "<f8"),
+                        ("cfg_current_multiplier", "<f8"), ("cfg_current_divider", "<f8")])
+frame_dtype = np.dtype("<i4")
+
+#=========================================================================================================
+def archive_path(table_name: str, root: str = None) -> str:
+    return os.path.join(root if root is not None else archive_root, table_name)
+#-----------------------------------------------------------------------------------------------------
+def is_archive(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, header_file))
+#=========================================================================================================
+class WaveformArchive:
+    # Архив одного логгера: чтение (memmap) и дописывание новых записей.
+    # Все записи архива одной формы (npoints, каналы); записи другой формы не архивируются.
+
+    def __init__(self, path: str):
+        self.path = path
+        self.header = None
+        self._frames = None
+        self._index = None
+        self.refresh()
+
+    @classmethod
+    def for_table(cls, table_name: str, root: str = None) -> "WaveformArchive":
+        return cls(archive_path(table_name, root))
+
+    @property
+    def table_name(self) -> str:
+        return self.header["table"] if self.header else os.path.basename(os.path.normpath(self.path))
+
+    def __len__(self):
+        return self.header["count"] if self.header else 0
+
+    @property
+    def last_timestamp(self):
+        return int(self._index["timestamp"][-1]) if len(self) else None
+
+    @property
+    def frame_shape(self) -> tuple:
+        return (self.header["npoints"], self.header["channels"]) if self.header else None
+
+    def frame_nbytes(self) -> int:
+        npoints, channels = self.frame_shape
+        return npoints * channels * frame_dtype.itemsize
+    #-----------------------------------------------------------------------------------------------------
+    def read_header(self):
+        try:
+            with open(os.path.join(self.path, header_file), "r", encoding="utf-8") as f:
+                header = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if header.get("version") != archive_format_version:
+            logging.warning(f"Архив {self.path}: неподдерживаемая версия формата {header.get('version')}")
+            return None
+        return header
+
+    def write_header(self, header: dict):
+        tmp = os.path.join(self.path, header_file + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(header, f)
+        os.replace(tmp, os.path.join(self.path, header_file))
+        self.header = header
+
+    def refresh(self):
+        # (пере)отображение файлов на число записей из header.json
+        self.header = self.read_header()
+        self._frames = None
+        self._index = np.empty(0, dtype=index_dtype)
+        count = len(self)
+        if count == 0:
+            return
+        npoints, channels = self.frame_shape
+        frames_path = os.path.join(self.path, frames_file)
+        index_path = os.path.join(self.path, index_file)
+        if os.path.getsize(frames_path) < count * self.frame_nbytes() or \
+                os.path.getsize(index_path) < count * index_dtype.itemsize:
+            logging.error(f"Архив {self.path} повреждён: файлы короче заявленного числа записей")
+            self.header = None
+            return
+        self._frames = np.memmap(frames_path, dtype=frame_dtype, mode="r", shape=(count, npoints, channels))
+        self._index = np.memmap(index_path, dtype=index_dtype, mode="r", shape=(count,))
+    #-----------------------------------------------------------------------------------------------------
+    def timestamps(self) -> np.ndarray:
+        return self._index["timestamp"]
+
+    def timestamp_list(self) -> list:
+        return self._index["timestamp"].tolist()
+
+    def index_of_timestamp(self, timestamp_ms: int) -> int:
+        # номер ближайшей записи
+        ts = self._index["timestamp"]
+        if len(ts) == 0:
+            return -1
+        idx = int(np.searchsorted(ts, timestamp_ms))
+        if idx >= len(ts):
+            return len(ts) - 1
+        if idx > 0 and timestamp_ms - ts[idx - 1] <= ts[idx] - timestamp_ms:
+            return idx - 1
+        return idx
+
+    def frames(self, start: int = 0, stop: int = None) -> np.ndarray:
+        # кадры АЦП [записи, npoints, каналы] - срез отображения без копирования
+        if self._frames is None:
+            return np.empty((0, 0, 0), dtype=frame_dtype)
+        return self._frames[start:stop]
+
+    def coefficients(self, start: int = 0, stop: int = None) -> np.ndarray:
+        # множители пересчёта кадров в В/А [записи, каналы]
+        index = self._index[start:stop]
+        full_scale = pdb.ADC_raw_max / pdb.ADC_full_scale_V
+        volt = index["cfg_voltage_multiplier"] / index["cfg_voltage_divider"] / full_scale
+        curr = index["cfg_current_multiplier"] / index["cfg_current_divider"] / full_scale
+        coeffs = np.repeat(curr[:, None], self.frame_shape[1], axis=1)
+        coeffs[:, :3] = volt[:, None] # сначала идут 3 канала напряжения
+        return coeffs
+
+    def signals(self, start: int = 0, stop: int = None) -> np.ndarray:
+        # сигналы в В/А [записи, npoints, каналы]
+        return self.frames(start, stop) * self.coefficients(start, stop)[:, None, :]
+
+    def record(self, idx: int) -> dict:
+        # запись в виде словаря, как из БД; вместо points - уже декодированные сигналы
+        entry = self._index[idx]
+        rec = {name: entry[name].item() for name in index_dtype.names}
+        rec["npoints"] = self.header["npoints"]
+        rec["mask"] = self.header["mask"]
+        rec["signals"] = self.signals(idx, idx + 1)[0]
+        return rec
+
+    def colnames(self) -> list:
+        return list(index_dtype.names) + ["npoints", "mask", "signals"]
+    #-----------------------------------------------------------------------------------------------------
+    def append_records(self, recs: list) -> int:
+        # Дописывает записи (словари со столбцами archive_source_columns) новее последней в архиве.
+        # Возвращает число добавленных записей.
+        last = self.last_timestamp
+        recs = sorted((r for r in recs if r.get("timestamp") is not None and (last is None or r["timestamp"] > last)),
+                      key=lambda r: r["timestamp"])
+        if not recs:
+            return 0
+
+        header = dict(self.header) if self.header else None
+        payloads = []
+        index = []
+        skipped = 0
+        for rec in recs:
+            if not rec.get("points") or not rec.get("npoints") or not rec.get("mask") \
+                    or not rec.get("cfg_voltage_divider") or not rec.get("cfg_current_divider"):
+                skipped += 1
+                continue
+            if header is None:
+                header = {"version": archive_format_version, "table": self.table_name,
+                          "npoints": int(rec["npoints"]), "channels": rec["mask"].count("1"),
+                          "mask": rec["mask"], "sampling_rate": 25600, "count": 0}
+            if rec["npoints"] != header["npoints"] or rec["mask"].count("1") != header["channels"]:
+                skipped += 1
+                continue
+            payload = pdb.points_payload(rec)
+            if payload is None:
+                skipped += 1
+                continue
+            payloads.append(payload)
+            index.append(tuple(rec[name] or 0 for name in index_dtype.names))
+
+        if skipped:
+            logging.warning(f"Архив {self.table_name}: пропущено {skipped} записей (ошибка или другая форма кадра)")
+        if not payloads:
+            return 0
+
+        npoints, channels = header["npoints"], header["channels"]
+        cells = np.frombuffer(b"".join(payloads), dtype=np.uint8).reshape(len(payloads), npoints, channels, pdb.cellsize)
+        frames = pdb.decode_adc_cells(cells).astype(frame_dtype, copy=False)
+        index = np.array(index, dtype=index_dtype)
+
+        os.makedirs(self.path, exist_ok=True)
+        count = header["count"]
+        for name, arr, itemsize in ((frames_file, frames, npoints * channels * frame_dtype.itemsize),
+                                    (index_file, index, index_dtype.itemsize)):
+            path = os.path.join(self.path, name)
+            with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+                f.seek(count * itemsize)
+                arr.tofile(f) # без truncate: в Windows файл с открытым отображением не обрезается
+
+        header["count"] = count + len(payloads)
+        self.write_header(header)
+        self.refresh()
+        return len(payloads)
+#=========================================================================================================
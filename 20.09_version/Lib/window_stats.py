@@ -0,0 +1,119 @@
+'''
+Статистика канала (среднее, мин, макс, СКЗ) по произвольному диапазону записей за O(1).
+Строится один раз на загрузку: префиксные суммы, суммы квадратов и число значений,
+а для мин/макс - разреженная таблица по блокам плюс префиксные/суффиксные
+экстремумы внутри блоков.
+'''
+
+import numpy as np
+
+stats_block_size = 256
+
+#=========================================================================================================
+class ColumnStats:
+    __slots__ = ("size", "block", "csum", "csq", "ccnt", "pre_min", "pre_max", "suf_min", "suf_max",
+                 "table_min", "table_max", "values_min", "values_max")
+
+    def __init__(self, values: np.ndarray, block: int = stats_block_size):
+        n = len(values)
+        self.size = n
+        self.block = block
+
+        valid = ~np.isnan(values)
+        v = np.where(valid, values, 0).astype(np.float64)
+
+        self.csum = np.zeros(n + 1, dtype=np.float64)
+        np.cumsum(v, out=self.csum[1:])
+        self.csq = np.zeros(n + 1, dtype=np.float64)
+        np.cumsum(v * v, out=self.csq[1:])
+        self.ccnt = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(valid, out=self.ccnt[1:])
+
+        # NaN не участвуют в экстремумах
+        self.values_min = np.where(valid, values, np.inf).astype(np.float32)
+        self.values_max = np.where(valid, values, -np.inf).astype(np.float32)
+
+        nblocks = (n + block - 1) // block
+        pad = nblocks * block - n
+        bmin = np.concatenate([self.values_min, np.full(pad, np.inf, dtype=np.float32)]).reshape(nblocks, block)
+        bmax = np.concatenate([self.values_max, np.full(pad, -np.inf, dtype=np.float32)]).reshape(nblocks, block)
+
+        # экстремумы от начала блока до позиции и от позиции до конца блока
+        self.pre_min = np.minimum.accumulate(bmin, axis=1).ravel()[:n]
+        self.pre_max = np.maximum.accumulate(bmax, axis=1).ravel()[:n]
+        self.suf_min = np.minimum.accumulate(bmin[:, ::-1], axis=1)[:, ::-1].ravel()[:n]
+        self.suf_max = np.maximum.accumulate(bmax[:, ::-1], axis=1)[:, ::-1].ravel()[:n]
+
+        # разреженная таблица по экстремумам блоков: уровень k - окна из 2^k блоков
+        self.table_min = [bmin.min(axis=1)] if nblocks else []
+        self.table_max = [bmax.max(axis=1)] if nblocks else []
+        k = 1
+        while (1 << k) <= nblocks:
+            half = 1 << (k - 1)
+            prev_min = self.table_min[-1]
+            prev_max = self.table_max[-1]
+            self.table_min.append(np.minimum(prev_min[:-half], prev_min[half:]))
+            self.table_max.append(np.maximum(prev_max[:-half], prev_max[half:]))
+            k += 1
+
+    def _blocks_extremes(self, first: int, last: int) -> tuple:
+        # мин/макс по блокам [first, last] за два обращения к таблице
+        k = (last - first + 1).bit_length() - 1
+        mn = min(self.table_min[k][first], self.table_min[k][last - (1 << k) + 1])
+        mx = max(self.table_max[k][first], self.table_max[k][last - (1 << k) + 1])
+        return mn, mx
+
+    def query(self, start: int, stop: int) -> dict:
+        # статистика по записям [start, stop)
+        start = max(0, start)
+        stop = min(self.size, stop)
+        ret = {"count": 0, "mean": np.nan, "min": np.nan, "max": np.nan, "rms": np.nan}
+        if stop <= start:
+            return ret
+
+        count = int(self.ccnt[stop] - self.ccnt[start])
+        ret["count"] = count
+        if count == 0:
+            return ret
+
+        ret["mean"] = (self.csum[stop] - self.csum[start]) / count
+        ret["rms"] = float(np.sqrt(max(self.csq[stop] - self.csq[start], 0.0) / count))
+
+        last = stop - 1
+        b0 = start // self.block
+        b1 = last // self.block
+        if b0 == b1:
+            # внутри одного блока - не более block значений
+            mn = float(self.values_min[start:stop].min())
+            mx = float(self.values_max[start:stop].max())
+        else:
+            mn = min(self.suf_min[start], self.pre_min[last])
+            mx = max(self.suf_max[start], self.pre_max[last])
+            if b1 - b0 > 1:
+                bmn, bmx = self._blocks_extremes(b0 + 1, b1 - 1)
+                mn = min(mn, bmn)
+                mx = max(mx, bmx)
+
+        ret["min"] = float(mn)
+        ret["max"] = float(mx)
+        return ret
+#=========================================================================================================
+class WindowStats:
+    # Статистика по всем каналам TrendStore; запросы по времени (сек) или по индексам
+
+    def __init__(self, store):
+        self.store = store
+        self.size = len(store)
+        self.columns = {name: ColumnStats(store.column(name)) for name in store.channel_names}
+
+    def is_stale(self, store) -> bool:
+        return store is not self.store or len(store) != self.size
+
+    def query_range(self, start: int, stop: int) -> dict:
+        return {name: stats.query(start, stop) for name, stats in self.columns.items()}
+
+    def query_time(self, t0_sec: float, t1_sec: float) -> dict:
+        # O(log n) на поиск границ + O(1) на каждый канал
+        start, stop = self.store.index_range(t0_sec, t1_sec)
+        return self.query_range(start, stop)
+#=========================================================================================================
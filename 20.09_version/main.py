@@ -2,6 +2,7 @@ import sys
 import logging
 from ui.main_window import MainWindow
 from utils.config import setup_logging, create_export_directory
+from Lib import process_pool as ppl
 from PyQt6.QtWidgets import QApplication
 
 def main():
@@ -11,7 +12,9 @@ def main():
     app = QApplication(sys.argv)
     ex = MainWindow()
     ex.show()
-    sys.exit(app.exec())
+    ret = app.exec()
+    ppl.shutdown_process_pool()
+    sys.exit(ret)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,154 @@
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, QCheckBox, QDoubleSpinBox, QSpinBox,
+                             QPushButton, QLabel, QTableWidget, QTableWidgetItem, QHeaderView)
+from PyQt6.QtCore import Qt
+from Lib import fleet_scan as fsc
+from Lib.fleet_scan_thread import FleetScanThread
+from datetime import datetime
+import logging
+
+
+class FleetScanDialog(QDialog):
+    """
+    Скан уставок по всем логгерам: отчёт с интервалами выхода за пределы.
+    """
+    headers = ["Устройство", "Событие", "Начало", "Конец", "Длительность, с", "Записей", "Экстремум", "Каналы"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.parent = parent
+        self.setWindowTitle("Скан уставок по всем логгерам")
+        self.setMinimumSize(800, 400)
+        self.scan_thread = None
+
+        main_layout = QVBoxLayout(self)
+        form_layout = QFormLayout()
+
+        self.limit_widgets = {}
+        defaults = {"overvoltage": (True, 242.0), "undervoltage": (True, 198.0), "overcurrent": (False, 100.0)}
+        for kind, (enabled, value) in defaults.items():
+            row = QHBoxLayout()
+            check = QCheckBox()
+            check.setChecked(enabled)
+            spin = QDoubleSpinBox()
+            spin.setRange(0, 100000)
+            spin.setDecimals(2)
+            spin.setValue(value)
+            spin.setSuffix(" А" if kind == "overcurrent" else " В")
+            row.addWidget(check)
+            row.addWidget(spin)
+            form_layout.addRow(fsc.scan_kind_names[kind] + ":", row)
+            self.limit_widgets[kind] = (check, spin)
+
+        self.merge_gap_spin = QSpinBox()
+        self.merge_gap_spin.setRange(0, 86400)
+        self.merge_gap_spin.setValue(fsc.default_merge_gap_ms // 1000)
+        self.merge_gap_spin.setSuffix(" с")
+        self.merge_gap_spin.setToolTip("Нарушения, разделённые меньшим промежутком, объединяются в один интервал")
+        form_layout.addRow("Объединять интервалы ближе:", self.merge_gap_spin)
+        main_layout.addLayout(form_layout)
+
+        buttons_layout = QHBoxLayout()
+        self.start_button = QPushButton("Сканировать")
+        self.start_button.clicked.connect(self.start_scan)
+        buttons_layout.addWidget(self.start_button)
+        self.stop_button = QPushButton("Остановить")
+        self.stop_button.setEnabled(False)
+        self.stop_button.clicked.connect(self.stop_scan)
+        buttons_layout.addWidget(self.stop_button)
+        self.status_label = QLabel("")
+        buttons_layout.addWidget(self.status_label, 1)
+        main_layout.addLayout(buttons_layout)
+
+        self.table = QTableWidget(0, len(self.headers))
+        self.table.setHorizontalHeaderLabels(self.headers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.setSortingEnabled(True)
+        self.table.setToolTip("Двойной щелчок - открыть интервал в окне трендов")
+        self.table.cellDoubleClicked.connect(self.open_in_trends)
+        main_layout.addWidget(self.table)
+
+    def current_limits(self) -> list:
+        return [fsc.ScanLimit(kind, spin.value()) for kind, (check, spin) in self.limit_widgets.items() if check.isChecked()]
+
+    def start_scan(self):
+        limits = self.current_limits()
+        if not limits:
+            self.status_label.setText("Не выбрано ни одной уставки")
+            return
+
+        self.stop_scan()
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(0)
+        self.table.setSortingEnabled(True)
+        self.status_label.setText("Сканирование...")
+        self.start_button.setEnabled(False)
+        self.stop_button.setEnabled(True)
+
+        self.scan_thread = FleetScanThread(limits, self.merge_gap_spin.value() * 1000)
+        self.scan_thread.table_result_signal.connect(self.on_table_result)
+        self.scan_thread.progress_signal.connect(self.on_progress)
+        self.scan_thread.finished_signal.connect(self.on_scan_finished)
+        self.scan_thread.error_signal.connect(self.on_error)
+        self.scan_thread.finished.connect(self.on_thread_finished)
+        self.scan_thread.start()
+
+    def stop_scan(self):
+        if self.scan_thread is not None and self.scan_thread.isRunning():
+            self.scan_thread.cancel()
+            self.status_label.setText("Остановлено")
+
+    def on_table_result(self, table_name: str, intervals: list):
+        # сортировка отключается на время вставки, иначе строки переставляются посреди заполнения
+        self.table.setSortingEnabled(False)
+        for interval in intervals:
+            row = self.table.rowCount()
+            self.table.insertRow(row)
+            begin = datetime.fromtimestamp(interval["begin"] / 1000).strftime('%Y-%m-%d %H:%M:%S')
+            end = datetime.fromtimestamp(interval["end"] / 1000).strftime('%Y-%m-%d %H:%M:%S')
+            values = [interval["device"], fsc.scan_kind_names[interval["kind"]], begin, end,
+                      (interval["end"] - interval["begin"]) / 1000, interval["records"],
+                      interval["extreme"], ", ".join(interval["channels"])]
+            for col, value in enumerate(values):
+                item = QTableWidgetItem()
+                # числа кладутся как числа, чтобы сортировка была числовой
+                item.setData(Qt.ItemDataRole.DisplayRole, value if value is not None else "-")
+                if col == 0:
+                    item.setData(Qt.ItemDataRole.UserRole, interval["begin"])
+                self.table.setItem(row, col, item)
+        self.table.setSortingEnabled(True)
+
+    def on_progress(self, done: int, total: int):
+        self.status_label.setText(f"Просканировано таблиц: {done} из {total}, интервалов: {self.table.rowCount()}")
+
+    def on_scan_finished(self, total: int):
+        devices = {self.table.item(row, 0).text() for row in range(self.table.rowCount())}
+        self.status_label.setText(f"Готово: {total} интервалов на {len(devices)} устройствах")
+
+    def on_error(self, error_msg: str):
+        logging.error(error_msg)
+        self.status_label.setText(error_msg)
+
+    def on_thread_finished(self):
+        self.start_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+        thread = self.sender()
+        if thread is self.scan_thread:
+            self.scan_thread = None
+        if thread is not None:
+            thread.deleteLater()
+
+    def open_in_trends(self, row: int, column: int):
+        device_item = self.table.item(row, 0)
+        if device_item is None or not hasattr(self.parent, 'TrendsSubwindow'):
+            return
+        trends = self.parent.TrendsSubwindow
+        trends.fetch_logger_data(device_item.text())
+        trends.set_cursor_to_timestamp(device_item.data(Qt.ItemDataRole.UserRole))
+
+    def closeEvent(self, event):
+        if self.scan_thread is not None and self.scan_thread.isRunning():
+            self.scan_thread.cancel()
+            self.scan_thread.wait(2000)
+        super().closeEvent(event)
@@ -4,6 +4,8 @@ from PyQt6.QtCore import Qt
 from ui.records_view import RecordsViev_subwindow
 from ui.signals_view import SignalsView_subwindow
 from ui.trends_view import TrendsSubwindow
+from ui.fleet_scan_view import FleetScanDialog
+from Lib import pipestreamdbread as pdb
 
 
 class MainWindow(QMainWindow):
@@ -47,6 +49,16 @@ class MainWindow(QMainWindow):
         self.layout_toolbar.addWidget(self.layout_button)
         self.layout_button.clicked.connect(self.toggle_layout)
 
+        # Fleet scan button
+        self.fleet_scan_button = QToolButton()
+        self.fleet_scan_button.setText("⚡ Скан уставок")
+        self.fleet_scan_button.setToolTip("Поиск выходов за уставки по всем логгерам")
+        self.fleet_scan_button.setFixedSize(120, 40)
+        self.fleet_scan_button.setStyleSheet(self.get_toolbutton_style())
+        self.layout_toolbar.addWidget(self.fleet_scan_button)
+        self.fleet_scan_button.clicked.connect(self.show_fleet_scan)
+        self.fleet_scan_dialog = None
+
         ico = QIcon("./icons/oscilloscope.png")
         self.setWindowIcon(ico)
 
@@ -67,6 +79,7 @@ class MainWindow(QMainWindow):
         self.RecordsViev_subwindow.record_list_signal.connect(
             self.SignalsView_subwindow.set_current_table_timestamp_list)
         self.RecordsViev_subwindow.data_to_plot_signal.connect(self.TrendsSubwindow.plot_data_from_signal)
+        self.RecordsViev_subwindow.device_found_signal.connect(self.TrendsSubwindow.add_overlay_device)
 
         # Initialize window positions
         self.tile_subwindows()
@@ -124,6 +137,14 @@ class MainWindow(QMainWindow):
         # Update button styles
         self.theme_button.setStyleSheet(self.get_toolbutton_style())
         self.layout_button.setStyleSheet(self.get_toolbutton_style())
+        self.fleet_scan_button.setStyleSheet(self.get_toolbutton_style())
+
+    def show_fleet_scan(self):
+        """Open the fleet-wide limit scan dialog (non-modal, kept between openings)"""
+        if self.fleet_scan_dialog is None:
+            self.fleet_scan_dialog = FleetScanDialog(self)
+        self.fleet_scan_dialog.show()
+        self.fleet_scan_dialog.raise_()
 
     def apply_theme(self):
         """Apply the current theme to the application"""
@@ -325,6 +346,17 @@ class MainWindow(QMainWindow):
         finally:
             self._resizing = False
 
+    def closeEvent(self, event):
+        """
+        Stop background loaders of all windows, then close pooled database connections.
+        """
+        for window in (self.SignalsView_subwindow, self.TrendsSubwindow):
+            window.close()
+        if self.fleet_scan_dialog is not None:
+            self.fleet_scan_dialog.close()
+        pdb.close_connection_pool()
+        super().closeEvent(event)
+
     def resizeEvent(self, event):
         """
         Synchronize subwindow resizing with main window.
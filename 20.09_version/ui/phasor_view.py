@@ -0,0 +1,106 @@
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel
+from PyQt6.QtCore import Qt
+from Lib import phasors as phs
+from Lib import power_quality as pq
+import pyqtgraph as pg
+import numpy as np
+
+phase_colors = ['#FFD700', '#00C000', '#FF3030']  # A, B, C
+current_scale = 0.7  # длина векторов тока относительно напряжений, чтобы они не сливались
+
+
+class PhasorView(QWidget):
+    """
+    Векторная диаграмма основной гармоники текущей записи: напряжения сплошными, токи пунктиром;
+    под диаграммой - симметричные составляющие и коэффициент мощности.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.plot = pg.PlotWidget()
+        self.plot.setBackground('k')
+        self.plot.setAspectLocked(True)
+        self.plot.hideAxis('left')
+        self.plot.hideAxis('bottom')
+        self.plot.setMouseEnabled(x=False, y=False)
+        self.plot.setRange(xRange=(-1.2, 1.2), yRange=(-1.2, 1.2), padding=0)
+        circle = np.linspace(0, 2 * np.pi, 181)
+        grid_pen = pg.mkPen('#606060', width=1, style=Qt.PenStyle.DotLine)
+        self.plot.plot(np.cos(circle), np.sin(circle), pen=grid_pen)
+        self.plot.plot([-1.1, 1.1], [0, 0], pen=grid_pen)
+        self.plot.plot([0, 0], [-1.1, 1.1], pen=grid_pen)
+        layout.addWidget(self.plot, 1)
+
+        # элементы векторов создаются один раз, при смене записи меняются их координаты
+        self.lines = []
+        self.arrows = []
+        self.labels = []
+        for ch, name in enumerate(pq.signal_channel_names):
+            color = phase_colors[ch % 3]
+            style = Qt.PenStyle.SolidLine if ch < phs.voltage_channels else Qt.PenStyle.DashLine
+            self.lines.append(self.plot.plot([0, 0], [0, 0], pen=pg.mkPen(color, width=2, style=style)))
+            arrow = pg.ArrowItem(angle=180, headLen=12, tailLen=0, pen=None, brush=color)
+            self.plot.addItem(arrow)
+            self.arrows.append(arrow)
+            label = pg.TextItem(name, color=color, anchor=(0.5, 0.5))
+            self.plot.addItem(label)
+            self.labels.append(label)
+
+        self.info = QLabel("")
+        self.info.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        layout.addWidget(self.info)
+        self.clear()
+
+    def clear(self):
+        for line, arrow, label in zip(self.lines, self.arrows, self.labels):
+            line.setData([0, 0], [0, 0])
+            arrow.setVisible(False)
+            label.setVisible(False)
+        self.info.setText("")
+
+    def set_analysis(self, analysis: phs.PhasorAnalysis, record: int = 0):
+        """Показывает вектора одной записи из результата phasors.compute_phasors."""
+        vectors = analysis.phasors[record]
+        magnitudes = np.abs(vectors)
+        # напряжения и токи нормируются отдельно - по наибольшему модулю своей группы
+        scales = np.zeros(len(vectors))
+        for group, length in ((slice(0, phs.voltage_channels), 1.0), (slice(phs.voltage_channels, None), current_scale)):
+            top = np.nanmax(magnitudes[group]) if np.isfinite(magnitudes[group]).any() else 0.0
+            if top > 0:
+                scales[group] = length / top
+
+        for ch in range(len(self.lines)):
+            if ch >= len(vectors) or not np.isfinite(vectors[ch]) or scales[ch] == 0:
+                self.lines[ch].setData([0, 0], [0, 0])
+                self.arrows[ch].setVisible(False)
+                self.labels[ch].setVisible(False)
+                continue
+            tip = vectors[ch] * scales[ch]
+            angle = np.degrees(np.angle(tip))
+            self.lines[ch].setData([0, tip.real], [0, tip.imag])
+            self.arrows[ch].setStyle(angle=180 + angle)  # ArrowItem при angle=180 направлена вправо
+            self.arrows[ch].setPos(tip.real, tip.imag)
+            self.arrows[ch].setVisible(True)
+            self.labels[ch].setPos(tip.real * 1.12, tip.imag * 1.12)
+            self.labels[ch].setVisible(True)
+
+        self.info.setText(self.summary(analysis, record))
+
+    @staticmethod
+    def summary(analysis: phs.PhasorAnalysis, record: int) -> str:
+        def value(x, digits=2):
+            return "-" if not np.isfinite(x) else f"{x:.{digits}f}"
+
+        lines = [f"f1 = {value(analysis.frequency[record], 3)} Гц"]
+        for kind, sequences in (("U", analysis.voltage_sequences), ("I", analysis.current_sequences)):
+            parts = [f"{kind}{name} = {value(np.abs(sequences[record, k]))}"
+                     for k, name in enumerate(["0", "1", "2"])]
+            lines.append(", ".join(parts))
+        unbalance = analysis.voltage_unbalance()[record]
+        lines.append(f"K2U = {value(unbalance[0])} %, K0U = {value(unbalance[1])} %")
+        pf = ", ".join(f"{phase}: {value(analysis.power_factor[record, j], 3)}" for j, phase in enumerate(pq.phases))
+        lines.append(f"cos φ {pf}; общий {value(analysis.total_power_factor[record], 3)}")
+        return "\n".join(lines)
@@ -67,6 +67,7 @@ class RecordsTableModel(QAbstractTableModel):
 class RecordsViev_subwindow(QMdiSubWindow):
     data_to_plot_signal = QtCore.pyqtSignal(str, list, dict, int)
     record_list_signal = QtCore.pyqtSignal(list)
+    device_found_signal = QtCore.pyqtSignal(str)
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -281,6 +282,8 @@ class RecordsViev_subwindow(QMdiSubWindow):
         self.model.insertRow(self.model.rowCount(), row)
         self.table_view.resizeColumnsToContents()
         self.filter_table(self.search_edit.text())  # Reapply filter after adding new row
+        if device != "-":
+            self.device_found_signal.emit(device)
 
     def row_selection_event_handler(self, selected, deselected):
         if selected:
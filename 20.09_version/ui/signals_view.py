@@ -1,21 +1,38 @@
-from PyQt6.QtWidgets import QMdiSubWindow, QToolBar, QScrollArea, QToolButton, QLabel, QSlider, QCheckBox, QSizePolicy, QMessageBox, QWidget, QVBoxLayout, QHBoxLayout, QLineEdit
+from PyQt6.QtWidgets import QMdiSubWindow, QToolBar, QScrollArea, QToolButton, QLabel, QSlider, QCheckBox, QSizePolicy, QMessageBox, QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QFileDialog, QSplitter, QTableWidget, QTableWidgetItem, QComboBox
 from PyQt6.QtGui import QIcon, QAction, QPalette, QColor
 from PyQt6.QtCore import Qt, pyqtSignal
 from PyQt6 import QtCore
 from Lib import pipestreamdbread as pdb
 from Lib import read_record_by_time_thread as rec_read_trr
 from Lib import cifer_diapasons_parsing as cdp
+from Lib import spectrum as spm
+from Lib import harmonics as hm
+from Lib import phasors as phs
+from Lib import power_quality as pq
+from Lib import waveform_archive as wfa
+from Lib.archive_records_thread import ArchiveRecordsThread
+from Lib import playback_thread as pbt
+from Lib import spectrum_averaging as sav
+from Lib.averaged_spectrum_thread import AveragedSpectrumThread
+from Lib import frame_scheduler as fs
+from Lib import decoded_cache as dcc
 import pyqtgraph as pg
 import numpy as np
-from scipy.fft import rfft
 import base64
 import logging
+import time
 from ui.widgets import ResizableLineEdit
 from ui.date_time_dialog import DateTimeSelectionDialog
+from ui.spectrogram_view import SpectrogramDialog
+from ui.phasor_view import PhasorView
 
 # Configure pyqtgraph for consistent plot styling
 pg.setConfigOptions(antialias=True, background='k', foreground='w')
 
+overlay_max_records = 4  # закреплённых записей для наложения
+overlay_colors = ['#00FFFF', '#FFFF00', '#00FF00', '#FFA500']
+difference_color = '#FF00FF'
+
 class SignalsView_subwindow(QMdiSubWindow):
     timestamp_changed = pyqtSignal(int)
 
@@ -31,8 +48,29 @@ class SignalsView_subwindow(QMdiSubWindow):
         self.colnameList = []
         self.channel_boolmask = [True] * 7
         self.current_data = {}
+        self.current_signals = None  # декодированные сигналы текущей записи [отсчёты, каналы]
+        self.plotted_channels = []  # каналы, выведенные на графики для текущей записи
+        self.region = None  # участок записи для спектра (начало, конец) в секундах
+        self.region_items = [None] * 7
+        self.region_syncing = False
+        self.overlay_pins = []  # закреплённые записи: (ключ кэша декодированных записей, номер, штамп)
+        self.overlay_curves = [[] for _ in range(7)]  # кривые наложения на графиках сигнала
         self.current_freq_range = (-1, -1)
         self.show_grid = False
+        self.archive = None  # локальный архив осциллограмм, если записи читаются из него, а не из БД
+        self.archive_thread = None
+        self.playback_thread = None  # чтение кадров вперёд при воспроизведении
+        self.spectrogram_dialog = None
+        self.average_thread = None  # усреднение спектра по следующим записям
+        self.playback_fps = pbt.playback_default_fps
+        self.playback_started = 0.0
+        self.playback_last_sequence = -1
+        self.playback_shown = 0  # кадров показано с последнего обновления счётчика к/с
+        self.playback_dropped = 0
+        self.playback_stat_time = 0.0
+        self.playback_timer = QtCore.QTimer(self)
+        self.playback_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.playback_timer.timeout.connect(self.on_playback_tick)
 
         size_policy = QSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
 
@@ -55,6 +93,7 @@ class SignalsView_subwindow(QMdiSubWindow):
 
         # Initialize plot array for signal and spectrum plots
         self.plot_array = [[None, None] for _ in range(7)]
+        self.curve_array = [[None, None] for _ in range(7)] # кривые графиков, создаются один раз на график
         self.plot_row_layouts = [None] * 7
         for plot_row in range(7):
             row_layout = QHBoxLayout()
@@ -63,13 +102,30 @@ class SignalsView_subwindow(QMdiSubWindow):
             for plot_col in range(2):
                 plot = pg.PlotWidget()
                 self.plot_array[plot_row][plot_col] = plot
+                self.curve_array[plot_row][plot_col] = self.create_curve(plot, plot_row, plot_col)
                 row_layout.addWidget(plot)
             self.plot_layout.addLayout(row_layout)
 
         main_layout = QVBoxLayout()
         main_layout.addWidget(self.navi_toolbar)
         main_layout.addWidget(self.plot_params)
-        main_layout.addWidget(self.scrollArea)
+        # таблица гармоник справа от графиков, показывается кнопкой H
+        self.harmonicsTable = QTableWidget()
+        self.harmonicsTable.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.harmonicsTable.setToolTip("Гармоники текущей записи: 1-я - действующее значение, остальные - % от 1-й.\n"
+                                       "TDD - относительно тока основной гармоники этой записи")
+        self.harmonicsTable.setVisible(False)
+        self.plot_splitter = QSplitter(Qt.Orientation.Horizontal)
+        self.plot_splitter.addWidget(self.scrollArea)
+        # векторная диаграмма, показывается кнопкой φ
+        self.phasorView = PhasorView()
+        self.phasorView.setVisible(False)
+        self.plot_splitter.addWidget(self.harmonicsTable)
+        self.plot_splitter.addWidget(self.phasorView)
+        self.plot_splitter.setStretchFactor(0, 4)
+        self.plot_splitter.setStretchFactor(1, 1)
+        self.plot_splitter.setStretchFactor(2, 1)
+        main_layout.addWidget(self.plot_splitter)
 
         self.firstButton = QToolButton()
         self.firstButton.setText("<<")
@@ -110,6 +166,32 @@ class SignalsView_subwindow(QMdiSubWindow):
         self.navi_toolbar.addWidget(self.savePointsButton)
         self.savePointsButton.clicked.connect(self.save_points_to_file)
 
+        self.archiveButton = QToolButton()
+        self.archiveButton.setText("🗄")
+        self.archiveButton.setToolTip("Сохранить записи логгера в локальный архив осциллограмм")
+        self.archiveButton.setMinimumWidth(20)
+        self.archiveButton.setAutoRaise(True)
+        self.archiveButton.setEnabled(False)
+        self.navi_toolbar.addWidget(self.archiveButton)
+        self.archiveButton.clicked.connect(self.archive_current_device)
+
+        self.openArchiveButton = QToolButton()
+        self.openArchiveButton.setText("📂")
+        self.openArchiveButton.setToolTip("Открыть локальный архив осциллограмм (без подключения к БД)")
+        self.openArchiveButton.setMinimumWidth(20)
+        self.openArchiveButton.setAutoRaise(True)
+        self.navi_toolbar.addWidget(self.openArchiveButton)
+        self.openArchiveButton.clicked.connect(self.open_archive)
+
+        self.spectrogramButton = QToolButton()
+        self.spectrogramButton.setText("🌊")
+        self.spectrogramButton.setToolTip("Спектрограмма канала по записям начиная с текущей")
+        self.spectrogramButton.setMinimumWidth(20)
+        self.spectrogramButton.setAutoRaise(True)
+        self.spectrogramButton.setEnabled(False)
+        self.navi_toolbar.addWidget(self.spectrogramButton)
+        self.spectrogramButton.clicked.connect(self.show_spectrogram)
+
         self.recNumEdit = ResizableLineEdit(parent=self)
         self.recNumEdit.setText("000000")
         self.recNumEdit.setToolTip("Номер записи в таблице БД")
@@ -147,6 +229,25 @@ class SignalsView_subwindow(QMdiSubWindow):
         self.stepEdit.setMinimumWidth(70)
         self.navi_toolbar.addWidget(self.stepEdit)
 
+        self.playButton = QToolButton()
+        self.playButton.setText("▶")
+        self.playButton.setToolTip("Воспроизведение записей с шагом промотки")
+        self.playButton.setMinimumWidth(20)
+        self.playButton.setAutoRaise(True)
+        self.playButton.setEnabled(False)
+        self.navi_toolbar.addWidget(self.playButton)
+        self.playButton.clicked.connect(self.playButton_clicked)
+
+        self.fpsEdit = ResizableLineEdit(parent=self)
+        self.fpsEdit.setText(f"{pbt.playback_default_fps:g}")
+        self.fpsEdit.setToolTip("Кадров в секунду при воспроизведении")
+        self.fpsEdit.setMinimumWidth(40)
+        self.navi_toolbar.addWidget(self.fpsEdit)
+
+        self.fpsLabel = QLabel("")
+        self.fpsLabel.setToolTip("Достигнутая частота кадров и пропущенные кадры")
+        self.navi_toolbar.addWidget(self.fpsLabel)
+
         filterIco = QIcon("./icons/three-horizontal-lines-icon.png")
         self.channelsFilterEdit = ResizableLineEdit(parent=self)
         self.channelsFilterEdit.setText(" ")
@@ -243,6 +344,94 @@ class SignalsView_subwindow(QMdiSubWindow):
         self.autoScaleButtton.setText("AUTO")
         self.autoScaleButtton.setToolTip("Сбросить ограничения масштаба")
         self.plot_params.addWidget(self.autoScaleButtton)
+
+        self.plot_params.addSeparator()
+
+        self.harmonicsButton = QToolButton()
+        self.harmonicsButton.setText("H")
+        self.harmonicsButton.setToolTip("Таблица гармоник, КНИ и TDD текущей записи")
+        self.harmonicsButton.setCheckable(True)
+        self.plot_params.addWidget(self.harmonicsButton)
+        self.harmonicsButton.toggled.connect(self.on_harmonics_toggled)
+
+        self.phasorButton = QToolButton()
+        self.phasorButton.setText("φ")
+        self.phasorButton.setToolTip("Векторная диаграмма, симметричные составляющие и коэффициент мощности текущей записи")
+        self.phasorButton.setCheckable(True)
+        self.plot_params.addWidget(self.phasorButton)
+        self.phasorButton.toggled.connect(self.on_phasors_toggled)
+
+        self.regionButton = QToolButton()
+        self.regionButton.setText("ROI")
+        self.regionButton.setToolTip("Спектр выделенного участка записи (участок перетаскивается на графиках сигнала)")
+        self.regionButton.setCheckable(True)
+        self.plot_params.addWidget(self.regionButton)
+        self.regionButton.toggled.connect(self.on_region_toggled)
+
+        self.windowCombo = QComboBox()
+        self.windowCombo.addItems(list(spm.window_functions))
+        self.windowCombo.setCurrentText("Ханна")
+        self.windowCombo.setToolTip("Оконная функция для спектра участка и усреднённого спектра")
+        self.plot_params.addWidget(self.windowCombo)
+        self.windowCombo.currentTextChanged.connect(self.update_region_spectra)
+        self.windowCombo.currentTextChanged.connect(self.start_average)
+
+        self.paddingCombo = QComboBox()
+        self.paddingCombo.addItems([f"×{factor}" for factor in spm.padding_factors])
+        self.paddingCombo.setToolTip("Дополнение участка нулями: длина БПФ относительно длины участка")
+        self.plot_params.addWidget(self.paddingCombo)
+        self.paddingCombo.currentIndexChanged.connect(self.update_region_spectra)
+
+        self.avgButton = QToolButton()
+        self.avgButton.setText("Σ")
+        self.avgButton.setToolTip("Спектр, усреднённый по следующим за текущей записям")
+        self.avgButton.setCheckable(True)
+        self.plot_params.addWidget(self.avgButton)
+        self.avgButton.toggled.connect(self.on_average_toggled)
+
+        self.avgCountEdit = ResizableLineEdit(parent=self)
+        self.avgCountEdit.setText("16")
+        self.avgCountEdit.setToolTip("Сколько записей после текущей усреднять")
+        self.avgCountEdit.setMinimumWidth(40)
+        self.plot_params.addWidget(self.avgCountEdit)
+        self.avgCountEdit.editingFinished.connect(self.start_average)
+
+        self.avgModeCombo = QComboBox()
+        self.avgModeCombo.addItems(list(sav.averaging_modes))
+        self.avgModeCombo.setToolTip("Уэлч - перекрывающиеся отрезки внутри записей, линейное - по целым записям")
+        self.plot_params.addWidget(self.avgModeCombo)
+        self.avgModeCombo.currentTextChanged.connect(self.start_average)
+
+        self.plot_params.addSeparator()
+
+        self.pinButton = QToolButton()
+        self.pinButton.setText("📌")
+        self.pinButton.setToolTip("Закрепить текущую запись для наложения (повторно - открепить)")
+        self.plot_params.addWidget(self.pinButton)
+        self.pinButton.clicked.connect(self.toggle_pin)
+
+        self.overlayButton = QToolButton()
+        self.overlayButton.setText("⧉")
+        self.overlayButton.setToolTip("Наложить закреплённые записи на графики сигнала")
+        self.overlayButton.setCheckable(True)
+        self.plot_params.addWidget(self.overlayButton)
+        self.overlayButton.toggled.connect(self.update_overlays)
+
+        self.diffButton = QToolButton()
+        self.diffButton.setText("Δ")
+        self.diffButton.setToolTip("Разность текущей и первой закреплённой записи")
+        self.diffButton.setCheckable(True)
+        self.plot_params.addWidget(self.diffButton)
+        self.diffButton.toggled.connect(self.update_overlays)
+
+        self.clearPinsButton = QToolButton()
+        self.clearPinsButton.setText("✕")
+        self.clearPinsButton.setToolTip("Открепить все записи")
+        self.plot_params.addWidget(self.clearPinsButton)
+        self.clearPinsButton.clicked.connect(self.clear_pins)
+
+        # перетаскивание участка - не больше одного пересчёта спектров за кадр
+        self.region_coalescer = fs.FrameCoalescer(self.update_region_spectra, parent=self)
         self.autoScaleButtton.pressed.connect(self.autoScaleBottonPressed)
 
         self.MainWidget = QWidget()
@@ -455,7 +644,21 @@ class SignalsView_subwindow(QMdiSubWindow):
                     plot.setLabel('left', f'Channel {row + 1}' if col == 0 else 'Amplitude', color=fg_color)
                     plot.showGrid(x=True if col == 1 else False, y=True, alpha=grid_alpha)
 
-    def set_current_table_timestamp_list(self, timestamp_list):
+    def create_curve(self, plot, row: int, col: int):
+        """Создаёт постоянную кривую графика; записи подаются в неё через setData."""
+        curve = plot.plot(pen={'color': '#FF0000', 'width': 1})
+        # длинные записи: прореживание с сохранением пиков и отрисовка только видимого диапазона
+        curve.setDownsampling(auto=True, method='peak')
+        curve.setClipToView(True)
+        if col == 0:
+            plot.setTitle(f"Канал {row + 1}", color='white')
+        return curve
+
+    def set_current_table_timestamp_list(self, timestamp_list, archive=None):
+        # archive - источник записей при просмотре локального архива, None - записи из БД
+        self.stop_playback()
+        self.archive = archive
+        self.setWindowTitle(f"Просмотр сигналов - архив {archive.table_name}" if archive is not None else "Просмотр сигналов")
         self.current_current_table_timestamp_list = timestamp_list
         self.update_button_states()
         if timestamp_list:
@@ -495,7 +698,11 @@ class SignalsView_subwindow(QMdiSubWindow):
         self.leftButton.setEnabled(has_data and self.current_rec_num > 1)
         self.rightButton.setEnabled(has_data and self.current_rec_num < len(self.current_current_table_timestamp_list))
         self.lastButton.setEnabled(has_data and self.current_rec_num < len(self.current_current_table_timestamp_list))
-        self.savePointsButton.setEnabled(has_data and bool(self.current_data))
+        self.savePointsButton.setEnabled(has_data and "points" in self.current_data)
+        self.archiveButton.setEnabled(has_data and self.archive is None and self.archive_thread is None)
+        self.spectrogramButton.setEnabled(has_data and self.current_rec_num > 0)
+        self.playButton.setEnabled(self.playback_thread is not None or (has_data and self.current_rec_num > 0 and
+                                   self.current_rec_num < len(self.current_current_table_timestamp_list)))
 
     def send_timestamp_to_trends(self):
         """
@@ -533,61 +740,416 @@ class SignalsView_subwindow(QMdiSubWindow):
 
         self.set_current_rec_num(rec_num)
 
-        signals = rec.get_signals()
+        # декодированная запись берётся из кэша: возврат к записи и наложения не декодируют её заново
+        key = dcc.record_key(table_name, timestamp, self.archive)
+        signals = dcc.decoded_records.get(key)
+        if signals is None:
+            signals = rec.get_signals()
+            if len(signals):
+                signals = dcc.decoded_records.put(key, signals)
         channel_num = signals.shape[1]
+        self.current_signals = signals
 
         curr_len = len(self.plot_array)
 
+        # одно БПФ на все отображаемые каналы; оси и полоса берутся из кэша
+        channels = [i for i in range(min(channel_num, curr_len))
+                    if self.plot_array[i][0] is not None and self.check_bool_mask(i)]
+        spectra = spm.record_spectra(signals, channels, spm.sampling_rate, self.current_freq_range)
+
+        # кривые не пересоздаются: данные подменяются, графики каналов без данных очищаются
         for i in range(curr_len):
-            if self.plot_array[i][0] is not None:
-                self.plot_array[i][0].clear()
-                self.plot_array[i][1].clear()
+            if self.plot_array[i][0] is not None and i not in spectra.channels:
+                self.curve_array[i][0].setData([], [])
+                self.curve_array[i][1].setData([], [])
+
+        self.plotted_channels = spectra.channels
+        for col, i in enumerate(spectra.channels):
+            self.curve_array[i][0].setData(spectra.time, spectra.signals[:, col])
+            if not self.regionButton.isChecked() and not self.avgButton.isChecked():
+                self.curve_array[i][1].setData(spectra.frequencies, spectra.magnitudes[:, col])
+
+        self.update_region_spectra()
+        self.update_overlays()
+        # при воспроизведении усреднение, гармоники и вектора не пересчитываются на каждый кадр -
+        # их обновляет stop_playback по записи, на которой остановились
+        if self.playback_thread is None:
+            self.update_record_analysis()
+
+    def update_record_analysis(self):
+        self.start_average()
+        self.update_harmonics_table()
+        self.update_phasors()
+
+    def on_region_toggled(self, checked):
+        if checked and self.avgButton.isChecked():
+            self.avgButton.setChecked(False)  # правая колонка - либо участок, либо среднее
+        if checked and self.region is None:
+            duration = len(self.current_signals) / spm.sampling_rate if self.current_signals is not None else 0.1
+            self.region = (duration * 0.4, duration * 0.6)
+        self.sync_region_items()
+        if checked:
+            self.update_region_spectra()
+        else:
+            self.region_coalescer.cancel()
+            if self.current_data:
+                # спектры всей записи
+                self.plot_record(self.current_device, self.colnameList, self.current_data, self.current_rec_num)
 
-        for i in range(channel_num):
-            if self.plot_array[i][0] is not None:
-                if self.check_bool_mask(i):
-                    sig = signals[:, i]
-                    sampling = 25600
-                    sig = sig - sig.mean()
-                    l = len(sig)
-                    time_len = l / sampling
-                    time = np.linspace(0., time_len, l)
-
-                    self.plot_array[i][0].plot(time, sig, pen={'color': '#FF0000', 'width': 1})
-                    self.plot_array[i][0].setTitle(f"Канал {i + 1}", color='white')
-
-                    yf = rfft(sig)
-                    sl = len(yf)
-                    spectrum = np.abs(yf) / l
-                    step = (sampling / l)
-                    fr = np.arange(0, (sampling / 2) + 1, step)
-
-                    low_ind = 0
-                    hi_ind = sl
-
-                    if self.current_freq_range[0] > 0:
-                        low_ind = int((sl / (sampling / 2)) * self.current_freq_range[0])
-
-                    if self.current_freq_range[1] > 0 and self.current_freq_range[1] > self.current_freq_range[0] \
-                            and self.current_freq_range[1] < (sampling / 2):
-                        hi_ind = int((sl / (sampling / 2)) * self.current_freq_range[1])
-
-                    self.plot_array[i][1].plot(fr[low_ind:hi_ind], spectrum[low_ind:hi_ind], pen={'color': '#FF0000', 'width': 1})
-                else:
-                    self.plot_array[i][0].clear()
-                    self.plot_array[i][1].clear()
+    def sync_region_items(self):
+        """
+        Держит по одной области выделения на каждом графике сигнала, пока включён режим ROI.
+        """
+        active = self.regionButton.isChecked()
+        for i in range(len(self.plot_array)):
+            plot = self.plot_array[i][0]
+            item = self.region_items[i]
+            if not active or plot is None:
+                if item is not None and plot is not None:
+                    plot.removeItem(item)
+                self.region_items[i] = None
+                continue
+            if item is None:
+                item = pg.LinearRegionItem(values=self.region, brush=pg.mkBrush(255, 255, 0, 40))
+                item.sigRegionChanged.connect(self.on_region_changed)
+                plot.addItem(item)
+                self.region_items[i] = item
+
+    def on_region_changed(self, changed_item):
+        if self.region_syncing:
+            return
+        self.region = tuple(changed_item.getRegion())
+        # области на всех каналах двигаются вместе
+        self.region_syncing = True
+        for item in self.region_items:
+            if item is not None and item is not changed_item:
+                item.setRegion(self.region)
+        self.region_syncing = False
+        self.region_coalescer.request()
+
+    def update_region_spectra(self, *args):
+        """
+        Пересчитывает спектры выведенных каналов по выделенному участку; сигналы берутся уже декодированными.
+        """
+        if not self.regionButton.isChecked() or self.current_signals is None or self.region is None \
+                or len(self.current_signals) == 0:
+            return
+        step = spm.time_axis(len(self.current_signals), spm.sampling_rate)[1]
+        start = int(round(min(self.region) / step))
+        stop = int(round(max(self.region) / step)) + 1
+        padding = spm.padding_factors[max(0, self.paddingCombo.currentIndex())]
+        window_name = spm.window_functions[self.windowCombo.currentText()]
+        spectra = spm.region_spectra(self.current_signals, self.plotted_channels, start, stop, window_name, padding,
+                                     spm.sampling_rate, self.current_freq_range)
+        for col, i in enumerate(spectra.channels):
+            if self.curve_array[i][1] is not None:
+                self.curve_array[i][1].setData(spectra.frequencies, spectra.magnitudes[:, col])
+
+    def on_average_toggled(self, checked):
+        if checked and self.regionButton.isChecked():
+            self.regionButton.setChecked(False)
+        if checked:
+            self.start_average()
+        else:
+            self.stop_average()
+            if self.current_data:
+                # спектры всей записи
+                self.plot_record(self.current_device, self.colnameList, self.current_data, self.current_rec_num)
+
+    def start_average(self, *args):
+        """
+        Запускает усреднение спектра по записям, следующим за текущей; прежний проход отменяется.
+        """
+        self.stop_average()
+        total_rec_num = len(self.current_current_table_timestamp_list)
+        count_text = self.avgCountEdit.text()
+        count = int(count_text) if count_text.isdigit() else 0
+        if not self.avgButton.isChecked() or count < 1 or self.current_rec_num < 1 \
+                or len(self.current_device) < 3 or len(self.colnameList) < 2:
+            return
+        rec_nums = range(self.current_rec_num + 1, min(total_rec_num, self.current_rec_num + count) + 1)
+        if len(rec_nums) == 0:
+            self.parent.status_bar.showMessage("Усреднение: после текущей записи нет записей", 5000)
+            return
+
+        self.average_thread = AveragedSpectrumThread(self.current_device, self.colnameList,
+                                                     self.current_current_table_timestamp_list, rec_nums,
+                                                     sav.averaging_modes[self.avgModeCombo.currentText()],
+                                                     spm.window_functions[self.windowCombo.currentText()],
+                                                     self.current_freq_range, self.archive, parent=self)
+        self.average_thread.result_signal.connect(self.on_average_result)
+        self.average_thread.error_signal.connect(self.on_error_message)
+        self.average_thread.finished.connect(self.on_average_thread_finished)
+        self.average_thread.start()
+
+    def stop_average(self):
+        if self.average_thread is None:
+            return
+        thread = self.average_thread
+        self.average_thread = None
+        thread.cancel()  # результаты отменённого прохода отбрасываются в on_average_result
+
+    def on_average_thread_finished(self):
+        thread = self.sender()
+        if thread is self.average_thread:
+            self.average_thread = None
+        if thread is not None:
+            thread.deleteLater()
+
+    def on_average_result(self, result):
+        if self.sender() is not self.average_thread or not self.avgButton.isChecked():
+            return
+        for i in self.plotted_channels:
+            if self.curve_array[i][1] is not None and i < result.magnitudes.shape[1]:
+                self.curve_array[i][1].setData(result.frequencies, result.magnitudes[:, i])
+        self.parent.status_bar.showMessage(
+            f"Усреднённый спектр: записей - {result.records}, отрезков - {result.segments}", 5000)
+
+    def current_record_key(self):
+        if not self.current_data or "timestamp" not in self.current_data:
+            return None
+        return dcc.record_key(self.current_device, self.current_data["timestamp"], self.archive)
+
+    def toggle_pin(self):
+        """
+        Закрепляет текущую запись для наложения или открепляет, если она уже закреплена.
+        """
+        key = self.current_record_key()
+        if key is None or self.current_signals is None or len(self.current_signals) == 0:
+            return
+        for pin in self.overlay_pins:
+            if pin[0] == key:
+                self.overlay_pins.remove(pin)
+                dcc.decoded_records.unpin(key)
+                self.update_overlays()
+                return
+        if len(self.overlay_pins) >= overlay_max_records:
+            self.parent.status_bar.showMessage(f"Закреплено максимум записей: {overlay_max_records}", 5000)
+            return
+        if not dcc.decoded_records.pin(key):
+            # запись уже вытеснена из кэша - кладётся заново
+            dcc.decoded_records.put(key, self.current_signals)
+            dcc.decoded_records.pin(key)
+        self.overlay_pins.append((key, self.current_rec_num, self.current_data["timestamp"]))
+        if not self.overlayButton.isChecked() and not self.diffButton.isChecked():
+            self.overlayButton.setChecked(True)
+        else:
+            self.update_overlays()
+
+    def clear_pins(self):
+        for key, _, _ in self.overlay_pins:
+            dcc.decoded_records.unpin(key)
+        self.overlay_pins = []
+        self.update_overlays()
+
+    def update_overlays(self, *args):
+        """
+        Рисует закреплённые записи и разность с первой из них поверх сигналов текущей записи.
+        """
+        pins = [dcc.decoded_records.get(key) for key, _, _ in self.overlay_pins]
+        pins = [signals for signals in pins if signals is not None]
+        current = self.current_signals
+        series = [[] for _ in range(len(self.plot_array))]  # (время, значения, цвет) по каналам
+
+        if self.overlayButton.isChecked():
+            for n, signals in enumerate(pins):
+                time_axis = spm.time_axis(len(signals), spm.sampling_rate)
+                for i in self.plotted_channels:
+                    if i < signals.shape[1]:
+                        series[i].append((time_axis, signals[:, i], overlay_colors[n % len(overlay_colors)]))
+
+        if self.diffButton.isChecked() and pins and current is not None and len(current):
+            reference = pins[0]
+            if reference.shape == current.shape:
+                time_axis = spm.time_axis(len(current), spm.sampling_rate)
+                for i in self.plotted_channels:
+                    series[i].append((time_axis, current[:, i] - reference[:, i], difference_color))
+            else:
+                self.parent.status_bar.showMessage(
+                    "Разность: у текущей и закреплённой записи разное число отсчётов или каналов", 5000)
+
+        # кривые наложения не пересоздаются: лишние очищаются, недостающие добавляются
+        for i in range(len(self.plot_array)):
+            plot = self.plot_array[i][0]
+            if plot is None:
+                continue
+            curves = self.overlay_curves[i]
+            while len(curves) < len(series[i]):
+                curve = plot.plot()
+                curve.setDownsampling(auto=True, method='peak')
+                curve.setClipToView(True)
+                curves.append(curve)
+            for curve, (time_axis, values, color) in zip(curves, series[i]):
+                curve.setPen({'color': color, 'width': 1})
+                curve.setData(time_axis, values)
+            for curve in curves[len(series[i]):]:
+                curve.setData([], [])
+
+        pinned = ", ".join(f"№{rec_num} {str(pdb.datetime_from_timestamp(timestamp))[:-3]}"
+                           for _, rec_num, timestamp in self.overlay_pins)
+        self.pinButton.setToolTip("Закрепить текущую запись для наложения (повторно - открепить)" +
+                                  (f"\nЗакреплены: {pinned}" if pinned else ""))
+
+    def on_harmonics_toggled(self, checked):
+        self.harmonicsTable.setVisible(checked)
+        self.update_harmonics_table()
+
+    def on_phasors_toggled(self, checked):
+        self.phasorView.setVisible(checked)
+        self.update_phasors()
+
+    def update_phasors(self):
+        """
+        Обновляет векторную диаграмму по текущей записи; пока диаграмма скрыта, расчёт не выполняется.
+        """
+        if not self.phasorView.isVisible():
+            return
+        if self.current_signals is None or len(self.current_signals) == 0:
+            self.phasorView.clear()
+            return
+        self.phasorView.set_analysis(phs.compute_phasors(self.current_signals, spm.sampling_rate))
+
+    def update_harmonics_table(self):
+        """
+        Заполняет таблицу гармоник по текущей записи; пока таблица скрыта, анализ не выполняется.
+        """
+        if not self.harmonicsTable.isVisible() or self.current_signals is None or len(self.current_signals) == 0:
+            return
+        analysis = hm.analyze_harmonics(self.current_signals)
+        percent = analysis.percent()[0]
+        channels = analysis.rms.shape[2]
+        names = [pq.signal_channel_names[i] if i < len(pq.signal_channel_names) else f"Канал {i + 1}"
+                 for i in range(channels)]
+        rows = ["f1, Гц"] + [str(order) for order in analysis.orders] + ["THD, %", "TDD, %"]
+
+        table = self.harmonicsTable
+        if table.columnCount() != channels or table.rowCount() != len(rows):
+            table.clear()
+            table.setColumnCount(channels)
+            table.setRowCount(len(rows))
+            table.setVerticalHeaderLabels(rows)
+            table.setHorizontalHeaderLabels(names)
+            for row in range(len(rows)):
+                for col in range(channels):
+                    item = QTableWidgetItem()
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                    table.setItem(row, col, item)
+
+        # ячейки создаются один раз, при смене записи меняется только текст
+        for col in range(channels):
+            values = ([analysis.frequency[0], analysis.rms[0, 0, col]] + list(percent[1:, col]) +
+                      [analysis.thd[0, col], analysis.tdd[0, col]])
+            for row, value in enumerate(values):
+                table.item(row, col).setText("-" if not np.isfinite(value) else f"{value:.2f}")
 
     def select_and_plot_record(self, num):
+        self.stop_playback()  # ручная навигация прерывает воспроизведение
         rec_list_num = len(self.current_current_table_timestamp_list)
         if rec_list_num < 1 or num < 1 or num > rec_list_num:
             return
 
+        if self.archive is not None:
+            # из архива запись читается срезом отображения файла - без потока и без БД
+            self.on_next_rec_result(self.archive.record(num - 1))
+            return
+
         timestamp = self.current_current_table_timestamp_list[num - 1]
         self.read_rec_thread = rec_read_trr.ReadRecordThread(self.current_device, self.colnameList, timestamp)
         self.read_rec_thread.error_signal.connect(self.on_error_message)
         self.read_rec_thread.result_signal.connect(self.on_next_rec_result)
         self.read_rec_thread.start()
 
+    def playButton_clicked(self):
+        if self.playback_thread is not None:
+            self.stop_playback()
+        else:
+            self.start_playback()
+
+    def start_playback(self):
+        """
+        Воспроизводит записи начиная со следующей за текущей с шагом промотки и частотой кадров из fpsEdit.
+        """
+        step_text = self.stepEdit.text()
+        step = int(step_text) if step_text.isdigit() else 0
+        try:
+            fps = float(self.fpsEdit.text().replace(",", "."))
+        except ValueError:
+            fps = 0.0
+        total_rec_num = len(self.current_current_table_timestamp_list)
+
+        if total_rec_num < 1 or len(self.current_device) < 3 or len(self.colnameList) < 2 or step < 1 \
+                or self.current_rec_num >= total_rec_num:
+            return
+        if fps <= 0:
+            self.on_error_message("Частота кадров должна быть положительным числом")
+            return
+
+        self.playback_fps = min(fps, pbt.playback_max_fps)
+        self.stop_average()
+        self.playback_thread = pbt.PlaybackThread(self.current_device, self.colnameList,
+                                                  self.current_current_table_timestamp_list,
+                                                  self.current_rec_num + step, step, self.archive)
+        self.playback_thread.error_signal.connect(self.on_error_message)
+        self.playback_thread.start()
+
+        self.playback_started = None  # отсчёт времени - с первого готового кадра
+        self.playback_stat_time = time.perf_counter()
+        self.playback_last_sequence = -1
+        self.playback_shown = 0
+        self.playback_dropped = 0
+        # таймер опрашивает очередь с частотой кадров экрана, номер кадра считается по времени
+        self.playback_timer.start(fs.frame_interval_ms)
+        self.playButton.setText("⏸")
+        self.playButton.setToolTip("Остановить воспроизведение")
+        self.update_button_states()
+
+    def stop_playback(self):
+        if self.playback_thread is None:
+            return
+        self.playback_timer.stop()
+        thread = self.playback_thread
+        self.playback_thread = None
+        thread.cancel()
+        thread.wait(2000)
+        thread.deleteLater()
+        self.playButton.setText("▶")
+        self.playButton.setToolTip("Воспроизведение записей с шагом промотки")
+        self.fpsLabel.setText("")
+        self.update_button_states()
+        self.update_record_analysis()
+
+    def on_playback_tick(self):
+        thread = self.playback_thread
+        if thread is None:
+            return
+        now = time.perf_counter()
+        if self.playback_started is None:
+            if thread.frames.empty() and not thread.is_exhausted():
+                return
+            self.playback_started = now
+            self.playback_stat_time = now
+        # позиция определяется временем: кадры, которые не успели показать, пропускаются
+        sequence = int((now - self.playback_started) * self.playback_fps)
+        thread.playhead = sequence
+        frame = thread.take(sequence)
+
+        if frame is not None:
+            self.playback_dropped += frame.sequence - self.playback_last_sequence - 1
+            self.playback_last_sequence = frame.sequence
+            self.playback_shown += 1
+            self.set_current_rec_num(frame.rec_num)
+            self.plot_record(self.current_device, self.colnameList, frame.record, frame.rec_num)
+            self.timestamp_changed.emit(frame.record["timestamp"])
+
+        if now - self.playback_stat_time >= 1.0:
+            self.fpsLabel.setText(f"{self.playback_shown / (now - self.playback_stat_time):.1f} к/с, "
+                                  f"пропущено {self.playback_dropped}")
+            self.playback_stat_time = now
+            self.playback_shown = 0
+
+        if thread.is_exhausted():
+            self.stop_playback()
+
     def save_points_to_file(self):
         """
         Сохраняет данные points текущей записи в бинарный файл в папку export.
@@ -619,6 +1181,62 @@ class SignalsView_subwindow(QMdiSubWindow):
             self.on_error_message(f"Ошибка при сохранении файла: {str(e)}")
             logging.error(f"Ошибка при сохранении points в файл: {str(e)}")
 
+    def archive_current_device(self):
+        """
+        Дописывает в локальный архив записи текущего логгера, которых там ещё нет.
+        """
+        if self.archive is not None or len(self.current_device) < 3 or self.archive_thread is not None:
+            return
+        self.archive_thread = ArchiveRecordsThread(self.current_device)
+        self.archive_thread.progress_signal.connect(
+            lambda value: self.parent.status_bar.showMessage(f"Архивирование {self.current_device}: {value}%"))
+        self.archive_thread.finished_signal.connect(self.on_archive_finished)
+        self.archive_thread.error_signal.connect(self.on_error_message)
+        self.archive_thread.finished.connect(self.on_archive_thread_finished)
+        self.archive_thread.start()
+        self.update_button_states()
+
+    def on_archive_finished(self, added):
+        table_name = self.archive_thread.tablename if self.archive_thread else ""
+        path = wfa.archive_path(table_name)
+        self.parent.status_bar.showMessage(f"Архив {path}: добавлено записей - {added}", 5000)
+
+    def on_archive_thread_finished(self):
+        if self.archive_thread is not None:
+            self.archive_thread.deleteLater()
+        self.archive_thread = None
+        self.update_button_states()
+
+    def show_spectrogram(self):
+        """
+        Открывает окно спектрограммы по записям текущего логгера.
+        """
+        if self.spectrogram_dialog is None:
+            self.spectrogram_dialog = SpectrogramDialog(self, self.parent if isinstance(self.parent, QWidget) else None)
+        self.spectrogram_dialog.show()
+        self.spectrogram_dialog.raise_()
+
+    def open_archive(self):
+        """
+        Открывает локальный архив осциллограмм; навигация по записям идёт по архиву.
+        """
+        path = QFileDialog.getExistingDirectory(self, "Каталог архива осциллограмм", wfa.archive_root)
+        if not path:
+            return
+        if not wfa.is_archive(path):
+            self.on_error_message(f"В каталоге {path} нет архива осциллограмм")
+            return
+        archive = wfa.WaveformArchive(path)
+        if len(archive) == 0:
+            self.on_error_message(f"Архив {path} пуст или повреждён")
+            return
+
+        self.set_current_device(archive.table_name)
+        self.set_colname_list(archive.colnames())
+        self.set_current_table_timestamp_list(archive.timestamp_list(), archive)
+        self.select_and_plot_record(1)
+        self.parent.status_bar.showMessage(f"Открыт архив {archive.table_name}: {len(archive)} записей", 5000)
+
     def on_error_message(self, text):
         msgBox = QMessageBox()
         msgBox.setText(f"Ошибка: {text}")
@@ -743,6 +1361,9 @@ class SignalsView_subwindow(QMdiSubWindow):
                 self.plot_array[i][1].deleteLater()
                 self.plot_array[i][0] = None
                 self.plot_array[i][1] = None
+                self.curve_array[i] = [None, None]
+                self.region_items[i] = None
+                self.overlay_curves[i] = []
 
             if self.channel_boolmask[i] and self.plot_array[i][0] is None:
                 row_layout = QHBoxLayout()
@@ -757,9 +1378,11 @@ class SignalsView_subwindow(QMdiSubWindow):
                     plot.setLabel('left', f'Channel {i + 1}' if col == 0 else 'Amplitude', color='w')
                     plot.showGrid(x=True if col == 1 else False, y=True, alpha=0.3)
                     self.plot_array[i][col] = plot
+                    self.curve_array[i][col] = self.create_curve(plot, i, col)
                     row_layout.addWidget(plot)
                 self.plot_layout.addLayout(row_layout)
 
+        self.sync_region_items()
         self.plot_record(self.current_device, self.colnameList, self.current_data, self.current_rec_num)
         self.on_grid_check_changed(self.gridCheck.isChecked())
         self.on_current_scale_changed(self.currentScaleEdit.text())
@@ -843,6 +1466,19 @@ class SignalsView_subwindow(QMdiSubWindow):
         if self.parent and not self.parent._resizing:
             self.parent.tile_subwindows(resized_window=self)
 
+    def closeEvent(self, event):
+        self.stop_playback()
+        if self.average_thread is not None:
+            self.average_thread.cancel()
+            self.average_thread.wait(2000)
+        if self.archive_thread is not None:
+            # соединение из пула должно вернуться до close_connection_pool в MainWindow.closeEvent
+            self.archive_thread.cancel()
+            self.archive_thread.wait(2000)
+        if self.spectrogram_dialog is not None:
+            self.spectrogram_dialog.close()
+        super().closeEvent(event)
+
     def set_timestamp_from_trends(self, timestamp):
         if self.current_device and self.colnameList and self.current_current_table_timestamp_list:
             closest_timestamp = min(self.current_current_table_timestamp_list, key=lambda x: abs(x - timestamp))
@@ -0,0 +1,164 @@
+from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, QCheckBox, QSpinBox, QPushButton,
+                             QLabel)
+from PyQt6.QtCore import QRectF
+from Lib import spectrogram as sgm
+from Lib.spectrogram_thread import SpectrogramThread
+import pyqtgraph as pg
+import logging
+
+
+class SpectrogramDialog(QDialog):
+    """
+    Спектрограмма (водопад) одного канала по записям начиная с текущей записи окна сигналов.
+    """
+
+    def __init__(self, signals_view, parent=None):
+        super().__init__(parent)
+        self.signals_view = signals_view
+        self.setWindowTitle("Спектрограмма по записям")
+        self.setMinimumSize(800, 500)
+        self.spectrogram_thread = None
+        self.tiles = None
+        self.tile_items = []
+        self.levels = None
+        self.decibels = True
+        self.color_bar = None
+        self.colormap = pg.colormap.get('viridis')
+
+        main_layout = QVBoxLayout(self)
+        form_layout = QFormLayout()
+
+        self.channel_spin = QSpinBox()
+        self.channel_spin.setRange(1, 7)
+        form_layout.addRow("Канал:", self.channel_spin)
+
+        self.records_spin = QSpinBox()
+        self.records_spin.setRange(2, 1000000)
+        self.records_spin.setValue(1000)
+        self.records_spin.setToolTip("Сколько записей взять начиная с текущей")
+        form_layout.addRow("Записей:", self.records_spin)
+
+        self.step_spin = QSpinBox()
+        self.step_spin.setRange(1, 1000000)
+        form_layout.addRow("Шаг:", self.step_spin)
+
+        self.decibels_check = QCheckBox()
+        self.decibels_check.setChecked(True)
+        form_layout.addRow("Амплитуда в дБ:", self.decibels_check)
+        main_layout.addLayout(form_layout)
+
+        buttons_layout = QHBoxLayout()
+        self.start_button = QPushButton("Построить")
+        self.start_button.clicked.connect(self.start_spectrogram)
+        buttons_layout.addWidget(self.start_button)
+        self.stop_button = QPushButton("Остановить")
+        self.stop_button.setEnabled(False)
+        self.stop_button.clicked.connect(self.stop_spectrogram)
+        buttons_layout.addWidget(self.stop_button)
+        self.status_label = QLabel("")
+        buttons_layout.addWidget(self.status_label, 1)
+        main_layout.addLayout(buttons_layout)
+
+        self.plot = pg.PlotWidget(axisItems={'bottom': pg.DateAxisItem(orientation='bottom')})
+        self.plot.setBackground('k')
+        self.plot.setLabel('left', 'Frequency', units='Hz', color='w')
+        main_layout.addWidget(self.plot, 1)
+
+    def showEvent(self, event):
+        step_text = self.signals_view.stepEdit.text()
+        if step_text.isdigit() and int(step_text) > 0:
+            self.step_spin.setValue(int(step_text))
+        super().showEvent(event)
+
+    def clear_image(self):
+        for item in self.tile_items:
+            self.plot.removeItem(item)
+        self.tile_items = []
+        self.tiles = None
+        self.levels = None
+
+    def start_spectrogram(self):
+        view = self.signals_view
+        timestamps = view.current_current_table_timestamp_list
+        if not timestamps or view.current_rec_num < 1 or len(view.current_device) < 3 or len(view.colnameList) < 2:
+            self.status_label.setText("В окне сигналов не выбрана запись")
+            return
+
+        self.stop_spectrogram()
+        self.clear_image()
+        step = self.step_spin.value()
+        last = min(len(timestamps), view.current_rec_num + (self.records_spin.value() - 1) * step)
+        rec_nums = range(view.current_rec_num, last + 1, step)
+
+        self.decibels = self.decibels_check.isChecked()
+        self.spectrogram_thread = SpectrogramThread(view.current_device, view.colnameList, timestamps, rec_nums,
+                                                    self.channel_spin.value() - 1, view.current_freq_range,
+                                                    self.decibels, view.archive)
+        self.spectrogram_thread.block_signal.connect(self.on_block)
+        self.spectrogram_thread.progress_signal.connect(self.on_progress)
+        self.spectrogram_thread.finished_signal.connect(self.on_finished)
+        self.spectrogram_thread.error_signal.connect(self.on_error)
+        self.spectrogram_thread.finished.connect(self.on_thread_finished)
+        self.spectrogram_thread.start()
+
+        self.status_label.setText(f"Построение: {len(rec_nums)} записей...")
+        self.start_button.setEnabled(False)
+        self.stop_button.setEnabled(True)
+
+    def stop_spectrogram(self):
+        if self.spectrogram_thread is not None and self.spectrogram_thread.isRunning():
+            self.spectrogram_thread.cancel()
+            self.status_label.setText("Остановлено")
+
+    def on_block(self, block):
+        if self.tiles is None:
+            self.tiles = sgm.WaterfallTiles(block.rows.shape[1])
+            self.levels = sgm.default_levels(block.rows, self.decibels)
+        frequencies = block.frequencies
+        bin_width = frequencies[1] - frequencies[0] if len(frequencies) > 1 else 1.0
+
+        # перерисовываются только плитки, в которые попали новые строки
+        for index in self.tiles.append(block.timestamps, block.rows):
+            if index == len(self.tile_items):
+                item = pg.ImageItem(axisOrder='row-major')
+                item.setColorMap(self.colormap)
+                self.plot.addItem(item)
+                self.tile_items.append(item)
+                if self.color_bar is None:
+                    self.color_bar = pg.ColorBarItem(values=self.levels, colorMap=self.colormap, interactive=False)
+                    self.color_bar.setImageItem(item, insert_in=self.plot.getPlotItem())
+                elif index == 0:
+                    self.color_bar.setImageItem(item)
+                    self.color_bar.setLevels(self.levels)
+            tile = self.tiles.tiles[index]
+            # строки плитки - записи, столбцы - частоты; по горизонтали время, по вертикали частота
+            self.tile_items[index].setImage(tile.image().T, autoLevels=False, levels=self.levels)
+            begin, duration = tile.time_span(self.tiles.tile_period())
+            self.tile_items[index].setRect(QRectF(begin, frequencies[0], duration, bin_width * len(frequencies)))
+
+    def on_progress(self, value: int):
+        count = len(self.tiles) if self.tiles is not None else 0
+        self.status_label.setText(f"Построение: {value}%, записей: {count}")
+
+    def on_finished(self, total: int):
+        tiles = len(self.tile_items)
+        self.status_label.setText(f"Готово: {total} записей, плиток изображения: {tiles}")
+
+    def on_error(self, error_msg: str):
+        logging.error(error_msg)
+        self.status_label.setText(error_msg)
+
+    def on_thread_finished(self):
+        self.start_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+        thread = self.sender()
+        if thread is self.spectrogram_thread:
+            self.spectrogram_thread = None
+        if thread is not None:
+            thread.deleteLater()
+
+    def closeEvent(self, event):
+        if self.spectrogram_thread is not None and self.spectrogram_thread.isRunning():
+            self.spectrogram_thread.cancel()
+            self.spectrogram_thread.wait(2000)
+        super().closeEvent(event)
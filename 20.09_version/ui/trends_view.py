@@ -1,23 +1,29 @@
-from PyQt6.QtWidgets import QMdiSubWindow, QWidget, QHBoxLayout, QVBoxLayout, QFrame, QToolButton, QProgressBar, QLabel, QApplication, QSizePolicy
+from PyQt6.QtWidgets import QMdiSubWindow, QWidget, QHBoxLayout, QVBoxLayout, QFrame, QToolButton, QProgressBar, QLabel, QApplication, QSizePolicy, QListWidget, QListWidgetItem, QTableWidget, QTableWidgetItem, QHeaderView, QLineEdit, QComboBox
 from PyQt6.QtCore import Qt, QThread, pyqtSignal, QSize
 from PyQt6.QtGui import QIcon, QCursor, QPalette, QColor
 import pyqtgraph as pg
-import pandas as pd
 import numpy as np
 from Lib import pipestreamdbread as pdb
+from Lib import frame_scheduler as fs
+from Lib import trend_store as ts
+from Lib import cancellation as cnl
+from Lib import window_stats as wst
+from Lib import event_detection as evd
+from Lib import power_quality as pq
+from Lib.pq_trends_thread import PQTrendsThread
+from Lib import rms_recompute as rrc
+from Lib import process_pool as ppl
+from Lib import trend_cache as tch
 import logging
 from datetime import datetime
 import warnings
 import os
+import time
 
 
 pg.setConfigOptions(antialias=True, background='k', foreground='w')
 warnings.filterwarnings("ignore", category=UserWarning, module="pyqtgraph")
 
-# Константы для преобразования ADC
-ADC_full_scale_V = 0.93
-ADC_raw_max = (1 << 21)
-
 class CustomInfiniteLine(pg.InfiniteLine):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -40,32 +46,181 @@ class CustomInfiniteLine(pg.InfiniteLine):
         elif ev.isExit():
             QApplication.restoreOverrideCursor()
 
+trend_block_size = 20000  # записей в одном блоке прогрессивной загрузки
+overlay_max_loaders = pdb.pool_max_connections // 2  # остальные соединения - основной загрузке, ПКЭ, архиву, скану
+trend_gap_seconds = 900  # разрыв между записями, после которого кривая прерывается
+trend_curve_points = 100000  # записей в одной кривой: новый блок заново подаёт в график не больше куска
+
+# Цвета кривых наложенных устройств (основное устройство - красное)
+overlay_colors = ['#00BFFF', '#FFD700', '#7CFC00', '#FF69B4', '#FFA500', '#BA55D3', '#40E0D0', '#F5F5F5']
+
+def records_to_trend_block(records, mult_dict):
+    # Преобразует строки (timestamp, add_data_0..5) в блок TrendStore, упорядоченный по времени
+    columns = list(zip(*records))
+    timestamps = np.array([np.nan if t is None else t for t in columns[0]], dtype=np.float64)
+    valid = ~np.isnan(timestamps)
+
+    data = {}
+    for j, col in enumerate(ts.trend_channel_names):
+        if j < 3:
+            values = pdb.adc_to_physical(columns[j + 1], mult_dict["VoltMult"], mult_dict["VoltDiv"])
+        else:
+            values = pdb.adc_to_physical(columns[j + 1], mult_dict["CurrMult"], mult_dict["CurrDiv"])
+        data[col] = values[valid]
+
+    timestamps = timestamps[valid].astype(np.int64)
+    order = np.argsort(timestamps, kind="stable")
+    return ts.TrendStore.from_arrays(timestamps[order], {col: v[order] for col, v in data.items()})
+
+class CurvePiece:
+    # Кусок участка между разрывами: записи [start, stop) хранилища и его кривые {канал: кривая}
+    def __init__(self, start, stop):
+        self.start = start
+        self.stop = stop
+        self.curves = None
+
+class TrendCurves:
+    """
+    Кривые трендов одного устройства. Участки между разрывами делятся на куски не длиннее
+    trend_curve_points, у каждого куска своя кривая на канал; соседние куски участка перекрываются
+    на одну запись, поэтому линия не рвётся. Новый блок перестраивает только куски на том краю
+    хранилища, куда он лёг (в начало при загрузке от новых к старым, в конец при дочитывании),
+    остальные кривые заново данные не получают.
+    """
+
+    def __init__(self, plot_widgets: dict, pen: dict):
+        self.plot_widgets = plot_widgets
+        self.pen = pen
+        self.pieces = []   # по возрастанию времени
+        self.spare = []    # кривые снятых кусков, переиспользуются новыми
+        self.retired = []  # куски, снятые после последнего refresh
+
+    @staticmethod
+    def is_gap(timestamps, idx) -> bool:
+        return idx > 0 and timestamps[idx] - timestamps[idx - 1] > trend_gap_seconds * 1000
+
+    @staticmethod
+    def split(timestamps, lo, hi, from_end=False) -> list:
+        # Куски записей [lo, hi) по разрывам и длине; неполный кусок участка - со стороны,
+        # противоположной from_end, чтобы следующий блок с той же стороны его достроил
+        gaps = lo + 1 + np.flatnonzero(np.diff(timestamps[lo:hi]) > trend_gap_seconds * 1000)
+        bounds = [lo] + gaps.tolist() + [hi]
+        pieces = []
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            segment = []
+            while True:
+                if from_end:
+                    begin, end = max(b - trend_curve_points, a), b
+                else:
+                    begin, end = a, min(a + trend_curve_points, b)
+                segment.append(CurvePiece(begin, end))
+                if (begin <= a) if from_end else (end >= b):
+                    break
+                if from_end:
+                    b = begin + 1
+                else:
+                    a = end - 1
+            pieces.extend(reversed(segment) if from_end else segment)
+        return pieces
+
+    def retire(self, piece: CurvePiece) -> CurvePiece:
+        self.retired.append(piece)
+        return piece
+
+    def insert(self, store, start, stop):
+        # Учитывает блок [start, stop), только что добавленный в хранилище через insert_block
+        timestamps = store.timestamps
+        if not self.pieces:
+            self.pieces = self.split(timestamps, 0, len(store))
+        elif start == 0 and stop < len(store):
+            # блок в начале: прежние куски сдвигаются, первый достраивается вместе с блоком
+            for piece in self.pieces:
+                piece.start += stop
+                piece.stop += stop
+            hi = stop if self.is_gap(timestamps, stop) else self.retire(self.pieces.pop(0)).stop
+            self.pieces[0:0] = self.split(timestamps, 0, hi, from_end=True)
+        else:
+            lo = start if self.is_gap(timestamps, start) else self.retire(self.pieces.pop()).start
+            self.pieces.extend(self.split(timestamps, lo, stop))
+
+    def refresh(self, store, columns: list):
+        # Подаёт данные в кривые новых кусков; кривые снятых кусков переходят к ним или очищаются
+        self.spare.extend(piece.curves for piece in self.retired if piece.curves is not None)
+        self.retired = []
+        for piece in self.pieces:
+            if piece.curves is not None:
+                continue
+            piece.curves = self.spare.pop() if self.spare else {col: self.new_curve(col) for col in columns}
+            time_labels = store.time_seconds(piece.start, piece.stop)
+            for col, curve in piece.curves.items():
+                values = store.column(col)[piece.start:piece.stop]
+                if len(values) < 2 or np.all(np.isnan(values)):
+                    curve.setData([], [])
+                else:
+                    curve.setData(time_labels, values)
+        for curves in self.spare:
+            for curve in curves.values():
+                curve.setData([], [])
+
+    def new_curve(self, col):
+        curve = self.plot_widgets[col].plot(pen=self.pen, connect='finite')
+        curve.setDownsampling(auto=True, method='peak')
+        curve.setClipToView(True)
+        return curve
+
+    def clear(self):
+        # убирает все кривые с графиков
+        for curves in [piece.curves for piece in self.pieces + self.retired] + self.spare:
+            for col, curve in (curves or {}).items():
+                self.plot_widgets[col].removeItem(curve)
+        self.pieces = []
+        self.spare = []
+        self.retired = []
+
 class DataLoaderThread(QThread):
-    data_processed = pyqtSignal(pd.DataFrame)
+    block_loaded = pyqtSignal(object)  # TrendStore с очередным блоком
+    loading_finished = pyqtSignal(int)  # всего загружено записей
     error_occurred = pyqtSignal(str)
     progress_updated = pyqtSignal(int)
 
-    def __init__(self, table_name, parent=None):
+    def __init__(self, table_name, newest_first=True, block_size=trend_block_size, use_cache=True, parent=None):
         super().__init__(parent)
         self.table_name = table_name
+        self.newest_first = newest_first
+        self.block_size = block_size
+        self.use_cache = use_cache
+        self.cancel_token = cnl.CancellationToken()
+
+    def cancel(self):
+        # Вызывается из потока интерфейса: поток завершится после текущего блока,
+        # а выполняющийся запрос будет прерван на сервере
+        self.cancel_token.cancel()
 
     def run(self):
+        connection = None
         try:
-            connection, cursor, status = pdb.connect_db(pdb.db_connection_params)
+            connection, cursor, status = pdb.connect_pooled(self.cancel_token)
             if connection == 0 or cursor == 0:
+                connection = None
+                self.cancel_token.raise_if_cancelled()
                 self.error_occurred.emit(f"Ошибка подключения к БД: {status}")
                 return
 
+            self.cancel_token.bind_connection(connection)
+            self.cancel_token.raise_if_cancelled()
+
             # Проверка наличия столбцов
             colnames_list = pdb.get_column_names(cursor, self.table_name)
             rms_colnames = ["timestamp", "add_data_0", "add_data_1", "add_data_2", "add_data_3", "add_data_4", "add_data_5"]
             multypliers_colnames = ["cfg_voltage_multiplier", "cfg_voltage_divider", "cfg_current_multiplier", "cfg_current_divider"]
             required_columns = rms_colnames + multypliers_colnames
 
-            if not all(col in colnames_list for col in required_columns):
+            if not all(col in colnames_list for col in required_columns) or not pdb.has_valid_add_data(cursor, self.table_name):
+                # add_data_* нет или не заполнены - СКЗ пересчитываются по осциллограммам
+                if all(col in colnames_list for col in rrc.rms_source_columns):
+                    self.recompute_from_points(connection, cursor)
+                    return
                 self.error_occurred.emit(f"Ошибка: Таблица {self.table_name} не содержит всех необходимых столбцов")
-                cursor.close()
-                connection.close()
                 return
 
             # Получение множителей
@@ -75,73 +230,154 @@ class DataLoaderThread(QThread):
             last_ans = cursor.fetchone()
             if not last_ans:
                 self.error_occurred.emit("Не удалось получить множители из таблицы")
-                cursor.close()
-                connection.close()
                 return
             mult_dict = dict(zip(multypliers_names, last_ans))
 
             # Проверка валидности множителей
             if any(v is None or v == 0 for v in [mult_dict["VoltDiv"], mult_dict["CurrDiv"]]):
                 self.error_occurred.emit("Ошибка: Множители содержат None или нули")
-                cursor.close()
-                connection.close()
                 return
 
-            # Загрузка всех данных
-            query = f"SELECT {', '.join(rms_colnames)} FROM {self.table_name} ORDER BY timestamp ASC"
-            cursor.execute(query)
-            records = cursor.fetchall()
-            if not records:
+            total_records = pdb.get_table_row_num(cursor, self.table_name)
+            if total_records == 0:
                 self.error_occurred.emit(f"Нет данных в таблице {self.table_name}")
-                cursor.close()
-                connection.close()
                 return
 
-            total_records = len(records)
-            val_names = ["timestamp", "U_A_rms", "U_B_rms", "U_C_rms", "I_A_rms", "I_B_rms", "I_C_rms"]
-            data_dict = dict(zip(val_names, zip(*records)))
-
-            def get_voltage(adc_rms):
-                if adc_rms is None:
-                    return np.nan
-                try:
-                    return round(((mult_dict["VoltMult"] / mult_dict["VoltDiv"]) / (ADC_raw_max / ADC_full_scale_V)) * (adc_rms >> 2), 2)
-                except (TypeError, ZeroDivisionError):
-                    return np.nan
-
-            def get_ampertage(adc_rms):
-                if adc_rms is None:
-                    return np.nan
-                try:
-                    return round(((mult_dict["CurrMult"] / mult_dict["CurrDiv"]) / (ADC_raw_max / ADC_full_scale_V)) * (adc_rms >> 2), 2)
-                except (TypeError, ZeroDivisionError):
-                    return np.nan
-
-            # Преобразование данных
-            data_list = []
-            for i in range(total_records):
-                row = {
-                    'timestamp': data_dict['timestamp'][i],
-                    'U_A_rms': get_voltage(data_dict['U_A_rms'][i]),
-                    'U_B_rms': get_voltage(data_dict['U_B_rms'][i]),
-                    'U_C_rms': get_voltage(data_dict['U_C_rms'][i]),
-                    'I_A_rms': get_ampertage(data_dict['I_A_rms'][i]),
-                    'I_B_rms': get_ampertage(data_dict['I_B_rms'][i]),
-                    'I_C_rms': get_ampertage(data_dict['I_C_rms'][i])
-                }
-                data_list.append(row)
-
-                if (i + 1) % 100 == 0 or (i + 1) == total_records:
-                    progress = int((i + 1) / total_records * 100)
-                    self.progress_updated.emit(progress)
-
-            df = pd.DataFrame(data_list)
-            self.data_processed.emit(df)
-            cursor.close()
-            connection.close()
+            # Тренды из кэша на диске отрисовываются сразу, из БД читаются только более новые записи
+            cache = tch.TrendCache(self.table_name, "add_data", last_ans) if self.use_cache else None
+            cached = self.load_cached(cache, cursor)
+
+            # Загрузка блоками через серверный курсор: первый блок отрисовывается,
+            # пока остальные ещё читаются из БД
+            query, params = self.block_query(rms_colnames, cache if cached else None)
+            block_cursor = connection.cursor(name=f"trends_{self.table_name}")
+            block_cursor.itersize = self.block_size
+            block_cursor.execute(query, params)
+
+            blocks = []
+            collect = self.should_collect(cache, total_records)
+            loaded = cached
+            rows = 0
+            while True:
+                self.cancel_token.raise_if_cancelled()
+                records = block_cursor.fetchmany(self.block_size)
+                if not records:
+                    break
+                rows += len(records)
+                block = records_to_trend_block(records, mult_dict)
+                loaded += len(block)
+                if collect:
+                    blocks.append(block)
+                self.block_loaded.emit(block)
+                self.progress_updated.emit(min(100, int((cache.rows if cached else 0) + rows) * 100 // total_records))
+
+            block_cursor.close()
+            self.loading_finished.emit(loaded)
+            if collect:
+                # записи без штампа времени не попадают ни в тренды, ни в проверку кэша
+                self.store_cache(cache, blocks, loaded - cached, bool(cached))
 
         except Exception as e:
-            self.error_occurred.emit(f"Ошибка при загрузке и обработке данных: {str(e)}")
+            if self.cancel_token.is_cancelled():
+                # отмена (в том числе QueryCanceledError от прерванного запроса) - не ошибка
+                logging.info(f"Загрузка трендов {self.table_name} отменена")
+            else:
+                self.error_occurred.emit(f"Ошибка при загрузке и обработке данных: {str(e)}")
+
+        finally:
+            # соединение возвращается в пул при любом исходе, в том числе после отмены
+            if connection:
+                self.cancel_token.release_connection(connection)
+                pdb.release_pooled(connection)
+
+    def load_cached(self, cache, cursor) -> int:
+        # Отдаёт тренды из кэша одним блоком; возвращает число записей (0 - кэша нет)
+        if cache is None:
+            return 0
+        start_time = time.perf_counter()
+        block = cache.load()
+        if block is None:
+            return 0
+        if not cache.matches_database(cursor):
+            logging.info(f"Кэш трендов {self.table_name}: данные в БД изменились, загрузка целиком")
+            cache.invalidate()
+            return 0
+        self.block_loaded.emit(block)
+        logging.info(f"Тренды {self.table_name}: {len(block)} записей из кэша "
+                     f"за {time.perf_counter() - start_time:.2f} с")
+        return len(block)
+
+    def block_query(self, colnames, cache) -> tuple:
+        # при наличии кэша - только записи новее закэшированных, по возрастанию времени
+        if cache is not None:
+            return (f"SELECT {', '.join(colnames)} FROM {self.table_name} "
+                    f"WHERE timestamp > %s ORDER BY timestamp ASC", (cache.last_timestamp,))
+        order = "DESC" if self.newest_first else "ASC"
+        return f"SELECT {', '.join(colnames)} FROM {self.table_name} ORDER BY timestamp {order}", None
+
+    def should_collect(self, cache, total_records) -> bool:
+        # блоки копятся для записи в кэш, только если таблица укладывается в его предел
+        return cache is not None and cache.nbytes_for(total_records) <= tch.cache_max_bytes
+
+    def store_cache(self, cache, blocks, rows, incremental):
+        # ошибка записи кэша не должна мешать работе с уже загруженными трендами
+        try:
+            timestamps, columns = tch.join_blocks(blocks)
+            if incremental:
+                cache.append(timestamps, columns, rows)
+            else:
+                cache.save(timestamps, columns, rows)
+        except Exception as e:
+            logging.warning(f"Кэш трендов {self.table_name} не сохранён: {e}")
+            cache.invalidate()
+
+    def recompute_from_points(self, connection, cursor):
+        # Пересчёт СКЗ в пуле процессов; исключения обрабатываются в run()
+        total_records = pdb.get_table_row_num(cursor, self.table_name)
+        if total_records == 0:
+            self.error_occurred.emit(f"Нет данных в таблице {self.table_name}")
+            return
+        logging.info(f"Тренды {self.table_name}: add_data не заполнены, пересчёт СКЗ по осциллограммам")
+        start_time = time.perf_counter()
+
+        # множители у каждой записи свои и учтены в закэшированных СКЗ
+        cache = tch.TrendCache(self.table_name, "points") if self.use_cache else None
+        cached = self.load_cached(cache, cursor)
+
+        recomputer = rrc.RMSRecomputer(ppl.get_process_pool(), 2 * ppl.process_workers)
+        query, params = self.block_query(rrc.rms_source_columns, cache if cached else None)
+        block_cursor = connection.cursor(name=f"trends_points_{self.table_name}")
+        block_cursor.itersize = rrc.rms_chunk_size
+        block_cursor.execute(query, params)
+
+        blocks = []
+        collect = self.should_collect(cache, total_records)
+        loaded = cached
+        read = 0
+        try:
+            while True:
+                self.cancel_token.raise_if_cancelled()
+                rows = block_cursor.fetchmany(rrc.rms_chunk_size)
+                if rows:
+                    read += len(rows)
+                    recomputer.submit(rows)
+                for block in recomputer.ready_blocks(flush=not rows):
+                    self.cancel_token.raise_if_cancelled()
+                    loaded += len(block)
+                    if collect:
+                        blocks.append(block)
+                    self.block_loaded.emit(block)
+                    self.progress_updated.emit(min(100, int((cache.rows if cached else 0) + read) * 100 // total_records))
+                if not rows:
+                    break
+        finally:
+            recomputer.cancel()
+
+        block_cursor.close()
+        logging.info(f"Пересчёт СКЗ {self.table_name}: {loaded - cached} записей за {time.perf_counter() - start_time:.2f} с")
+        self.loading_finished.emit(loaded)
+        if collect:
+            self.store_cache(cache, blocks, read, bool(cached))
 
 class TrendsSubwindow(QMdiSubWindow):
     def __init__(self, parent=None):
@@ -195,6 +431,12 @@ class TrendsSubwindow(QMdiSubWindow):
         self.send_timestamp_button.clicked.connect(self.send_timestamp_to_signals)
         self.navigation_layout.addWidget(self.send_timestamp_button)
 
+        self.export_button = QToolButton()
+        self.export_button.setText("💾")
+        self.export_button.setToolTip("Сохранить видимый диапазон трендов в CSV")
+        self.export_button.clicked.connect(self.export_visible_range)
+        self.navigation_layout.addWidget(self.export_button)
+
         self.lock_cursor_button = QToolButton()
         self.lock_cursor_button.setIcon(QIcon("./icons/lock_cursor_active.png"))
         self.lock_cursor_button.setIconSize(QSize(20, 20))
@@ -203,6 +445,50 @@ class TrendsSubwindow(QMdiSubWindow):
         self.lock_cursor_button.clicked.connect(self.toggle_lock_cursor_mode)
         self.navigation_layout.addWidget(self.lock_cursor_button)
 
+        self.overlay_button = QToolButton()
+        self.overlay_button.setText("⧉")
+        self.overlay_button.setToolTip("Наложение трендов нескольких устройств")
+        self.overlay_button.setCheckable(True)
+        self.overlay_button.clicked.connect(self.toggle_overlay_mode)
+        self.navigation_layout.addWidget(self.overlay_button)
+
+        self.stats_button = QToolButton()
+        self.stats_button.setText("Σ")
+        self.stats_button.setToolTip("Статистика каналов по видимому диапазону")
+        self.stats_button.setCheckable(True)
+        self.stats_button.clicked.connect(self.toggle_stats_panel)
+        self.navigation_layout.addWidget(self.stats_button)
+
+        self.stats_region_button = QToolButton()
+        self.stats_region_button.setText("⟷")
+        self.stats_region_button.setToolTip("Статистика по выделенной области вместо видимого диапазона")
+        self.stats_region_button.setCheckable(True)
+        self.stats_region_button.setEnabled(False)
+        self.stats_region_button.clicked.connect(self.toggle_stats_region)
+        self.navigation_layout.addWidget(self.stats_region_button)
+
+        self.events_button = QToolButton()
+        self.events_button.setText("⚡")
+        self.events_button.setToolTip("Поиск провалов, перенапряжений и прерываний")
+        self.events_button.setCheckable(True)
+        self.events_button.clicked.connect(self.toggle_events_panel)
+        self.navigation_layout.addWidget(self.events_button)
+
+        self.pq_button = QToolButton()
+        self.pq_button.setText("PQ")
+        self.pq_button.setToolTip("Показатели качества по отсчётам: гармоники, КНИ, мощности, несимметрия")
+        self.pq_button.setCheckable(True)
+        self.pq_button.clicked.connect(self.toggle_pq_mode)
+        self.navigation_layout.addWidget(self.pq_button)
+
+        self.pq_combo = QComboBox()
+        self.pq_combo.addItems(pq.pq_channel_names)
+        self.pq_combo.setCurrentText("THD_U_A")
+        self.pq_combo.setToolTip("Показатель на дополнительном графике")
+        self.pq_combo.setVisible(False)
+        self.pq_combo.currentTextChanged.connect(self.on_pq_column_changed)
+        self.navigation_layout.addWidget(self.pq_combo)
+
         # Контейнер для даты/времени
         self.datetime_container = QWidget()
         self.datetime_layout = QHBoxLayout()
@@ -285,6 +571,75 @@ class TrendsSubwindow(QMdiSubWindow):
         self.i_c_label.setMinimumWidth(80)
         self.current_layout.addWidget(self.i_c_label)
 
+        # Список устройств для наложения (виден в режиме наложения)
+        self.overlay_list = QListWidget()
+        self.overlay_list.setMaximumHeight(100)
+        self.overlay_list.setToolTip("Отметьте устройства для наложения; данные загружаются параллельно и кэшируются")
+        self.overlay_list.setVisible(False)
+        self.overlay_list.itemChanged.connect(self.on_overlay_item_changed)
+        self.main_layout.addWidget(self.overlay_list)
+
+        # Панель статистики (видимый диапазон или выделенная область)
+        self.stats_headers = ["N", "Среднее", "Мин", "Макс", "СКЗ"]
+        self.stats_table = QTableWidget(6, len(self.stats_headers))
+        self.stats_table.setHorizontalHeaderLabels(self.stats_headers)
+        self.stats_table.setVerticalHeaderLabels(['U_A_rms', 'U_B_rms', 'U_C_rms', 'I_A_rms', 'I_B_rms', 'I_C_rms'])
+        self.stats_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        self.stats_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.stats_table.setMaximumHeight(210)
+        self.stats_table.setVisible(False)
+        self.main_layout.addWidget(self.stats_table)
+
+        # Панель событий: уставки, переход к предыдущему/следующему и список интервалов
+        self.events_container = QWidget()
+        self.events_layout = QHBoxLayout()
+        self.events_container.setLayout(self.events_layout)
+        self.events_layout.setContentsMargins(0, 0, 0, 0)
+        self.events_layout.setSpacing(5)
+        self.events_container.setVisible(False)
+        self.main_layout.addWidget(self.events_container)
+
+        self.events_controls = QWidget()
+        self.events_controls_layout = QVBoxLayout()
+        self.events_controls.setLayout(self.events_controls_layout)
+        self.events_controls_layout.setContentsMargins(0, 0, 0, 0)
+        self.events_layout.addWidget(self.events_controls)
+
+        self.nominal_voltage_edit = QLineEdit(str(evd.EventThresholds.nominal_voltage))
+        self.nominal_voltage_edit.setMaximumWidth(80)
+        self.nominal_voltage_edit.setToolTip("Номинальное напряжение, В (провал < 90%, перенапряжение > 110%, прерывание < 10%)")
+        self.nominal_voltage_edit.editingFinished.connect(self.detect_events)
+        self.events_controls_layout.addWidget(self.nominal_voltage_edit)
+
+        self.current_limit_edit = QLineEdit("0")
+        self.current_limit_edit.setMaximumWidth(80)
+        self.current_limit_edit.setToolTip("Уставка превышения тока, А (0 - не искать)")
+        self.current_limit_edit.editingFinished.connect(self.detect_events)
+        self.events_controls_layout.addWidget(self.current_limit_edit)
+
+        self.events_nav_container = QWidget()
+        self.events_nav_layout = QHBoxLayout()
+        self.events_nav_container.setLayout(self.events_nav_layout)
+        self.events_nav_layout.setContentsMargins(0, 0, 0, 0)
+        self.events_controls_layout.addWidget(self.events_nav_container)
+
+        self.prev_event_button = QToolButton()
+        self.prev_event_button.setText("◀")
+        self.prev_event_button.setToolTip("Предыдущее событие относительно курсора")
+        self.prev_event_button.clicked.connect(self.jump_to_prev_event)
+        self.events_nav_layout.addWidget(self.prev_event_button)
+
+        self.next_event_button = QToolButton()
+        self.next_event_button.setText("▶")
+        self.next_event_button.setToolTip("Следующее событие относительно курсора")
+        self.next_event_button.clicked.connect(self.jump_to_next_event)
+        self.events_nav_layout.addWidget(self.next_event_button)
+
+        self.events_list = QListWidget()
+        self.events_list.setMaximumHeight(120)
+        self.events_list.currentRowChanged.connect(self.jump_to_event)
+        self.events_layout.addWidget(self.events_list)
+
         # Панель с графиками
         self.plot_widget = QWidget()
         self.plot_layout = QVBoxLayout()
@@ -296,6 +651,7 @@ class TrendsSubwindow(QMdiSubWindow):
         self.cursors = {}
         self.columns = ['U_A_rms', 'U_B_rms', 'U_C_rms', 'I_A_rms', 'I_B_rms', 'I_C_rms']
         self.plot_items = {col: [] for col in self.columns}
+        self.trend_curves = TrendCurves(self.plot_widgets, {'color': '#FF0000', 'width': 1})
 
         for i, col in enumerate(self.columns):
             plot_widget = pg.PlotWidget()
@@ -327,21 +683,67 @@ class TrendsSubwindow(QMdiSubWindow):
             self.cursors[col] = cursor
             cursor.sigPositionChanged.connect(self.make_cursor_sync_function(col))
 
+        # Дополнительный график производного показателя (режим PQ)
+        self.pq_plot = pg.PlotWidget()
+        self.pq_plot.setBackground('k')
+        self.pq_plot.getAxis('left').setTextPen('w')
+        self.pq_plot.showGrid(x=True, y=True, alpha=0.3)
+        self.pq_plot.setMouseEnabled(x=True, y=False)
+        self.pq_plot.setAxisItems({'bottom': pg.DateAxisItem(orientation='bottom')})
+        self.pq_plot.getViewBox().setXLink(self.view_boxes[self.columns[0]])
+        self.pq_curve = pg.PlotDataItem(pen=pg.mkPen(color='#FFD700', width=1), connect="finite")
+        self.pq_plot.addItem(self.pq_curve)
+        self.pq_plot.setVisible(False)
+        self.plot_layout.addWidget(self.pq_plot)
+
+        # События курсоров и диапазона склеиваются в одно обновление за кадр
+        self.cursor_coalescer = fs.FrameCoalescer(self.apply_cursor_position, parent=self)
+
+        # Области выделения для статистики (по одной на график, синхронные)
+        self.stats_regions = {}
+        for col in self.columns:
+            region = pg.LinearRegionItem(values=[0, 1], movable=True, brush=QColor(0, 160, 255, 50))
+            region.setZValue(5)
+            region.sigRegionChanged.connect(self.make_region_sync_function(col))
+            self.stats_regions[col] = region
+        self.stats_mode = False
+        self.stats_region_mode = False
+        self.window_stats = None
+        self.stats_coalescer = fs.FrameCoalescer(self.update_stats_panel, parent=self)
+        self.events_mode = False
+        self.event_index = None
+        self.pq_mode = False
+        self.pq_store = ts.TrendStore(pq.pq_channel_names)
+        self.pq_loader = None
+        self.pq_device = None
+        self.pq_coalescer = fs.FrameCoalescer(self.update_pq_plot, parent=self)
+        # кривые перестраиваются по всему хранилищу не чаще раза за кадр, а не на каждый блок
+        self.dirty_curves = set()  # None - основное устройство, иначе имя наложенного
+        self.curves_coalescer = fs.FrameCoalescer(self.refresh_trend_curves, parent=self)
+        self.view_boxes['U_A_rms'].sigXRangeChanged.connect(self.on_stats_range_changed)
+
         # Подключаем сигнал изменения диапазона для фиксации курсора
         self.lock_cursor_mode = False
         self.view_boxes['U_A_rms'].sigRangeChanged.connect(self.update_cursor_on_range_change)
 
         # Данные
-        self.all_data = pd.DataFrame()
-        self.time_labels = []
-        self.valid_data_indices = []
-        self.all_time_labels = []
-        self.all_valid_indices = []
+        self.trend_store = ts.TrendStore()
+        self.auto_x_range = None
         self.current_device = None
         self.data_loader = None
+        self.retired_loaders = []  # отменённые загрузчики, ещё не завершившие run()
         self.pending_timestamps = []
         self.is_loading = False
 
+        # Наложение устройств: кэш загруженных данных, активные загрузки и кривые
+        self.overlay_mode = False
+        self.overlay_cache = {}       # устройство -> TrendStore (загружено полностью)
+        self.overlay_partial = {}     # устройство -> TrendStore (идёт загрузка)
+        self.overlay_loaders = {}     # устройство -> DataLoaderThread
+        self.overlay_queue = []       # ожидают свободного соединения в пуле
+        self.overlay_items = {}       # устройство -> TrendCurves его кривых
+        self.overlay_started = {}     # устройство -> время старта загрузки
+
         self.lock_cursor_mode = False
         self.lock_cursor_button.setChecked(False)
 
@@ -442,6 +844,8 @@ class TrendsSubwindow(QMdiSubWindow):
         self.voltage_container.setPalette(palette)
         self.current_container.setPalette(palette)
         self.plot_widget.setPalette(palette)
+        self.overlay_list.setPalette(palette)
+        self.stats_table.setPalette(palette)
 
         self.navigation_container.setStyleSheet(navigation_style)
         self.values_container.setStyleSheet(values_container_style)
@@ -464,27 +868,30 @@ class TrendsSubwindow(QMdiSubWindow):
             plot_widget.setLabel('left', col, color='white')
 
     def set_cursor_to_timestamp(self, timestamp_ms):
-        if self.is_loading or self.all_data.empty:
+        if self.trend_store.is_empty():
             self.pending_timestamps.append(timestamp_ms)
             return
 
-        diffs = np.abs(self.all_data['timestamp'].values - timestamp_ms)
-        idx = np.argmin(diffs)
-        if diffs[idx] == 0:
+        if self.trend_store.index_of_timestamp(timestamp_ms) >= 0:
             timestamp_sec = timestamp_ms / 1000.0
+            self.cursor_coalescer.cancel()
             for cursor in self.cursors.values():
                 cursor.blockSignals(True)
                 cursor.setValue(timestamp_sec)
                 cursor.blockSignals(False)
             self.update_values()
             self.center_on_cursor()
+        elif self.is_loading:
+            # нужный блок ещё не загружен
+            self.pending_timestamps.append(timestamp_ms)
         else:
             logging.warning(f"No exact match for timestamp {timestamp_ms} in trends data")
 
     def process_pending_timestamps(self):
-        while self.pending_timestamps:
-            ts = self.pending_timestamps.pop(0)
-            self.set_cursor_to_timestamp(ts)
+        pending = self.pending_timestamps
+        self.pending_timestamps = []
+        for timestamp_ms in pending:
+            self.set_cursor_to_timestamp(timestamp_ms)
 
     def toggle_lock_cursor_mode(self):
         self.lock_cursor_mode = self.lock_cursor_button.isChecked()
@@ -499,11 +906,7 @@ class TrendsSubwindow(QMdiSubWindow):
         if self.lock_cursor_mode:
             x_range = range[0]
             center_pos = (x_range[0] + x_range[1]) / 2
-            for cursor in self.cursors.values():
-                cursor.blockSignals(True)
-                cursor.setValue(center_pos)
-                cursor.blockSignals(False)
-            self.update_values()
+            self.cursor_coalescer.request(center_pos, None)
 
     def move_cursor_to_center(self):
         if not self.plot_widgets:
@@ -513,6 +916,7 @@ class TrendsSubwindow(QMdiSubWindow):
         x_range = viewbox.viewRange()[0]
         center_pos = (x_range[0] + x_range[1]) / 2
 
+        self.cursor_coalescer.cancel()
         for cursor in self.cursors.values():
             cursor.blockSignals(True)
             cursor.setValue(center_pos)
@@ -522,23 +926,25 @@ class TrendsSubwindow(QMdiSubWindow):
 
     def make_cursor_sync_function(self, source_col):
         def sync_all_cursors(line):
-            pos = line.value()
-            for col, cursor in self.cursors.items():
-                if col != source_col:
-                    cursor.blockSignals(True)
-                    cursor.setValue(pos)
-                    cursor.blockSignals(False)
-            self.update_values()
+            self.cursor_coalescer.request(line.value(), source_col)
         return sync_all_cursors
 
+    def apply_cursor_position(self, pos, source_col):
+        # Вызывается не чаще раза за кадр с последней запрошенной позицией
+        for col, cursor in self.cursors.items():
+            if col != source_col:
+                cursor.blockSignals(True)
+                cursor.setValue(pos)
+                cursor.blockSignals(False)
+        self.update_values()
+
     def update_values(self):
-        if not self.all_data.empty and self.all_time_labels and self.all_valid_indices:
+        if not self.trend_store.is_empty():
             cursor_pos = self.cursors['U_A_rms'].value()
-            idx = np.argmin(np.abs(np.array(self.all_time_labels) - cursor_pos))
-            if 0 <= idx < len(self.all_valid_indices):
-                data_idx = self.all_valid_indices[idx]
+            data_idx = self.trend_store.nearest_index(cursor_pos)
+            if data_idx >= 0:
                 try:
-                    timestamp_ms = self.all_data['timestamp'].iloc[data_idx]
+                    timestamp_ms = int(self.trend_store.timestamps[data_idx])
                     timestamp_sec = timestamp_ms / 1000
                     date_time = datetime.fromtimestamp(timestamp_sec).strftime('%Y-%m-%d %H:%M:%S')
                     self.datetime_label.setText(f"Дата/время: {date_time}")
@@ -547,19 +953,20 @@ class TrendsSubwindow(QMdiSubWindow):
                     logging.error(f"Ошибка обработки временной метки: {str(e)}")
 
                 try:
-                    u_a = self.all_data['U_A_rms'].iloc[data_idx]
-                    u_b = self.all_data['U_B_rms'].iloc[data_idx]
-                    u_c = self.all_data['U_C_rms'].iloc[data_idx]
-                    i_a = self.all_data['I_A_rms'].iloc[data_idx]
-                    i_b = self.all_data['I_B_rms'].iloc[data_idx]
-                    i_c = self.all_data['I_C_rms'].iloc[data_idx]
-
-                    self.u_a_label.setText(f"U_A: {u_a:.1f} V" if pd.notna(u_a) else "U_A: -")
-                    self.u_b_label.setText(f"U_B: {u_b:.1f} V" if pd.notna(u_b) else "U_B: -")
-                    self.u_c_label.setText(f"U_C: {u_c:.1f} V" if pd.notna(u_c) else "U_C: -")
-                    self.i_a_label.setText(f"I_A: {i_a:.1f} A" if pd.notna(i_a) else "I_A: -")
-                    self.i_b_label.setText(f"I_B: {i_b:.1f} A" if pd.notna(i_b) else "I_B: -")
-                    self.i_c_label.setText(f"I_C: {i_c:.1f} A" if pd.notna(i_c) else "I_C: -")
+                    row = self.trend_store.row(data_idx)
+                    u_a = row['U_A_rms']
+                    u_b = row['U_B_rms']
+                    u_c = row['U_C_rms']
+                    i_a = row['I_A_rms']
+                    i_b = row['I_B_rms']
+                    i_c = row['I_C_rms']
+
+                    self.u_a_label.setText(f"U_A: {u_a:.1f} V" if not np.isnan(u_a) else "U_A: -")
+                    self.u_b_label.setText(f"U_B: {u_b:.1f} V" if not np.isnan(u_b) else "U_B: -")
+                    self.u_c_label.setText(f"U_C: {u_c:.1f} V" if not np.isnan(u_c) else "U_C: -")
+                    self.i_a_label.setText(f"I_A: {i_a:.1f} A" if not np.isnan(i_a) else "I_A: -")
+                    self.i_b_label.setText(f"I_B: {i_b:.1f} A" if not np.isnan(i_b) else "I_B: -")
+                    self.i_c_label.setText(f"I_C: {i_c:.1f} A" if not np.isnan(i_c) else "I_C: -")
                 except Exception as e:
                     logging.error(f"Ошибка обновления значений: {str(e)}")
                     self.u_a_label.setText("U_A: -")
@@ -570,13 +977,23 @@ class TrendsSubwindow(QMdiSubWindow):
                     self.i_c_label.setText("I_C: -")
 
     def clear_previous_data(self):
-        self.all_data = pd.DataFrame()
-        self.time_labels = []
-        self.valid_data_indices = []
-        self.all_time_labels = []
-        self.all_valid_indices = []
+        self.cursor_coalescer.cancel()
+        self.cursor_coalescer.reset_counters()
+        self.stats_coalescer.cancel()
+        self.curves_coalescer.cancel()
+        self.dirty_curves.clear()
+        self.window_stats = None
+        self.event_index = None
+        self.events_list.clear()
+        self.stop_pq_loader()
+        self.pq_store = ts.TrendStore(pq.pq_channel_names)
+        self.pq_device = None
+        self.pq_curve.setData([], [])
+        self.trend_store = ts.TrendStore()
+        self.auto_x_range = None
         self.pending_timestamps = []
 
+        self.trend_curves.clear()
         for col in self.columns:
             plot_widget = self.plot_widgets[col]
             for item in self.plot_items[col]:
@@ -605,47 +1022,114 @@ class TrendsSubwindow(QMdiSubWindow):
         self.progress_bar.setVisible(True)
         self.progress_label.setText("0%")
 
-        if self.data_loader and self.data_loader.isRunning():
-            self.data_loader.terminate()
-            self.data_loader.wait()
+        self.stop_data_loader()
 
         self.data_loader = DataLoaderThread(self.current_device)
-        self.data_loader.data_processed.connect(self.on_data_processed)
+        self.data_loader.block_loaded.connect(self.on_block_loaded)
+        self.data_loader.loading_finished.connect(self.on_loading_finished)
         self.data_loader.error_occurred.connect(self.on_error_occurred)
         self.data_loader.progress_updated.connect(self.update_progress)
         self.data_loader.finished.connect(self.on_data_loader_finished)
         self.data_loader.start()
 
-    def on_data_loader_finished(self):
-        self.data_loader.deleteLater()
+        if self.pq_mode:
+            self.start_pq_loader()
+
+    def stop_data_loader(self):
+        # Кооперативная отмена: поток сам закроет соединение, запрос прерывается на сервере.
+        # Ждать завершения не нужно - поток хранится до сигнала finished.
+        loader = self.data_loader
+        if loader is None:
+            return
         self.data_loader = None
+        for sig in (loader.block_loaded, loader.loading_finished, loader.error_occurred, loader.progress_updated):
+            sig.disconnect()
+        if loader.isRunning():
+            loader.cancel()
+            self.retired_loaders.append(loader)
+        else:
+            loader.deleteLater()
+
+    def is_stale_loader_signal(self) -> bool:
+        # сигнал пришёл от уже отменённого загрузчика (событие было в очереди до отмены)
+        loader = self.sender()
+        return isinstance(loader, DataLoaderThread) and loader is not self.data_loader
 
-    def on_data_processed(self, df):
-        self.all_data = df
-        self.plot_data(df)
+    def on_data_loader_finished(self):
+        loader = self.sender()
+        if loader in self.retired_loaders:
+            self.retired_loaders.remove(loader)
+        elif loader is not None and loader is self.data_loader:
+            self.data_loader = None
+        elif loader is not None and loader is self.pq_loader:
+            # расчёт PQ завершился ошибкой: loading_finished не пришёл, ссылку снимаем здесь
+            self.pq_loader = None
+        for device_name, overlay_loader in list(self.overlay_loaders.items()):
+            if overlay_loader is loader:
+                # поток завершился без loading_finished (ошибка уже обработана)
+                self.overlay_loaders.pop(device_name)
+                self.start_queued_overlay_loaders()
+        if loader is not None:
+            loader.deleteLater()
+
+    def on_block_loaded(self, block):
+        # Очередной блок дописывается к хранилищу и сразу отрисовывается
+        if self.is_stale_loader_signal():
+            return  # запоздавший блок отменённой загрузки
+
+        store = self.trend_store
+        start, stop = store.insert_block(block)
+        self.plot_data(store, start, stop)
+
+        self.status_label.setText(f"Загружено {len(store)} записей...")
+        self.extend_x_range()
+        self.process_pending_timestamps()
+
+    def extend_x_range(self):
+        # Расширяет видимый диапазон по мере загрузки, пока пользователь не сдвинул вид сам
+        if len(self.trend_store) < 2:
+            return
+        viewbox = self.view_boxes[self.columns[0]]
+        if self.auto_x_range is not None and not np.allclose(viewbox.viewRange()[0], self.auto_x_range):
+            return
+
+        min_t, max_t = self.trend_store.first_time(), self.trend_store.last_time()
+        for vb in self.view_boxes.values():
+            vb.setXRange(min_t, max_t, padding=0.05)
+        self.auto_x_range = list(viewbox.viewRange()[0])
+        if self.lock_cursor_mode:
+            self.move_cursor_to_center()
+
+    def on_loading_finished(self, total_records):
+        if self.is_stale_loader_signal():
+            return
         self.status_label.setText("Данные загружены")
         self.is_loading = False
         self.progress_bar.setVisible(False)
         self.progress_label.setText("100%")
+        logging.info(f"Тренды {self.current_device}: загружено {total_records} записей")
         self.process_pending_timestamps()
-        if self.all_time_labels:
-            min_t, max_t = min(self.all_time_labels), max(self.all_time_labels)
-            for vb in self.view_boxes.values():
-                vb.setXRange(min_t, max_t, padding=0.05)
-            if self.lock_cursor_mode:
-                self.move_cursor_to_center()
+
+        # Префиксные суммы и таблицы экстремумов считаются один раз на загрузку
+        self.window_stats = wst.WindowStats(self.trend_store)
+        if self.stats_mode:
+            self.stats_coalescer.request()
+        if self.events_mode:
+            self.detect_events()
 
         # Автоматическое масштабирование для токовых каналов
         current_cols = ['I_A_rms', 'I_B_rms', 'I_C_rms']
         for col in current_cols:
-            if col in self.all_data.columns:
-                max_val = self.all_data[col].max()
-                if pd.notna(max_val) and max_val < 10:
+            if col in self.trend_store.channel_names:
+                max_val = self.trend_store.nanmax(col)
+                if not np.isnan(max_val) and max_val < 10:
                     self.plot_widgets[col].setYRange(0, 10)
                 else:
                     self.plot_widgets[col].enableAutoRange()
 
     def update_progress(self, value):
+        if self.is_stale_loader_signal():
+            return
         self.progress_bar.setValue(value)
         self.progress_label.setText(f"{value}%")
 
@@ -657,95 +1141,497 @@ class TrendsSubwindow(QMdiSubWindow):
         else:
             self.parent.status_bar.showMessage("Ошибка: Не указано имя таблицы", 5000)
 
-    def plot_data(self, df):
+    def plot_data(self, store, start=0, stop=None, device=None):
+        # Отрисовывает записи [start, stop) хранилища; соседние записи за границами
+        # диапазона берутся для стыковки кривых и отметки разрыва на границе блоков.
+        # device - имя наложенного устройства (только кривые его цветом)
         try:
-            timestamps = pd.to_datetime(df['timestamp'], unit='ms', errors='coerce')
-            valid_indices = [i for i, t in enumerate(timestamps) if pd.notna(t)]
-            self.time_labels = [timestamps[i].timestamp() for i in valid_indices]
-            self.valid_data_indices = valid_indices
-
-            if len(self.time_labels) < 2:
+            if stop is None:
+                stop = len(store)
+            if len(store) < 2 or stop <= start:
                 return
 
-            self.all_time_labels = self.time_labels
-            self.all_valid_indices = valid_indices
+            offset = max(start - 1, 0)
+            part = store.view(offset, min(stop + 1, len(store)))
+            time_labels = part.time_seconds()
+
+            time_diffs = np.diff(time_labels)
+            gap_indices = np.where(time_diffs > trend_gap_seconds)[0]
 
-            time_diffs = np.diff(self.time_labels)
-            gap_indices = np.where(time_diffs > 900)[0]
+            # здесь только отмечаются куски кривых на краю блока, данные в них подаёт refresh_trend_curves
+            curves = self.trend_curves if device is None else self.overlay_items.get(device)
+            if curves is not None:
+                curves.insert(store, start, stop)
+                self.dirty_curves.add(device)
+                self.curves_coalescer.request()
 
             for col in self.columns:
+                if device is not None:
+                    break
                 plot_widget = self.plot_widgets[col]
-                split_indices = np.concatenate([[0], gap_indices + 1, [len(self.time_labels)]])
-
-                for i in range(len(split_indices) - 1):
-                    start_idx = split_indices[i]
-                    end_idx = split_indices[i + 1]
-                    if end_idx - start_idx < 2:
-                        continue
-
-                    x_segment = np.array(self.time_labels[start_idx:end_idx])
-                    y_segment = np.array(df[col].iloc[valid_indices[start_idx:end_idx]])
-
-                    if not np.all(np.isnan(y_segment)):
-                        plot_item = plot_widget.plot(x_segment, y_segment,
-                                                     pen={'color': '#FF0000', 'width': 1},
-                                                     connect='finite')
-                        self.plot_items[col].append(plot_item)
 
                 for idx in gap_indices:
-                    if idx + 1 < len(self.time_labels):
-                        start = self.time_labels[idx]
-                        end = self.time_labels[idx + 1]
-                        region = pg.LinearRegionItem(values=[start, end], movable=False)
+                    if idx + 1 < len(time_labels):
+                        gap_start = time_labels[idx]
+                        gap_end = time_labels[idx + 1]
+                        region = pg.LinearRegionItem(values=[gap_start, gap_end], movable=False)
                         region.setBrush(QColor(128, 128, 128, 100))
                         region.setZValue(-10)
                         plot_widget.addItem(region)
                         self.plot_items[col].append(region)
 
-            for i, idx in enumerate(self.valid_data_indices):
-                row = df.iloc[idx]
-                if all(pd.isna(row[col]) for col in self.columns):
-                    timestamp = self.time_labels[i]
-                    start = self.time_labels[i - 1] if i > 0 else timestamp - 0.5
-                    end = self.time_labels[i + 1] if i < len(self.time_labels) - 1 else timestamp + 0.5
-                    for col in self.columns:
-                        plot_widget = self.plot_widgets[col]
-                        region = pg.LinearRegionItem(values=[start, end], movable=False)
-                        region.setBrush(QColor(255, 255, 0, 100))
-                        region.setZValue(-5)
-                        plot_widget.addItem(region)
-                        self.plot_items[col].append(region)
-
-            if self.all_time_labels:
-                min_t, max_t = min(self.all_time_labels), max(self.all_time_labels)
-                for cursor in self.cursors.values():
-                    cursor.setBounds([min_t, max_t])
-                    if cursor.value() < min_t or cursor.value() > max_t:
-                        cursor.setValue((min_t + max_t) / 2)
+            if device is not None:
+                self.update_cursor_bounds()
+                return
 
+            # Записи, в которых нет ни одного значения
+            all_nan = np.zeros(len(part), dtype=bool)
+            all_nan[start - offset:stop - offset] = True
+            for col in self.columns:
+                all_nan &= np.isnan(part.column(col))
+
+            for i in np.flatnonzero(all_nan):
+                timestamp = time_labels[i]
+                region_start = time_labels[i - 1] if i > 0 else timestamp - 0.5
+                region_end = time_labels[i + 1] if i < len(time_labels) - 1 else timestamp + 0.5
+                for col in self.columns:
+                    plot_widget = self.plot_widgets[col]
+                    region = pg.LinearRegionItem(values=[region_start, region_end], movable=False)
+                    region.setBrush(QColor(255, 255, 0, 100))
+                    region.setZValue(-5)
+                    plot_widget.addItem(region)
+                    self.plot_items[col].append(region)
+
+            self.update_cursor_bounds()
             self.update_values()
 
         except Exception as e:
             logging.error(f"Ошибка при отрисовке графика: {str(e)}")
             self.on_error_occurred(f"Ошибка при отрисовке графика: {str(e)}")
 
+    def refresh_trend_curves(self):
+        """
+        Подаёт в кривые данные кусков, затронутых новыми блоками (см. TrendCurves).
+        """
+        dirty = self.dirty_curves
+        self.dirty_curves = set()
+        for device in dirty:
+            if device is None:
+                store, curves = self.trend_store, self.trend_curves
+            else:
+                store, curves = self.overlay_store(device), self.overlay_items.get(device)
+            if store is None or curves is None:
+                continue  # устройство уже скрыто
+            curves.refresh(store, self.columns)
+
+    def update_cursor_bounds(self):
+        # Курсор может ходить по объединению основного и видимых наложенных устройств
+        stores = [self.trend_store] + [self.overlay_store(name) for name in self.overlay_items]
+        stores = [store for store in stores if store is not None and not store.is_empty()]
+        if not stores:
+            return
+        min_t = min(store.first_time() for store in stores)
+        max_t = max(store.last_time() for store in stores)
+        for cursor in self.cursors.values():
+            cursor.setBounds([min_t, max_t])
+            if cursor.value() < min_t or cursor.value() > max_t:
+                cursor.setValue((min_t + max_t) / 2)
+
+    #-----------------------------------------------------------------------------------------------------
+    # Статистика по диапазону
+    def toggle_stats_panel(self):
+        self.stats_mode = self.stats_button.isChecked()
+        self.stats_table.setVisible(self.stats_mode)
+        self.stats_region_button.setEnabled(self.stats_mode)
+        if not self.stats_mode and self.stats_region_mode:
+            self.stats_region_button.setChecked(False)
+            self.toggle_stats_region()
+        if self.stats_mode:
+            self.stats_coalescer.request()
+
+    def toggle_stats_region(self):
+        self.stats_region_mode = self.stats_region_button.isChecked()
+        if self.stats_region_mode:
+            # по умолчанию - средняя треть видимого диапазона
+            x_range = self.view_boxes[self.columns[0]].viewRange()[0]
+            third = (x_range[1] - x_range[0]) / 3
+            for col, region in self.stats_regions.items():
+                region.blockSignals(True)
+                region.setRegion([x_range[0] + third, x_range[1] - third])
+                region.blockSignals(False)
+                self.plot_widgets[col].addItem(region)
+        else:
+            for col, region in self.stats_regions.items():
+                self.plot_widgets[col].removeItem(region)
+        self.stats_coalescer.request()
+
+    def make_region_sync_function(self, source_col):
+        def sync_all_regions(region):
+            bounds = region.getRegion()
+            for col, other in self.stats_regions.items():
+                if col != source_col:
+                    other.blockSignals(True)
+                    other.setRegion(bounds)
+                    other.blockSignals(False)
+            self.stats_coalescer.request()
+        return sync_all_regions
+
+    def on_stats_range_changed(self, viewbox, x_range):
+        if self.stats_mode and not self.stats_region_mode:
+            self.stats_coalescer.request()
+
+    def update_stats_panel(self):
+        if not self.stats_mode:
+            return
+
+        if self.window_stats is None or self.window_stats.is_stale(self.trend_store):
+            if self.is_loading or self.trend_store.is_empty():
+                self.set_stats_table({})
+                return
+            self.window_stats = wst.WindowStats(self.trend_store)
+
+        if self.stats_region_mode:
+            t0, t1 = self.stats_regions[self.columns[0]].getRegion()
+        else:
+            t0, t1 = self.view_boxes[self.columns[0]].viewRange()[0]
+        self.set_stats_table(self.window_stats.query_time(t0, t1))
+
+    def set_stats_table(self, stats: dict):
+        keys = ["count", "mean", "min", "max", "rms"]
+        for row, col in enumerate(self.columns):
+            col_stats = stats.get(col)
+            for j, key in enumerate(keys):
+                if col_stats is None or (key != "count" and np.isnan(col_stats[key])):
+                    text = "-"
+                elif key == "count":
+                    text = str(col_stats[key])
+                else:
+                    text = f"{col_stats[key]:.2f}"
+                self.stats_table.setItem(row, j, QTableWidgetItem(text))
+
+    #-----------------------------------------------------------------------------------------------------
+    # События: провалы, перенапряжения, прерывания
+    def toggle_events_panel(self):
+        self.events_mode = self.events_button.isChecked()
+        self.events_container.setVisible(self.events_mode)
+        if self.events_mode and self.event_index is None:
+            self.detect_events()
+
+    def event_thresholds(self):
+        thresholds = evd.EventThresholds()
+        try:
+            thresholds.nominal_voltage = float(self.nominal_voltage_edit.text().replace(",", "."))
+            thresholds.current_limit = float(self.current_limit_edit.text().replace(",", "."))
+        except ValueError:
+            self.parent.status_bar.showMessage("Неверная уставка, используются значения по умолчанию", 5000)
+            return evd.EventThresholds()
+        if thresholds.nominal_voltage <= 0:
+            return evd.EventThresholds()
+        return thresholds
+
+    def detect_events(self):
+        if not self.events_mode:
+            return
+        self.events_list.blockSignals(True)
+        self.events_list.clear()
+        self.events_list.blockSignals(False)
+        if self.trend_store.is_empty():
+            self.event_index = None
+            return
+        if self.is_loading:
+            self.events_list.addItem("Дождитесь окончания загрузки")
+            self.event_index = None
+            return
+
+        start_time = time.perf_counter()
+        self.event_index = evd.detect_events(self.trend_store, self.event_thresholds())
+        elapsed = time.perf_counter() - start_time
+        logging.info(f"Поиск событий {self.current_device}: {len(self.trend_store)} записей, "
+                     f"найдено {len(self.event_index)} за {elapsed:.3f} с")
+
+        self.events_list.blockSignals(True)
+        for i in range(len(self.event_index)):
+            event = self.event_index.event(i)
+            date_time = datetime.fromtimestamp(event["start_ms"] / 1000).strftime('%Y-%m-%d %H:%M:%S')
+            kind = evd.event_kind_names[event["kind"]]
+            self.events_list.addItem(f"{date_time}  {kind}  {event['channel']}  "
+                                     f"{event['extreme']:.1f} ({event['depth']:.0f}%)  {event['duration_ms'] / 1000:.1f} с")
+        self.events_list.blockSignals(False)
+
+        counts = self.event_index.counts()
+        summary = ", ".join(f"{evd.event_kind_names[k]}: {v}" for k, v in counts.items() if v)
+        self.parent.status_bar.showMessage(f"Найдено событий: {len(self.event_index)}" + (f" ({summary})" if summary else ""), 5000)
+
+    def jump_to_event(self, idx):
+        if self.event_index is None or idx < 0 or idx >= len(self.event_index):
+            return
+        event = self.event_index.event(idx)
+        t0 = event["start_ms"] / 1000.0
+        t1 = event["end_ms"] / 1000.0
+        margin = max(t1 - t0, 60.0)
+
+        self.cursor_coalescer.cancel()
+        for cursor in self.cursors.values():
+            cursor.blockSignals(True)
+            cursor.setValue(t0)
+            cursor.blockSignals(False)
+        for vb in self.view_boxes.values():
+            vb.setXRange(t0 - margin, t1 + margin, padding=0)
+        self.update_values()
+
+    def select_event(self, idx):
+        if idx < 0:
+            self.parent.status_bar.showMessage("Больше событий нет", 2000)
+            return
+        if self.events_list.currentRow() == idx:
+            self.jump_to_event(idx)
+        else:
+            self.events_list.setCurrentRow(idx)
+
+    def jump_to_next_event(self):
+        if self.event_index is not None:
+            self.select_event(self.event_index.next_after(self.cursors['U_A_rms'].value()))
+
+    def jump_to_prev_event(self):
+        if self.event_index is not None:
+            self.select_event(self.event_index.prev_before(self.cursors['U_A_rms'].value()))
+
+    #-----------------------------------------------------------------------------------------------------
+    # Производные показатели качества (PQ) по сырым отсчётам
+    def toggle_pq_mode(self):
+        self.pq_mode = self.pq_button.isChecked()
+        self.pq_combo.setVisible(self.pq_mode)
+        self.pq_plot.setVisible(self.pq_mode)
+        if self.pq_mode:
+            self.start_pq_loader()
+        else:
+            self.stop_pq_loader()
+
+    def start_pq_loader(self):
+        # расчёт запускается один раз на устройство; результаты остаются до смены устройства
+        if not self.current_device or self.pq_device == self.current_device:
+            return
+        self.stop_pq_loader()
+        self.pq_store = ts.TrendStore(pq.pq_channel_names)
+        self.pq_device = self.current_device
+
+        self.pq_loader = PQTrendsThread(self.current_device)
+        self.pq_loader.block_loaded.connect(self.on_pq_block)
+        self.pq_loader.loading_finished.connect(self.on_pq_finished)
+        self.pq_loader.error_occurred.connect(self.on_pq_error)
+        self.pq_loader.progress_updated.connect(self.on_pq_progress)
+        self.pq_loader.finished.connect(self.on_data_loader_finished)
+        self.pq_loader.start()
+
+    def stop_pq_loader(self):
+        loader = self.pq_loader
+        if loader is None:
+            return
+        self.pq_loader = None
+        for sig in (loader.block_loaded, loader.loading_finished, loader.error_occurred, loader.progress_updated):
+            sig.disconnect()
+        if loader.isRunning():
+            loader.cancel()
+            self.retired_loaders.append(loader)
+            # незавершённый расчёт при следующем включении начнётся заново
+            self.pq_device = None
+        else:
+            loader.deleteLater()
+
+    def on_pq_block(self, block):
+        self.pq_store.insert_block(block)
+        self.pq_coalescer.request()
+
+    def on_pq_progress(self, value):
+        self.parent.status_bar.showMessage(f"Расчёт показателей качества: {value}%", 2000)
+
+    def on_pq_finished(self, total_records):
+        self.pq_loader = None
+        self.parent.status_bar.showMessage(f"Показатели качества рассчитаны: {total_records} записей", 5000)
+        self.pq_coalescer.request()
+
+    def on_pq_error(self, error_msg):
+        self.pq_device = None
+        self.parent.status_bar.showMessage(error_msg, 5000)
+        logging.error(error_msg)
+
+    def on_pq_column_changed(self, name):
+        self.pq_coalescer.request()
+
+    def update_pq_plot(self):
+        name = self.pq_combo.currentText()
+        if not self.pq_mode or name not in self.pq_store.channel_names:
+            return
+        self.pq_plot.setLabel('left', f"{name}: {pq.pq_channel_title(name)}", color='white')
+        self.pq_curve.setData(self.pq_store.time_seconds(), self.pq_store.column(name))
+
+    #-----------------------------------------------------------------------------------------------------
+    # Наложение нескольких устройств
+    def add_overlay_device(self, device_name: str):
+        if self.overlay_list.findItems(device_name, Qt.MatchFlag.MatchExactly):
+            return
+        item = QListWidgetItem(device_name)
+        item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+        item.setCheckState(Qt.CheckState.Unchecked)
+        self.overlay_list.blockSignals(True)
+        self.overlay_list.addItem(item)
+        item.setForeground(QColor(self.overlay_color(device_name)))
+        self.overlay_list.blockSignals(False)
+
+    def overlay_color(self, device_name: str) -> str:
+        items = self.overlay_list.findItems(device_name, Qt.MatchFlag.MatchExactly)
+        row = self.overlay_list.row(items[0]) if items else len(self.overlay_items)
+        return overlay_colors[row % len(overlay_colors)]
+
+    def overlay_store(self, device_name: str):
+        if device_name in self.overlay_cache:
+            return self.overlay_cache[device_name]
+        return self.overlay_partial.get(device_name)
+
+    def toggle_overlay_mode(self):
+        self.overlay_mode = self.overlay_button.isChecked()
+        self.overlay_list.setVisible(self.overlay_mode)
+        for i in range(self.overlay_list.count()):
+            item = self.overlay_list.item(i)
+            if item.checkState() == Qt.CheckState.Checked:
+                if self.overlay_mode:
+                    self.show_overlay_device(item.text())
+                else:
+                    self.hide_overlay_device(item.text())
+
+    def on_overlay_item_changed(self, item):
+        if not self.overlay_mode:
+            return
+        if item.checkState() == Qt.CheckState.Checked:
+            self.show_overlay_device(item.text())
+        else:
+            self.hide_overlay_device(item.text())
+
+    def show_overlay_device(self, device_name: str):
+        if device_name in self.overlay_items:
+            return
+        self.overlay_items[device_name] = TrendCurves(self.plot_widgets, {'color': self.overlay_color(device_name), 'width': 1})
+
+        if device_name in self.overlay_cache:
+            # повторное включение - без обращения к БД
+            self.plot_data(self.overlay_cache[device_name], device=device_name)
+            return
+
+        if device_name in self.overlay_partial:
+            self.plot_data(self.overlay_partial[device_name], device=device_name)
+        if device_name in self.overlay_loaders or device_name in self.overlay_queue:
+            return
+
+        self.overlay_partial[device_name] = ts.TrendStore()
+        self.overlay_queue.append(device_name)
+        self.start_queued_overlay_loaders()
+
+    def hide_overlay_device(self, device_name: str):
+        curves = self.overlay_items.pop(device_name, None)
+        if curves is not None:
+            curves.clear()
+
+        # незавершённая загрузка скрытого устройства отменяется; кэш готовых данных сохраняется
+        if device_name in self.overlay_queue:
+            self.overlay_queue.remove(device_name)
+            self.overlay_partial.pop(device_name, None)
+        loader = self.overlay_loaders.pop(device_name, None)
+        if loader is not None:
+            for sig in (loader.block_loaded, loader.loading_finished, loader.error_occurred):
+                sig.disconnect()
+            loader.cancel()
+            self.retired_loaders.append(loader)
+            self.overlay_partial.pop(device_name, None)
+
+    def start_queued_overlay_loaders(self):
+        # Отмеченные устройства грузятся параллельно, каждое по своему соединению из пула; их число
+        # ограничено, чтобы наложения не заняли весь пул (при занятом пуле загрузчики ждут соединения)
+        while self.overlay_queue and len(self.overlay_loaders) < overlay_max_loaders:
+            device_name = self.overlay_queue.pop(0)
+            loader = DataLoaderThread(device_name)
+            loader.block_loaded.connect(lambda block, name=device_name: self.on_overlay_block(name, block))
+            loader.loading_finished.connect(lambda total, name=device_name: self.on_overlay_finished(name, total))
+            loader.error_occurred.connect(lambda msg, name=device_name: self.on_overlay_error(name, msg))
+            loader.finished.connect(self.on_data_loader_finished)
+            self.overlay_loaders[device_name] = loader
+            self.overlay_started[device_name] = time.monotonic()
+            loader.start()
+        self.update_overlay_status()
+
+    def on_overlay_block(self, device_name, block):
+        store = self.overlay_partial.get(device_name)
+        if store is None:
+            return
+        start, stop = store.insert_block(block)
+        if device_name in self.overlay_items:
+            self.plot_data(store, start, stop, device=device_name)
+
+    def on_overlay_finished(self, device_name, total_records):
+        loader = self.overlay_loaders.pop(device_name, None)
+        store = self.overlay_partial.pop(device_name, None)
+        if loader is None or store is None:
+            return
+        self.overlay_cache[device_name] = store
+        elapsed = time.monotonic() - self.overlay_started.pop(device_name, time.monotonic())
+        logging.info(f"Наложение {device_name}: {total_records} записей за {elapsed:.2f} с")
+        self.start_queued_overlay_loaders()
+
+    def on_overlay_error(self, device_name, error_msg):
+        self.overlay_loaders.pop(device_name, None)
+        self.overlay_partial.pop(device_name, None)
+        self.overlay_started.pop(device_name, None)
+        self.parent.status_bar.showMessage(f"{device_name}: {error_msg}", 5000)
+        logging.error(f"Ошибка загрузки наложения {device_name}: {error_msg}")
+        self.start_queued_overlay_loaders()
+
+    def update_overlay_status(self):
+        loading = len(self.overlay_loaders) + len(self.overlay_queue)
+        if loading:
+            self.parent.status_bar.showMessage(f"Загрузка наложенных устройств: {loading}", 2000)
+
     def center_on_cursor(self):
-        if self.all_time_labels:
+        if not self.trend_store.is_empty():
             cursor_pos = self.cursors['U_A_rms'].value()
             half_range = 1800
             for vb in self.view_boxes.values():
                 vb.setXRange(cursor_pos - half_range, cursor_pos + half_range, padding=0)
 
     def send_timestamp_to_signals(self):
-        if not self.all_data.empty and self.all_time_labels and hasattr(self.parent, 'SignalsView_subwindow'):
+        if not self.trend_store.is_empty() and hasattr(self.parent, 'SignalsView_subwindow'):
             cursor_pos = self.cursors['U_A_rms'].value()
-            idx = np.argmin(np.abs(np.array(self.all_time_labels) - cursor_pos))
-            if 0 <= idx < len(self.all_valid_indices):
-                timestamp = self.all_data['timestamp'].iloc[self.all_valid_indices[idx]]
+            idx = self.trend_store.nearest_index(cursor_pos)
+            if idx >= 0:
+                timestamp = int(self.trend_store.timestamps[idx])
                 self.parent.SignalsView_subwindow.set_timestamp_from_trends(timestamp)
                 self.parent.status_bar.showMessage(f"Время {timestamp} передано в окно сигналов", 5000)
 
+    def export_visible_range(self):
+        """
+        Сохраняет видимый диапазон трендов в CSV в папку export.
+        """
+        if self.trend_store.is_empty() or not self.current_device:
+            self.parent.status_bar.showMessage("Нет данных трендов для сохранения", 5000)
+            return
+
+        x_range = self.view_boxes[self.columns[0]].viewRange()[0]
+        start, stop = self.trend_store.index_range(x_range[0], x_range[1])
+        if stop <= start:
+            self.parent.status_bar.showMessage("В видимом диапазоне нет записей", 5000)
+            return
+
+        try:
+            first = datetime.fromtimestamp(self.trend_store.timestamps[start] / 1000).strftime('%Y%m%d_%H%M%S')
+            last = datetime.fromtimestamp(self.trend_store.timestamps[stop - 1] / 1000).strftime('%Y%m%d_%H%M%S')
+            filename = f"export/{self.current_device}_trends_{first}_{last}.csv"
+            self.trend_store.to_csv(filename, start, stop)
+            self.parent.status_bar.showMessage(f"Тренды сохранены в файл: {filename}", 5000)
+            logging.info(f"Сохранены тренды ({stop - start} записей) в файл: {filename}")
+        except Exception as e:
+            self.on_error_occurred(f"Ошибка при сохранении трендов: {str(e)}")
+
     def on_error_occurred(self, error_msg):
+        if self.is_stale_loader_signal():
+            return
         self.parent.status_bar.showMessage(error_msg, 5000)
         self.status_label.setText("Ошибка")
         self.progress_bar.setVisible(False)
@@ -754,7 +1640,12 @@ class TrendsSubwindow(QMdiSubWindow):
         logging.error(error_msg)
 
     def closeEvent(self, event):
-        if hasattr(self, 'data_loader') and self.data_loader and self.data_loader.isRunning():
-            self.data_loader.terminate()
-            self.data_loader.wait()
+        if hasattr(self, 'data_loader'):
+            self.stop_data_loader()
+            self.stop_pq_loader()
+            self.overlay_queue = []
+            for device_name in list(self.overlay_loaders):
+                self.hide_overlay_device(device_name)
+            for loader in list(self.retired_loaders):
+                loader.wait(2000)
         super().closeEvent(event)
\ No newline at end of file